@@ -4,6 +4,7 @@ Django settings for SystemConfig project.
 Generated by 'django-admin startproject' using Django 5.2.10.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core_app.middleware.DatabaseUnavailableMiddleware",
+    "core_app.middleware.ReadYourWritesMiddleware",
+    "core_app.middleware.SessionRefreshMiddleware",
 ]
 
 ROOT_URLCONF = "SystemConfig.urls"
@@ -81,6 +85,129 @@ DATABASES = {
     }
 }
 
+# Shared cache. The rights version (perm_ver), permission index, sidebar, month segments,
+# balance-snapshot and ledger versions (ledger_ver) and the cash-book delta tokens live here.
+# Production runs several workers, so it MUST be shared between them - set one of:
+#   REDIS_URL           e.g. redis://127.0.0.1:6379/1 (needs the `redis` package)
+#   MEMCACHED_LOCATION  e.g. 127.0.0.1:11211 (needs the `pymemcache` package)
+# Without either the cache is per-process (LocMemCache): fine for runserver or a single
+# worker, but with more workers a rights change or a write seen by one worker would not
+# reach the others until their entries expire.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "KEY_PREFIX": "erp",
+        }
+    }
+elif os.environ.get("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.environ["MEMCACHED_LOCATION"],
+            "KEY_PREFIX": "erp",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "erp-default",
+            "KEY_PREFIX": "erp",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+
+# BaseDAL pyodbc connection pool (per worker process)
+DB_POOL = {
+    "min_size": 2,  # opened when the pool is first built, never evicted below this
+    "max_size": 20,
+    "idle_timeout": 300,  # seconds before an idle connection is closed
+    "checkout_timeout": 5,  # seconds to wait for a free connection
+    "validate_after": 30,  # ping connections idle longer than this on checkout
+}
+
+# Optional read-only copy (AlwaysOn secondary / log-shipped server) for list and
+# report SPs registered as kind="read". Same keys as DB_CONFIG; None = everything on primary.
+DB_READ_REPLICA = None
+# e.g. DB_READ_REPLICA = {"driver": "ODBC Driver 17 for SQL Server", "server": "replica\\SQLEXPRESS", "database": "VSION20"}
+
+# After a user writes, their reads stay on the primary for this many seconds (0 = off)
+DB_READ_YOUR_WRITES_SECONDS = 5
+
+# Fail fast while SQL Server is down instead of waiting on every request
+DB_CIRCUIT_BREAKER = {
+    "failure_threshold": 5,  # consecutive connection failures before opening
+    "reset_timeout": 10,  # seconds before a single probe call is let through
+}
+
+# Callers coalesced onto an identical in-flight read SP (coalesce=True) wait this
+# many seconds for it, then run the SP themselves
+DB_COALESCE_WAIT_SECONDS = 30
+
+# In-process cache for read SPs registered with cache_ttl (see SPRegistry.register)
+DB_RESULT_CACHE = {
+    "enabled": True,
+    "max_entries": 500,  # LRU beyond this
+    # Bigger results are never cached (multi-year lists). A server-side DataTables list
+    # above this re-runs its SP on every draw (page, sort, search), so keep ranges short.
+    "max_entry_rows": 5000,
+    "max_total_rows": 100000,  # LRU eviction once all entries together hold more rows
+}
+
+# select2 lookups served from memory (core_app/layers/lookup_service.py)
+LOOKUP_SERVICE = {
+    "refresh_interval": 300,  # seconds before a lookup type is reloaded from sp_Common_GetLookup
+    "page_size": 30,  # items per select2 page
+    # Types sp_Common_GetLookup serves; any other ?type= gets an empty page
+    "types": [
+        "Service",
+        "account",
+        "accounts",
+        "cost_centers",
+        "department",
+        "departments",
+        "services",
+        "status",
+        "statuses",
+        "voucher_types",
+    ],
+}
+
+# Seconds a user's permission index stays in the Django cache (saving rights invalidates it)
+PERMISSION_CACHE_TTL = 300
+
+# Closed-month segments of the cash book / journal lists (Django cache).
+# Months older than horizon_months and the current month are always queried live.
+# Segments reloaded within primary_after_write seconds of a write skip the replica.
+MONTH_SEGMENT_CACHE = {"enabled": True, "ttl": 3600, "horizon_months": 24, "primary_after_write": 60}
+
+# Period-close balances of the consolidated report (manage.py build_balance_snapshots).
+# months = how far back the command builds by default.
+BALANCE_SNAPSHOTS = {"enabled": True, "months": 24}
+
+# In-memory account ledger (LedgerBLL): postings from this date on, dates up to
+# horizon_days ahead; voucher types that are cash payments / receipts.
+# Memory follows the days that have postings, not the span since "since"; other
+# workers' writes are replayed from the shared cache instead of reloading.
+LEDGER_INDEX = {
+    "enabled": True,
+    "since": "2000-01-01",
+    "horizon_days": 400,
+    "payment_voucher_types": [1],
+    "receipt_voucher_types": [2],
+}
+
+# Seconds a user's rendered sidebar HTML stays cached (keyed by rights version too)
+SIDEBAR_CACHE_TTL = 600
+
+# Rows per fetchmany() round when streaming SP results (BaseDAL.iter_sp)
+DB_FETCH_BATCH_SIZE = 500
+
+# Clients allowed to scrape /metrics/ (Prometheus)
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,8 +260,15 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 # 2. 20 Minutes Inactivity Logout (20 * 60 seconds)
 SESSION_COOKIE_AGE = 1200
 
-# 3. Har request par expiry timer reset ho (taake active user kaam karta rahe)
-SESSION_SAVE_EVERY_REQUEST = True
+# 3. Expiry timer active user ke liye reset hota rahe - lekin har request par session
+#    write nahi: SessionRefreshMiddleware har SESSION_REFRESH_INTERVAL seconds mein ek
+#    baar save karta hai (SESSION_COOKIE_AGE se kaafi kam rakhein)
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 120
+
+# 3b. Lean session: sirf ids + rights version session mein; permission index aur
+#     sidebar Django cache mein (per user + rights version)
+SESSION_LEAN = True
 
 # 4. Login URL definition (taake timeout par yahan redirect ho)
 LOGIN_URL = (
@@ -1,109 +1,819 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 import pyodbc
 from django.conf import settings
 
+from .circuit_breaker import CircuitBreaker
+from .connection_pool import ConnectionPool
+from .error_handler import DatabaseUnavailableError, PoolExhaustedError
+from .result_cache import ResultCache
+from .row import Row, RowSchema
+from .sp_metrics import SPTimer
+from .single_flight import SingleFlight
+from .sp_registry import SPRegistry
+
+
+_SQL_TYPE_RE = re.compile(r"^[A-Za-z]+(\s*\(\s*(\d+|MAX)(\s*,\s*\d+)?\s*\))?$", re.I)
+
 
 class BaseDAL:
+    PRIMARY = "primary"
+    REPLICA = "replica"
+
+    _pools = {}  # alias -> ConnectionPool
+    _breakers = {}  # alias -> CircuitBreaker
+    _checked_out = {}  # id(conn) -> alias, for connections not from the primary
+    _pool_lock = threading.Lock()
+    _local = threading.local()  # per-thread unit-of-work connection and write pinning
+
+    @staticmethod
+    def get_connection_string(alias=PRIMARY):
+        if alias == BaseDAL.REPLICA:
+            # Read-only copy; same keys as DB_CONFIG
+            db_cfg = getattr(settings, "DB_READ_REPLICA", None) or {}
+            driver = db_cfg.get("driver", "SQL Server")
+            server = db_cfg.get("server")
+            database = db_cfg.get("database")
+        # 1. Check if DB_CONFIG exists in settings.py
+        elif hasattr(settings, "DB_CONFIG"):
+            db_cfg = settings.DB_CONFIG
+            driver = db_cfg.get("driver", "SQL Server")
+            server = db_cfg.get("server")
+            database = db_cfg.get("database")
+        else:
+            # 2. Fallback to default Django DATABASES setting
+            db_cfg = settings.DATABASES["default"]
+            driver = db_cfg.get("OPTIONS", {}).get("driver", "SQL Server")
+            server = db_cfg.get("HOST")
+            database = db_cfg.get("NAME")
+
+        if not server or not database:
+            raise ValueError("Database settings not found in settings.py!")
+
+        conn_str = (
+            f"DRIVER={{{driver}}};"
+            f"SERVER={server};"
+            f"DATABASE={database};"
+            f"Trusted_Connection=yes;"
+            f"Connection Timeout=5;"
+        )
+        if alias == BaseDAL.REPLICA:
+            # AlwaysOn readable secondaries sirf ReadOnly intent wali connections lete hain
+            conn_str += "ApplicationIntent=ReadOnly;"
+        return conn_str
+
+    @staticmethod
+    def has_replica():
+        return bool(getattr(settings, "DB_READ_REPLICA", None))
+
+    @staticmethod
+    def get_pool(alias=PRIMARY):
+        """
+        Lazily builds the process-wide connection pool for alias from settings.DB_POOL
+        and pre-opens its min_size connections.
+        """
+        pool = BaseDAL._pools.get(alias)
+        if pool is None:
+            with BaseDAL._pool_lock:
+                pool = BaseDAL._pools.get(alias)
+                if pool is None:
+                    pool_cfg = getattr(settings, "DB_POOL", {})
+                    pool = BaseDAL._pools[alias] = ConnectionPool(
+                        BaseDAL.get_connection_string(alias),
+                        min_size=pool_cfg.get("min_size", 1),
+                        max_size=pool_cfg.get("max_size", 10),
+                        idle_timeout=pool_cfg.get("idle_timeout", 300),
+                        checkout_timeout=pool_cfg.get("checkout_timeout", 5),
+                        validate_after=pool_cfg.get("validate_after", 30),
+                        # Once per physical connection: no DONE_IN_PROC rowcount sets
+                        init_statements=["SET NOCOUNT ON"],
+                    )
+                    try:
+                        # min_size connections pehli call par hi khol lo
+                        pool.warm_up()
+                    except Exception as e:
+                        # DB abhi down hai - pool lazily connect karega, breaker baqi sambhal lega
+                        print(f"Connection pool warm-up failed ({alias}): {str(e)}")
+        return pool
+
+    @staticmethod
+    def get_breaker(alias=PRIMARY):
+        """Process-wide circuit breaker per alias, configured from settings.DB_CIRCUIT_BREAKER."""
+        breaker = BaseDAL._breakers.get(alias)
+        if breaker is None:
+            with BaseDAL._pool_lock:
+                breaker = BaseDAL._breakers.get(alias)
+                if breaker is None:
+                    cfg = getattr(settings, "DB_CIRCUIT_BREAKER", {})
+                    breaker = BaseDAL._breakers[alias] = CircuitBreaker(
+                        "db" if alias == BaseDAL.PRIMARY else f"db-{alias}",
+                        failure_threshold=cfg.get("failure_threshold", 5),
+                        reset_timeout=cfg.get("reset_timeout", 10),
+                    )
+        return breaker
+
+    # --- Read/write routing ---
+
+    @staticmethod
+    def begin_request(pinned_until=None):
+        """Resets per-thread routing state; pinned_until is a time.time() from the session."""
+        BaseDAL._local.wrote = False
+        BaseDAL._local.pinned_until = pinned_until or 0
+
+    @staticmethod
+    def wrote_in_request():
+        return getattr(BaseDAL._local, "wrote", False)
+
+    @staticmethod
+    def is_pinned_to_primary():
+        """True right after this user wrote, so their next reads see their own data."""
+        if BaseDAL.wrote_in_request() or getattr(BaseDAL._local, "force_primary", False):
+            return True
+        return time.time() < getattr(BaseDAL._local, "pinned_until", 0)
+
     @staticmethod
-    def get_connection():
+    @contextmanager
+    def primary_reads():
+        """
+        Sends every read inside the block to the primary, e.g. when filling a shared
+        cache right after someone else's write that the replica may not have yet.
+        """
+        previous = getattr(BaseDAL._local, "force_primary", False)
+        BaseDAL._local.force_primary = True
         try:
-            # 1. Check if DB_CONFIG exists in settings.py
-            if hasattr(settings, "DB_CONFIG"):
-                db_cfg = settings.DB_CONFIG
-                driver = db_cfg.get("driver", "SQL Server")
-                server = db_cfg.get("server")
-                database = db_cfg.get("database")
-            else:
-                # 2. Fallback to default Django DATABASES setting
-                db_cfg = settings.DATABASES["default"]
-                driver = db_cfg.get("OPTIONS", {}).get("driver", "SQL Server")
-                server = db_cfg.get("HOST")
-                database = db_cfg.get("NAME")
-
-            if not server or not database:
-                raise ValueError("Database settings not found in settings.py!")
-
-            conn_str = (
-                f"DRIVER={{{driver}}};"
-                f"SERVER={server};"
-                f"DATABASE={database};"
-                f"Trusted_Connection=yes;"
-                f"Connection Timeout=5;"
-            )
-            return pyodbc.connect(conn_str)
+            yield
+        finally:
+            BaseDAL._local.force_primary = previous
+
+    @staticmethod
+    def route(sp_name):
+        """
+        PRIMARY for writes, unknown SPs, primary_only reads and pinned users; REPLICA
+        for registered read SPs when settings.DB_READ_REPLICA is configured.
+        Only SPs registered as kind="write" pin the user to the primary afterwards.
+        """
+        spec = SPRegistry.get(sp_name) if sp_name else None
+        if spec is None:
+            # Unregistered SP: safe side primary, lekin isay write nahi maante
+            return BaseDAL.PRIMARY
+        if not spec.is_read:
+            BaseDAL._local.wrote = True
+            return BaseDAL.PRIMARY
+        if spec.primary_only or not BaseDAL.has_replica() or BaseDAL.is_pinned_to_primary():
+            return BaseDAL.PRIMARY
+        return BaseDAL.REPLICA
+
+    @staticmethod
+    def get_connection(sp_name=None):
+        """
+        Checks out a pooled connection, routed by sp_name (see route()).
+        Always hand it back via release_connection.
+        Raises DatabaseUnavailableError immediately while the circuit breaker is open.
+        """
+        alias = BaseDAL.route(sp_name)
+
+        uow_conn = getattr(BaseDAL._local, "uow_conn", None)
+        if uow_conn is not None:
+            return uow_conn
+
+        if alias == BaseDAL.REPLICA:
+            try:
+                conn = BaseDAL.checkout(BaseDAL.REPLICA)
+                BaseDAL._checked_out[id(conn)] = BaseDAL.REPLICA
+                return conn
+            except DatabaseUnavailableError as e:
+                # Replica down - reads primary par chale jate hain
+                print(f"Read replica unavailable, using primary: {str(e)}")
+        return BaseDAL.checkout(BaseDAL.PRIMARY)
+
+    @staticmethod
+    def checkout(alias):
+        breaker = BaseDAL.get_breaker(alias)
+        breaker.before_call()
+        try:
+            return BaseDAL.get_pool(alias).acquire()
         except Exception as e:
-            print(f"CRITICAL Connection Error: {str(e)}")
+            print(f"CRITICAL Connection Error ({alias}): {str(e)}")
+            if isinstance(e, PoolExhaustedError):
+                # Load spike, DB theek hai - breaker nahi khulta, sirf is request ko 503
+                breaker.release_probe()
+                raise DatabaseUnavailableError(str(e)) from e
+            if isinstance(e, pyodbc.Error):
+                if BaseDAL.is_connection_error(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release_probe()
+                raise DatabaseUnavailableError(str(e)) from e
+            breaker.release_probe()
             raise e
 
+    @staticmethod
+    def connection_alias(conn):
+        return BaseDAL._checked_out.get(id(conn), BaseDAL.PRIMARY)
+
+    @staticmethod
+    def release_connection(conn, discard=False):
+        """Returns a connection to the pool it came from (discard=True closes it instead)."""
+        if conn is None:
+            return
+        if conn is getattr(BaseDAL._local, "uow_conn", None):
+            # Unit of work ka connection uske exit par hi wapas jata hai
+            if discard:
+                BaseDAL._local.uow_broken = True
+            return
+        alias = BaseDAL._checked_out.pop(id(conn), BaseDAL.PRIMARY)
+        if not discard:
+            # Connection ne kaam kiya - DB reachable hai
+            BaseDAL.get_breaker(alias).record_success()
+        BaseDAL.get_pool(alias).release(conn, discard=discard)
+
+    @staticmethod
+    def in_unit_of_work():
+        return getattr(BaseDAL._local, "uow_conn", None) is not None
+
+    @staticmethod
+    @contextmanager
+    def unit_of_work():
+        """
+        Runs every BaseDAL call inside the block on ONE connection and ONE transaction.
+
+            with BaseDAL.unit_of_work():
+                BaseDAL.execute_non_query("sp_A", [...])
+                BaseDAL.execute_sp("sp_B", [...])
+
+        Commits when the block exits normally, rolls back if it raises. Inside a unit of
+        work DAL errors are raised instead of being swallowed into [] / error dicts, so a
+        failed step always aborts the whole block. Nested blocks join the outer one.
+        """
+        if BaseDAL.in_unit_of_work():
+            yield BaseDAL._local.uow_conn
+            return
+
+        conn = BaseDAL.get_connection()
+        conn.autocommit = False
+        BaseDAL._local.uow_conn = conn
+        BaseDAL._local.uow_broken = False
+        BaseDAL._local.uow_invalidate = []
+        try:
+            yield conn
+            conn.commit()
+            # Cache sirf commit ke baad saaf karo, warna dusra request purana data dobara cache kar sakta hai
+            ResultCache.invalidate(set(BaseDAL._local.uow_invalidate))
+        except BaseException as e:
+            if BaseDAL.is_connection_error(e):
+                BaseDAL._local.uow_broken = True
+            try:
+                conn.rollback()
+            except Exception:
+                BaseDAL._local.uow_broken = True
+            raise
+        finally:
+            broken = BaseDAL._local.uow_broken
+            BaseDAL._local.uow_conn = None
+            BaseDAL._local.uow_invalidate = []
+            BaseDAL.release_connection(conn, discard=broken)
+
+    @staticmethod
+    def close_cursor(cursor):
+        """Frees the statement handle so a pooled connection is clean for its next user."""
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def is_connection_error(exc):
+        """True for link-level failures where the connection must not go back to the pool."""
+        return isinstance(exc, (pyodbc.OperationalError, pyodbc.InterfaceError))
+
+    @staticmethod
+    def raise_if_unavailable(exc, conn=None):
+        """
+        Re-raises link-level failures as DatabaseUnavailableError (and counts them
+        against conn's circuit breaker) so they never look like an empty result.
+        """
+        if isinstance(exc, DatabaseUnavailableError):
+            raise exc
+        if BaseDAL.is_connection_error(exc):
+            BaseDAL.get_breaker(BaseDAL.connection_alias(conn)).record_failure()
+            raise DatabaseUnavailableError(str(exc)) from exc
+
+    @staticmethod
+    def pool_stats():
+        """Pool hit/miss/wait counters for diagnostics (replica counters prefixed replica_)."""
+        stats = BaseDAL.get_pool().stats()
+        if BaseDAL.has_replica():
+            for key, value in BaseDAL.get_pool(BaseDAL.REPLICA).stats().items():
+                stats[f"replica_{key}"] = value
+        return stats
+
+    # --- Result cache ---
+
+    @staticmethod
+    def cache_ticket(sp_name, params=None):
+        """
+        (key, ttl, tags, token) when this read may use ResultCache, else None.
+        Skipped inside a unit of work and while the user is pinned after a write.
+        """
+        spec = SPRegistry.get(sp_name)
+        if spec is None or not spec.cache_ttl or not ResultCache.is_enabled():
+            return None
+        if BaseDAL.in_unit_of_work() or BaseDAL.is_pinned_to_primary():
+            return None
+        key = (sp_name, tuple(params or ()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        tags = spec.tags_for(params)
+        return (key, spec.cache_ttl, tags, ResultCache.begin(tags))
+
+    @staticmethod
+    def cache_store(ticket, value):
+        if ticket is not None:
+            key, ttl, tags, token = ticket
+            ResultCache.set(key, value, ttl, tags, token)
+
+    @staticmethod
+    def flight_key(sp_name, params=None):
+        """
+        SingleFlight key for SPs registered with coalesce=True, else None.
+        Not used inside a unit of work or for users pinned to the primary after a write.
+        """
+        spec = SPRegistry.get(sp_name)
+        if spec is None or not spec.coalesce:
+            return None
+        if BaseDAL.in_unit_of_work() or BaseDAL.is_pinned_to_primary():
+            return None
+        key = (sp_name, tuple(params or ()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def coalesce_wait():
+        """Seconds a coalesced caller waits for the leader before running the SP itself."""
+        return getattr(settings, "DB_COALESCE_WAIT_SECONDS", 30)
+
+    @staticmethod
+    def after_write(sp_name, params=None):
+        """Drops the cached reads a successful write made stale (deferred to commit in a unit of work)."""
+        spec = SPRegistry.get(sp_name)
+        if spec is None or not spec.invalidates:
+            return
+        tags = spec.invalidation_tags(params)
+        if BaseDAL.in_unit_of_work():
+            BaseDAL._local.uow_invalidate.extend(tags)
+        else:
+            ResultCache.invalidate(tags)
+
+    @staticmethod
+    def build_call(sp_name, params=None):
+        """ODBC call syntax for a stored procedure: {CALL sp (?, ?, ...)} (cached)"""
+        return SPRegistry.call_text(sp_name, len(params) if params else 0)
+
+    @staticmethod
+    def prepare_call(cursor, sp_name, params=None):
+        """
+        Returns the call text and, for SPs registered with param types, binds them
+        explicitly via setinputsizes so the server keeps a single plan per SP.
+        """
+        spec = SPRegistry.get(sp_name)
+        count = len(params) if params else 0
+        if spec is not None and spec.input_sizes is not None and len(spec.input_sizes) == count:
+            cursor.setinputsizes(spec.input_sizes)
+            return spec.call_sql
+        return BaseDAL.build_call(sp_name, params)
+
     @staticmethod
     def execute_sp(sp_name, params=None):
-        """Returns a list of dictionaries with LOWERCASE keys."""
-        conn = None
+        """Returns a list of Row objects (dict-like, LOWERCASE keys)."""
+        ticket = BaseDAL.cache_ticket(sp_name, params)
+        if ticket is not None:
+            cached = ResultCache.get(ticket[0])
+            if cached is not None:
+                return list(cached)
+
+        flight = BaseDAL.flight_key(sp_name, params)
+        if flight is not None:
+            return list(
+                SingleFlight.do(
+                    flight, lambda: BaseDAL.fetch_sp(sp_name, params, ticket), BaseDAL.coalesce_wait()
+                )
+            )
+        return BaseDAL.fetch_sp(sp_name, params, ticket)
+
+    @staticmethod
+    def fetch_sp(sp_name, params=None, ticket=None):
+        """execute_sp without the cache/coalescing front: always runs the SP."""
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
         try:
-            conn = BaseDAL.get_connection()
-            conn.autocommit = True
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
             cursor = conn.cursor()
-            placeholders = ", ".join(["?"] * len(params)) if params else ""
-            sql = f"{{CALL {sp_name} ({placeholders})}}"
-
-            cursor.execute(sql, params or ())
+            cursor.execute(BaseDAL.prepare_call(cursor, sp_name, params), params or ())
 
             results = []
             while True:
                 if cursor.description:
-                    columns = [column[0].lower() for column in cursor.description]
-                    rows = cursor.fetchall()
-                    for row in rows:
-                        row_dict = dict(zip(columns, row))
-                        # VersionID handling for concurrency
-                        if "versionid" in row_dict and row_dict["versionid"]:
-                            row_dict["version_hex"] = row_dict["versionid"].hex()
-                        results.append(row_dict)
+                    schema = RowSchema.from_description(cursor.description)
+                    results = [Row(schema, row) for row in cursor.fetchall()]
+                    timer.rows = len(results)
                     if results:
                         break
 
                 if not cursor.nextset():
                     break
 
-            return results
+            BaseDAL.cache_store(ticket, results)
+            BaseDAL.after_write(sp_name, params)
+            return list(results)
         except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
             print(f"DAL SP Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            if BaseDAL.in_unit_of_work():
+                raise
             return []
         finally:
-            if conn:
-                conn.close()
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
+
+    @staticmethod
+    def iter_sp(sp_name, params=None, batch_size=None):
+        """
+        Generator version of execute_sp: yields rows (LOWERCASE keys) in fetchmany batches.
+        Connection sirf iteration ke dauran checked-out rehta hai; generator close/exhaust
+        hote hi pool mein wapas chala jata hai. Errors are raised, not swallowed, so a
+        half-written stream is never mistaken for an empty result.
+        """
+        batch_size = batch_size or getattr(settings, "DB_FETCH_BATCH_SIZE", 500)
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
+        try:
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
+            cursor = conn.cursor()
+            cursor.execute(BaseDAL.prepare_call(cursor, sp_name, params), params or ())
+
+            while True:
+                if cursor.description:
+                    schema = RowSchema.from_description(cursor.description)
+                    found = False
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        found = True
+                        timer.rows += len(rows)
+                        for row in rows:
+                            yield Row(schema, row)
+                    if found:
+                        break
+
+                if not cursor.nextset():
+                    break
+        except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
+            print(f"DAL SP Stream Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            raise
+        finally:
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
+
+    @staticmethod
+    def iter_result_sets(sp_name, params=None):
+        """
+        Yields every result set of an SP as a list of Rows (LOWERCASE keys), one set at a time.
+        Rowcount-only sets (no cursor.description) are skipped; empty SELECTs still yield []
+        so callers can rely on set positions. Errors are raised to the caller.
+        """
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
+        try:
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
+            cursor = conn.cursor()
+            cursor.execute(BaseDAL.prepare_call(cursor, sp_name, params), params or ())
+
+            while True:
+                if cursor.description:
+                    schema = RowSchema.from_description(cursor.description)
+                    result_set = [Row(schema, row) for row in cursor.fetchall()]
+                    timer.rows += len(result_set)
+                    yield result_set
+
+                if not cursor.nextset():
+                    break
+        except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
+            print(f"DAL SP Multi-Set Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            raise
+        finally:
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
+
+    @staticmethod
+    def execute_sp_multi(sp_name, params=None):
+        """Returns ALL result sets as a list of lists of Rows (LOWERCASE keys)."""
+        ticket = BaseDAL.cache_ticket(sp_name, params)
+        if ticket is not None:
+            cached = ResultCache.get(ticket[0])
+            if cached is not None:
+                return [list(result_set) for result_set in cached]
+
+        try:
+            flight = BaseDAL.flight_key(sp_name, params)
+            if flight is not None:
+                result_sets = SingleFlight.do(
+                    flight,
+                    lambda: list(BaseDAL.iter_result_sets(sp_name, params)),
+                    BaseDAL.coalesce_wait(),
+                )
+            else:
+                result_sets = list(BaseDAL.iter_result_sets(sp_name, params))
+        except DatabaseUnavailableError:
+            raise
+        except Exception:
+            if BaseDAL.in_unit_of_work():
+                raise
+            return []
+
+        BaseDAL.cache_store(ticket, result_sets)
+        BaseDAL.after_write(sp_name, params)
+        return [list(result_set) for result_set in result_sets]
+
+    @staticmethod
+    def build_batch(sp_name, param_list):
+        """EXEC sp ?, ?; EXEC sp ?, ?; ... - one T-SQL batch, one round trip."""
+        statements = []
+        for params in param_list:
+            args = ", ".join(["?"] * len(params))
+            statements.append(f"EXEC {sp_name} {args};" if args else f"EXEC {sp_name};")
+        return "\n".join(statements)
+
+    @staticmethod
+    def execute_sp_batch(sp_name, param_list):
+        """
+        Runs the same read SP once per params entry in ONE round trip and returns every
+        result set in order (list of lists of Rows). Meant for SPs that return exactly one
+        set per call, e.g. several sp_Common_GetLookup types for one form.
+        Returns [] on error (raised inside a unit of work).
+        """
+        param_list = [list(p) for p in param_list]
+        if not param_list:
+            return []
+
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
+        try:
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
+            cursor = conn.cursor()
+            flat = [value for params in param_list for value in params]
+            cursor.execute(BaseDAL.build_batch(sp_name, param_list), flat)
+
+            result_sets = []
+            while True:
+                if cursor.description:
+                    schema = RowSchema.from_description(cursor.description)
+                    result_sets.append([Row(schema, row) for row in cursor.fetchall()])
+                    timer.rows += len(result_sets[-1])
+                if not cursor.nextset():
+                    break
+            return result_sets
+        except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
+            print(f"DAL SP Batch Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            if BaseDAL.in_unit_of_work():
+                raise
+            return []
+        finally:
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
 
     @staticmethod
     def execute_non_query(sp_name, params=None):
         """Used for INSERT, UPDATE, DELETE - Returns {status, message}"""
-        conn = None
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
         try:
-            conn = BaseDAL.get_connection()
-            conn.autocommit = True
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
             cursor = conn.cursor()
-            placeholders = ", ".join(["?"] * len(params)) if params else ""
-            sql = f"{{CALL {sp_name} ({placeholders})}}"
-
-            cursor.execute(sql, params or ())
+            cursor.execute(BaseDAL.prepare_call(cursor, sp_name, params), params or ())
 
             # SP se success/error message fetch karna (agar SP return kare)
             row = None
             if cursor.description:
                 row = cursor.fetchone()
 
+            BaseDAL.after_write(sp_name, params)
             if row:
+                timer.rows = 1
                 columns = [column[0].lower() for column in cursor.description]
                 return dict(zip(columns, row))
 
             return {"status": "success", "message": "Operation completed."}
         except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
             print(f"DAL Non-Query Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            if BaseDAL.in_unit_of_work():
+                raise
             return {"status": "error", "message": str(e)}
         finally:
-            if conn:
-                conn.close()
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
+
+    @staticmethod
+    def build_output_batch(sp_name, param_count, output_types):
+        """
+        One T-SQL batch that declares the OUTPUT variables, runs the SP and selects them:
+            DECLARE @o0 INT, ...; EXEC sp ?, ?, @o0 OUTPUT, ...; SELECT @o0, ...
+        OUTPUT parameters are assumed to be the SP's LAST parameters (our SP convention).
+        """
+        for sql_type in output_types:
+            if not _SQL_TYPE_RE.match(sql_type.strip()):
+                raise ValueError(f"Invalid OUTPUT type for {sp_name}: {sql_type!r}")
+
+        names = [f"@o{i}" for i in range(len(output_types))]
+        declare = ", ".join(f"{n} {t}" for n, t in zip(names, output_types))
+        args = ["?"] * param_count + [f"{n} OUTPUT" for n in names]
+        select = ", ".join(f"{n} AS o{i}" for i, n in enumerate(names))
+        return (
+            "SET NOCOUNT ON; "
+            f"DECLARE {declare}; "
+            f"EXEC {sp_name} {', '.join(args)}; "
+            f"SELECT {select};"
+        )
+
+    @staticmethod
+    def execute_sp_with_outputs(sp_name, params=None, output_count=0, output_types=None):
+        """
+        Runs an SP with OUTPUT parameters in a single round trip.
+        Returns {"result_sets": [...], "output_params": [...]} - result_sets holds whatever the
+        SP itself SELECTs (Rows, LOWERCASE keys), output_params the OUTPUT values in order.
+        output_types are T-SQL types for the OUTPUT variables (default NVARCHAR(4000)).
+        """
+        params = list(params or [])
+        output_types = list(output_types or [])
+        output_types += ["NVARCHAR(4000)"] * (output_count - len(output_types))
+
+        timer = SPTimer(sp_name)
+        conn = cursor = None
+        broken = False
+        try:
+            sql = BaseDAL.build_output_batch(sp_name, len(params), output_types)
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+
+            result_sets = []
+            while True:
+                if cursor.description:
+                    schema = RowSchema.from_description(cursor.description)
+                    result_sets.append([Row(schema, row) for row in cursor.fetchall()])
+                if not cursor.nextset():
+                    break
+
+            # Last set is our SELECT of the OUTPUT variables
+            output_params = []
+            if output_types and result_sets:
+                out_rows = result_sets.pop()
+                output_params = list(out_rows[0].values()) if out_rows else []
+            timer.rows = sum(len(rs) for rs in result_sets)
+
+            BaseDAL.after_write(sp_name, params)
+            return {"result_sets": result_sets, "output_params": output_params}
+        except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
+            print(f"DAL SP Output Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            if BaseDAL.in_unit_of_work():
+                raise
+            return {"result_sets": [], "output_params": [], "message": str(e)}
+        finally:
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
+
+    @staticmethod
+    def execute_bulk(sp_name, param_rows, atomic=True):
+        """
+        Runs one SP for many parameter rows in a single round trip (fast_executemany).
+        Returns one {status, message} dict per input row, in input order.
+
+        Agar batch fail ho jaye to rows usi connection par ek ek kar ke replay hoti hain
+        taake pata chale kaunsi row fail hui. With atomic=True nothing is committed unless
+        every row succeeds. Inside a unit_of_work the batch joins the outer transaction
+        and a failure is raised so the whole unit rolls back.
+        """
+        rows = [tuple(r) for r in param_rows]
+        if not rows:
+            return []
+
+        ok = {"status": "success", "message": "Operation completed."}
+
+        timer = SPTimer(sp_name)
+        if BaseDAL.in_unit_of_work():
+            cursor = timer.connection(BaseDAL.get_connection, sp_name).cursor()
+            try:
+                sql = BaseDAL.prepare_call(cursor, sp_name, rows[0])
+                cursor.fast_executemany = True
+                cursor.executemany(sql, rows)
+                for row in rows:
+                    BaseDAL.after_write(sp_name, row)
+                return [dict(ok) for _ in rows]
+            except Exception as e:
+                timer.error = True
+                print(f"DAL Bulk Error ({sp_name}): {str(e)}")
+                BaseDAL.raise_if_unavailable(e)
+                raise
+            finally:
+                BaseDAL.close_cursor(cursor)
+                timer.finish()
+
+        conn = cursor = None
+        broken = False
+        try:
+            conn = timer.connection(BaseDAL.get_connection, sp_name)
+            conn.autocommit = False
+            cursor = conn.cursor()
+            sql = BaseDAL.prepare_call(cursor, sp_name, rows[0])
+            try:
+                cursor.fast_executemany = True
+                cursor.executemany(sql, rows)
+                conn.commit()
+                for row in rows:
+                    BaseDAL.after_write(sp_name, row)
+                return [dict(ok) for _ in rows]
+            except pyodbc.Error as e:
+                conn.rollback()
+                if BaseDAL.is_connection_error(e):
+                    raise
+                print(f"DAL Bulk Error ({sp_name}): {str(e)} - replaying row by row")
+
+            BaseDAL.close_cursor(cursor)
+            cursor = conn.cursor()
+            BaseDAL.prepare_call(cursor, sp_name, rows[0])
+            statuses = []
+            for row in rows:
+                try:
+                    cursor.execute(sql, row)
+                    statuses.append(dict(ok))
+                except pyodbc.Error as e:
+                    if BaseDAL.is_connection_error(e):
+                        raise
+                    statuses.append({"status": "error", "message": str(e)})
+
+            failed = any(st["status"] == "error" for st in statuses)
+            timer.error = failed
+            if atomic and failed:
+                conn.rollback()
+                for st in statuses:
+                    if st["status"] == "success":
+                        st.update(status="rolled_back", message="Rolled back (batch failed).")
+            else:
+                conn.commit()
+                for row, st in zip(rows, statuses):
+                    if st["status"] == "success":
+                        BaseDAL.after_write(sp_name, row)
+            return statuses
+        except Exception as e:
+            timer.error = True
+            broken = BaseDAL.is_connection_error(e)
+            print(f"DAL Bulk Error ({sp_name}): {str(e)}")
+            BaseDAL.raise_if_unavailable(e, conn)
+            return [{"status": "error", "message": str(e)} for _ in rows]
+        finally:
+            BaseDAL.close_cursor(cursor)
+            BaseDAL.release_connection(conn, discard=broken)
+            timer.finish()
 
     @staticmethod
     def execute_sp_single_row(sp_name, params=None):
-        """Returns a single dictionary with LOWERCASE keys."""
+        """Returns a single Row (dict-like, LOWERCASE keys)."""
         results = BaseDAL.execute_sp(sp_name, params)
         return results[0] if results else None
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from .error_handler import DatabaseUnavailableError
+
+
+class CircuitBreaker:
+    """
+    Fail-fast guard around database access.
+
+    CLOSED    - normal; consecutive connection failures are counted.
+    OPEN      - after failure_threshold failures every call fails immediately for reset_timeout seconds.
+    HALF_OPEN - one probe call is let through; success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name="db", failure_threshold=5, reset_timeout=10):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._stats = {"rejected": 0, "trips": 0}
+
+    def before_call(self):
+        """Raises DatabaseUnavailableError without touching the network while the circuit is open."""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return
+
+            now = time.monotonic()
+            if self._state == CircuitBreaker.OPEN:
+                if now - self._opened_at >= self.reset_timeout:
+                    self._state = CircuitBreaker.HALF_OPEN
+                    self._probe_started = now
+                    return
+            elif self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                # HALF_OPEN: no probe running (or it never reported back) - send one
+                self._probe_started = now
+                return
+
+            self._stats["rejected"] += 1
+            retry_in = max(0.0, self.reset_timeout - (now - self._opened_at))
+
+        raise DatabaseUnavailableError(
+            f"Database circuit '{self.name}' is open; retry in {retry_in:.0f}s."
+        )
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            self._state = CircuitBreaker.CLOSED
+
+    def release_probe(self):
+        """The call ended without telling us anything about the DB (e.g. pool full): let another probe through."""
+        with self._lock:
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if (
+                self._state == CircuitBreaker.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                if self._state != CircuitBreaker.OPEN:
+                    self._stats["trips"] += 1
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["state"] = self._state
+            data["consecutive_failures"] = self._failures
+        return data
@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import deque
+
+import pyodbc
+
+from .error_handler import PoolExhaustedError
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pyodbc connections.
+    Har SP call par naya TDS login karne ke bajaye connections yahan reuse hoti hain.
+    """
+
+    def __init__(
+        self,
+        conn_str,
+        min_size=1,
+        max_size=10,
+        idle_timeout=300,
+        checkout_timeout=5,
+        validate_after=30,
+        init_statements=None,
+    ):
+        self.conn_str = conn_str
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size))
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        # Connections used within this many seconds skip the liveness ping
+        self.validate_after = validate_after
+        # Session setup run once on every new physical connection (e.g. SET NOCOUNT ON)
+        self.init_statements = list(init_statements or [])
+
+        self._idle = deque()  # (conn, last_used) pairs, most recent on the right
+        self._size = 0  # open connections (idle + checked out)
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "evicted": 0,
+            "discarded": 0,
+        }
+
+    # --- Public API ---
+
+    def acquire(self):
+        """Checks out a live connection, waiting up to checkout_timeout if the pool is full."""
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        wait_start = None
+
+        while True:
+            with self._cond:
+                self._evict_idle()
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._stats["hits"] += 1
+                    self._record_wait(waited, wait_start)
+                elif self._size < self.max_size:
+                    # Slot reserve karke lock ke bahar connect karte hain
+                    self._size += 1
+                    self._stats["misses"] += 1
+                    self._record_wait(waited, wait_start)
+                    conn, last_used = None, None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        self._record_wait(waited, wait_start)
+                        raise PoolExhaustedError(
+                            f"No database connection free after {self.checkout_timeout}s "
+                            f"(pool size {self.max_size})."
+                        )
+                    if not waited:
+                        waited = True
+                        wait_start = time.monotonic()
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if self._is_alive(conn, last_used):
+                return conn
+
+            # Stale connection (server restart, network drop) - discard and retry
+            self._close(conn)
+            self._release_slot(discarded=True)
+
+    def release(self, conn, discard=False):
+        """Returns a connection to the pool. Broken connections should be discarded."""
+        if conn is None:
+            return
+
+        if not discard:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()
+                conn.autocommit = True
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close(conn)
+            self._release_slot(discarded=True)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def warm_up(self):
+        """Opens connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["size"] = self._size
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._size - len(self._idle)
+            data["max_size"] = self.max_size
+        return data
+
+    # --- Internals ---
+
+    def _connect(self):
+        conn = pyodbc.connect(self.conn_str)
+        conn.autocommit = True
+        try:
+            for statement in self.init_statements:
+                conn.execute(statement)
+        except Exception:
+            self._close(conn)
+            raise
+        return conn
+
+    def _is_alive(self, conn, last_used):
+        if last_used is not None and time.monotonic() - last_used < self.validate_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self):
+        """Closes connections idle for longer than idle_timeout, keeping min_size. Lock must be held."""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        # Oldest connections sit on the left
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["evicted"] += 1
+            self._close(conn)
+
+    def _release_slot(self, discarded=False):
+        with self._cond:
+            self._size -= 1
+            if discarded:
+                self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _record_wait(self, waited, wait_start):
+        if waited:
+            self._stats["wait_time"] += time.monotonic() - wait_start
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
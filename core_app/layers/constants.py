@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntFlag
 
 class DBErrorCodes(Enum):
     CONCURRENCY_VIOLATION = 50001
@@ -10,4 +10,42 @@ class PermissionType(Enum):
     CAN_VIEW = "CanView"
     CAN_CREATE = "CanCreate"
     CAN_EDIT = "CanEdit"
-    CAN_DELETE = "CanDelete"
\ No newline at end of file
+    CAN_DELETE = "CanDelete"
+
+class ModuleKey:
+    """Menu keys (VCMDKKEY in sp_Get_User_Rights_Matrix) guarded by @requires."""
+
+    CASH_BOOK = "CASH_BOOK"
+    JOURNAL = "JOURNAL"
+    USER_MGMT = "USER_MGMT"
+
+class PermissionFlag(IntFlag):
+    """Bitmask form of PermissionType (one int per module in the permission index)."""
+
+    NONE = 0
+    VIEW = 1
+    CREATE = 2
+    EDIT = 4
+    DELETE = 8
+
+    @classmethod
+    def of(cls, right):
+        """PermissionType / PermissionFlag / 'view', 'add', 'create', 'edit', 'delete' -> flag"""
+        if isinstance(right, cls):
+            return right
+        if isinstance(right, PermissionType):
+            right = right.value
+        return _RIGHT_ALIASES.get(str(right).lower(), cls.NONE)
+
+
+_RIGHT_ALIASES = {
+    "canview": PermissionFlag.VIEW,
+    "view": PermissionFlag.VIEW,
+    "cancreate": PermissionFlag.CREATE,
+    "create": PermissionFlag.CREATE,
+    "add": PermissionFlag.CREATE,
+    "canedit": PermissionFlag.EDIT,
+    "edit": PermissionFlag.EDIT,
+    "candelete": PermissionFlag.DELETE,
+    "delete": PermissionFlag.DELETE,
+}
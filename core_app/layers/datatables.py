@@ -0,0 +1,149 @@
+from .result_cache import ResultCache
+
+
+class DataTablesRequest:
+    """
+    Parsed DataTables server-side request (draw, start, length, search[value], order[i]).
+    order is a list of (column data name, descending) for the columns the view allows;
+    the client's columns[i][orderable] flags are not trusted.
+    """
+
+    MAX_LENGTH = 500  # length=-1 ("All") bhi isi par cap hota hai
+
+    __slots__ = ("draw", "start", "length", "search", "order")
+
+    def __init__(self, draw=1, start=0, length=10, search="", order=()):
+        self.draw = draw
+        self.start = start
+        self.length = length
+        self.search = search
+        self.order = list(order)
+
+    @staticmethod
+    def parse(query, orderable=()):
+        """
+        query: request.GET / request.POST (any mapping with .get).
+        orderable: column data names the view lets the client sort by - others are ignored.
+        """
+        draw = DataTablesRequest._int(query.get("draw"), 1)
+        start = max(0, DataTablesRequest._int(query.get("start"), 0))
+        length = DataTablesRequest._int(query.get("length"), 10)
+        if length < 0 or length > DataTablesRequest.MAX_LENGTH:
+            length = DataTablesRequest.MAX_LENGTH
+        search = (query.get("search[value]") or "").strip()
+
+        order = []
+        i = 0
+        while f"order[{i}][column]" in query:
+            column = query.get(f"order[{i}][column]")
+            name = query.get(f"columns[{column}][data]")
+            if name in orderable:
+                order.append((name, query.get(f"order[{i}][dir]") == "desc"))
+            i += 1
+        return DataTablesRequest(draw, start, length, search, order)
+
+    @staticmethod
+    def _int(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+
+class DataTablesAdapter:
+    """
+    Server-side processing for DataTables on top of a list SP.
+
+        return JsonResponse(DataTablesAdapter.respond(
+            request.GET,
+            fetch=lambda term: JournalBLL.get_journal_list(service_id, d1, d2, term),
+            count_key=("journal", service_id, d1, d2),
+            count_tags=[f"journal:{service_id}"],
+            orderable=("vcgjnmbr", "mngjamnt_disp"),
+        ), encoder=RowJSONEncoder)
+
+    fetch(search_term) returns every row matching the filter + search (the SP does the
+    search; its rows come from the ResultCache). Ordering and the page slice happen
+    here, so the browser only receives one page per draw. recordsTotal (the unsearched
+    count) is cached per filter under count_tags, so typing in the search box does not
+    re-run the unsearched list; writes that invalidate the tags drop the count too.
+
+    Lists longer than DB_RESULT_CACHE["max_entry_rows"] are not cached, so every draw of
+    such a list re-runs the SP - keep the date range of big lists small.
+    """
+
+    COUNT_TTL = 60
+
+    @staticmethod
+    def respond(query, fetch, count_key, count_tags=(), sort_keys=None, orderable=()):
+        dt = DataTablesRequest.parse(query, orderable)
+        rows = fetch(dt.search)
+
+        if dt.search:
+            total = DataTablesAdapter.total_count(fetch, count_key, count_tags)
+        else:
+            total = len(rows)
+            DataTablesAdapter.store_count(count_key, count_tags, total)
+
+        if dt.order:
+            rows = DataTablesAdapter.sort_rows(rows, dt.order, sort_keys or {})
+
+        return {
+            "draw": dt.draw,
+            "recordsTotal": total,
+            "recordsFiltered": len(rows),
+            "data": list(rows[dt.start : dt.start + dt.length]),
+        }
+
+    @staticmethod
+    def total_count(fetch, count_key, count_tags=()):
+        key = ("datatables:count",) + tuple(count_key)
+        if ResultCache.is_enabled():
+            total = ResultCache.get(key)
+            if total is not None:
+                return total
+        token = ResultCache.begin(count_tags)
+        total = len(fetch(""))
+        DataTablesAdapter.store_count(count_key, count_tags, total, token)
+        return total
+
+    @staticmethod
+    def store_count(count_key, count_tags, total, token=None):
+        # 0 cache nahi karte - failed SP call bhi [] deta hai
+        if total and ResultCache.is_enabled():
+            ResultCache.set(
+                ("datatables:count",) + tuple(count_key),
+                total,
+                DataTablesAdapter.COUNT_TTL,
+                count_tags,
+                token,
+            )
+
+    @staticmethod
+    def sort_rows(rows, order, sort_keys):
+        """
+        New list sorted by [(column, descending), ...]; the cached SP list is not touched.
+        sort_keys maps a display column to its raw column ("mngjamnt_disp" -> "mngjamnt").
+        """
+        rows = list(rows)
+        # Stable sort: last order column first, primary column last
+        for name, descending in reversed(order):
+            column = sort_keys.get(name, name)
+            keys = [DataTablesAdapter._sort_value(row, column, name) for row in rows]
+            try:
+                positions = sorted(range(len(rows)), key=keys.__getitem__, reverse=descending)
+            except TypeError:
+                # Mixed types in one column - compare as text
+                keys = [(flag, str(value)) for flag, value in keys]
+                positions = sorted(range(len(rows)), key=keys.__getitem__, reverse=descending)
+            rows = [rows[pos] for pos in positions]
+        return rows
+
+    @staticmethod
+    def _sort_value(row, column, fallback):
+        value = row.get(column) if column in row else row.get(fallback)
+        if value is None:
+            return (0, "")  # NULLs pehle (ascending)
+        if isinstance(value, str):
+            return (1, value.casefold())
+        return (1, value)
@@ -0,0 +1,10 @@
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class DatabaseUnavailableError(Exception):
+    """
+    SQL Server is unreachable or the circuit breaker is open.
+    Views must NOT turn this into an empty list - DatabaseUnavailableMiddleware
+    converts it into a 503 response.
+    """
@@ -0,0 +1,245 @@
+import csv
+import io
+import itertools
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer: whatever csv/zipfile wrote since the last drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class StreamingExport:
+    """
+    CSV / XLSX downloads streamed row by row from a DAL iterator (BaseDAL.iter_sp).
+
+        return StreamingExport.response(
+            "cash_book_2026-01", request.GET.get("format"), CASH_BOOK_COLUMNS,
+            TransactionBLL.iter_cash_book_list(service_id, d1, d2),
+        )
+
+    columns = [(header, row key), ...]. Rows are written in batches of FLUSH_ROWS and
+    each batch is sent as soon as it is encoded, so memory stays flat however long the
+    range. The first row is pulled before the response starts: SP errors still become
+    a normal error response, later ones cut the stream (a CSV gets a last error line,
+    an XLSX is left unreadable) instead of looking like a short but complete file.
+    CSV text that a spreadsheet would run as a formula (= + - @) gets a leading quote.
+    """
+
+    FLUSH_ROWS = 500
+    FORMATS = {
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    }
+
+    @staticmethod
+    def response(filename, export_format, columns, rows, sheet_name="Sheet1"):
+        export_format = (export_format or "csv").lower()
+        if export_format not in StreamingExport.FORMATS:
+            export_format = "csv"
+        content_type, extension = StreamingExport.FORMATS[export_format]
+
+        source = iter(rows)
+        first = next(source, None)  # SP yahin chal jata hai - error abhi bhi normal response ban sakta hai
+        rows = itertools.chain([first], source) if first is not None else source
+
+        if export_format == "xlsx":
+            body = StreamingExport.xlsx_chunks(columns, rows, sheet_name)
+        else:
+            body = StreamingExport.csv_chunks(columns, rows)
+
+        response = StreamingHttpResponse(StreamingExport._closing(body, source), content_type=content_type)
+        safe_name = re.sub(r"[^\w.-]+", "_", filename) or "export"
+        response["Content-Disposition"] = f'attachment; filename="{safe_name}.{extension}"'
+        response["X-Accel-Buffering"] = "no"  # nginx ko buffer na karne dein
+        return response
+
+    # --- CSV ---
+
+    @staticmethod
+    def csv_chunks(columns, rows):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        text.write("\ufeff")  # BOM - Excel UTF-8 (Urdu names) sahi khole
+        writer.writerow([header for header, _ in columns])
+        yield StreamingExport._take(text).encode("utf-8")
+
+        try:
+            for batch in StreamingExport._batches(rows):
+                for row in batch:
+                    writer.writerow([StreamingExport._csv_value(row.get(key)) for _, key in columns])
+                yield StreamingExport._take(text).encode("utf-8")
+        except Exception as e:
+            print(f"--- EXPORT ERROR (CSV): {str(e)} ---")
+            writer.writerow(["ERROR: export incomplete"])
+            yield StreamingExport._take(text).encode("utf-8")
+
+    # Excel / Sheets inhein formula samajhte hain (CSV injection)
+    _FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+    @staticmethod
+    def _csv_value(value):
+        if value is None:
+            return ""
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, str) and value.startswith(StreamingExport._FORMULA_PREFIXES):
+            return "'" + value
+        return value
+
+    # --- XLSX ---
+
+    @staticmethod
+    def xlsx_chunks(columns, rows, sheet_name="Sheet1"):
+        """Minimal SpreadsheetML package, zipped on the fly (one sheet, inline strings)."""
+        sink = _Sink()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as package:
+            for name, xml in StreamingExport._xlsx_parts(sheet_name).items():
+                package.writestr(name, xml)
+            yield sink.drain()
+
+            with package.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+                sheet.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b"<sheetData>"
+                )
+                sheet.write(StreamingExport._xlsx_row([header for header, _ in columns], bold=True))
+                try:
+                    for batch in StreamingExport._batches(rows):
+                        sheet.write(
+                            b"".join(
+                                StreamingExport._xlsx_row([row.get(key) for _, key in columns])
+                                for row in batch
+                            )
+                        )
+                        data = sink.drain()
+                        if data:
+                            yield data
+                except Exception as e:
+                    # Adhoori file complete na lage - zip band kiye baghair stream khatam
+                    print(f"--- EXPORT ERROR (XLSX): {str(e)} ---")
+                    return
+                sheet.write(b"</sheetData></worksheet>")
+        yield sink.drain()
+
+    # Excel ke liye XML 1.0 mein na chalne wale control characters
+    _ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+    _EXCEL_EPOCH = date(1899, 12, 30)
+
+    @staticmethod
+    def _xlsx_row(values, bold=False):
+        cells = []
+        for value in values:
+            if value is None or value == "":
+                cells.append("<c/>")
+            elif isinstance(value, bool):
+                cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float, Decimal)):
+                cells.append(f"<c><v>{value}</v></c>")
+            elif isinstance(value, (date, datetime)):
+                day = value.date() if isinstance(value, datetime) else value
+                cells.append(f'<c s="1"><v>{(day - StreamingExport._EXCEL_EPOCH).days}</v></c>')
+            else:
+                text = escape(StreamingExport._ILLEGAL_XML.sub("", str(value)))
+                style = ' s="2"' if bold else ""
+                cells.append(f'<c t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>')
+        return f"<row>{''.join(cells)}</row>".encode("utf-8")
+
+    @staticmethod
+    def _xlsx_parts(sheet_name):
+        sheet_name = escape(re.sub(r"[\[\]\*\?/\\:]", "", sheet_name)[:31] or "Sheet1", {'"': "&quot;"})
+        main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+        rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+        pkg = "http://schemas.openxmlformats.org/package/2006"
+        return {
+            "[Content_Types].xml": (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{pkg}/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>'
+                '<Override PartName="/xl/workbook.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                '<Override PartName="/xl/worksheets/sheet1.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                '<Override PartName="/xl/styles.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                "</Types>"
+            ),
+            "_rels/.rels": (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{pkg}/relationships">'
+                f'<Relationship Id="rId1" Type="{rel}/officeDocument" Target="xl/workbook.xml"/>'
+                "</Relationships>"
+            ),
+            "xl/workbook.xml": (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{main}" xmlns:r="{rel}">'
+                f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+            ),
+            "xl/_rels/workbook.xml.rels": (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{pkg}/relationships">'
+                f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/>'
+                f'<Relationship Id="rId2" Type="{rel}/styles" Target="styles.xml"/>'
+                "</Relationships>"
+            ),
+            # Style 0 = default, 1 = date (numFmt 14), 2 = bold header
+            "xl/styles.xml": (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<styleSheet xmlns="{main}">'
+                '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+                '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+                '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+                '<fill><patternFill patternType="gray125"/></fill></fills>'
+                '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+                '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+                '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+                '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+                "</styleSheet>"
+            ),
+        }
+
+    # --- Helpers ---
+
+    @staticmethod
+    def _batches(rows):
+        while True:
+            batch = list(itertools.islice(rows, StreamingExport.FLUSH_ROWS))
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def _closing(body, source):
+        """Client disconnect bhi ho to SP ka connection foran pool mein wapas jaye."""
+        try:
+            yield from body
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    def _take(text):
+        data = text.getvalue()
+        text.seek(0)
+        text.truncate()
+        return data
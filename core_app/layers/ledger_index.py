@@ -0,0 +1,298 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.core.cache import cache
+
+
+class FenwickTree:
+    """Prefix sums over positions 0..size-1 (integer amounts), O(log n) add and query."""
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = array("q", [0]) * (size + 1)
+
+    @staticmethod
+    def from_values(values):
+        """Tree over values[0..n-1], built in O(n)."""
+        fenwick = FenwickTree(len(values))
+        tree = fenwick.tree
+        for pos, value in enumerate(values, 1):
+            tree[pos] += value
+            parent = pos + (pos & -pos)
+            if parent <= fenwick.size:
+                tree[parent] += tree[pos]
+        return fenwick
+
+    def add(self, pos, delta):
+        pos += 1
+        while pos <= self.size:
+            self.tree[pos] += delta
+            pos += pos & -pos
+
+    def prefix(self, pos):
+        """Sum of positions 0..pos (inclusive)."""
+        if pos < 0:
+            return 0
+        pos = min(pos, self.size - 1) + 1
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+
+class _AccountSeries:
+    """
+    One account's daily deltas, stored only for days that have postings: sorted day
+    numbers + a FenwickTree over their totals. A posting on a new day rebuilds the
+    tree (O(days of this account)); posting on a known day and queries are O(log n).
+    """
+
+    __slots__ = ("days", "totals", "tree")
+
+    def __init__(self, totals_by_day):
+        self.days = array("l", sorted(totals_by_day))
+        self.totals = array("q", (totals_by_day[day] for day in self.days))
+        self.tree = FenwickTree.from_values(self.totals)
+
+    def add(self, day, delta):
+        pos = bisect_left(self.days, day)
+        if pos < len(self.days) and self.days[pos] == day:
+            self.totals[pos] += delta
+            self.tree.add(pos, delta)
+            return
+        self.days.insert(pos, day)
+        self.totals.insert(pos, delta)
+        self.tree = FenwickTree.from_values(self.totals)
+
+    def prefix(self, day):
+        """Sum of deltas on days <= day."""
+        return self.tree.prefix(bisect_right(self.days, day) - 1)
+
+
+class LedgerIndex:
+    """
+    One service's account ledger: per account an _AccountSeries of daily deltas (in
+    paisa), keyed by date ordinal, so memory follows the number of posting days and
+    not the length of the history. Every posting is remembered under its row key so
+    an edit or delete can take the old amounts back out.
+
+        index.post(("c", 101), [(acc, day, +5000), ("CASH", day, -5000)])
+        index.balance(acc, day)          # sum of deltas up to and including day
+        index.movement(acc, d1, d2)      # sum of deltas in [d1, d2]
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.series = {}  # account -> _AccountSeries
+        self.entries = {}  # row key -> [(account, day ordinal, amount)]
+
+    @staticmethod
+    def build(version, rows):
+        """Bulk load from [(row key, postings), ...]; a repeated key keeps its last postings."""
+        index = LedgerIndex(version)
+        for key, postings in rows:
+            index.entries[key] = [(account, day.toordinal(), amount) for account, day, amount in postings]
+        totals = {}
+        for resolved in index.entries.values():
+            for account, day, amount in resolved:
+                by_day = totals.setdefault(account, {})
+                by_day[day] = by_day.get(day, 0) + amount
+        index.series = {account: _AccountSeries(by_day) for account, by_day in totals.items()}
+        return index
+
+    def post(self, key, postings):
+        """Adds (or replaces) a row's postings."""
+        if key in self.entries:
+            self.unpost(key)
+        resolved = [(account, day.toordinal(), amount) for account, day, amount in postings]
+        for account, day, amount in resolved:
+            series = self.series.get(account)
+            if series is None:
+                self.series[account] = _AccountSeries({day: amount})
+            else:
+                series.add(day, amount)
+        self.entries[key] = resolved
+        return True
+
+    def unpost(self, key):
+        """Takes a row's postings back out. False when the row is not in the index."""
+        resolved = self.entries.pop(key, None)
+        if resolved is None:
+            return False
+        for account, day, amount in resolved:
+            self.series[account].add(day, -amount)
+        return True
+
+    def apply_change(self, key, postings, must_exist):
+        """
+        One committed write: postings=None deletes the row. False when an edit/delete
+        names a row this index never saw (the caller reloads instead).
+        """
+        if must_exist and key not in self.entries:
+            return False
+        if postings is None:
+            return self.unpost(key)
+        return self.post(key, postings)
+
+    def balance(self, account, day):
+        series = self.series.get(account)
+        if series is None:
+            return 0
+        return series.prefix(day.toordinal())
+
+    def movement(self, account, from_day, to_day):
+        if from_day > to_day:
+            return 0
+        return self.balance(account, to_day) - self.balance(account, from_day - timedelta(days=1))
+
+    def accounts(self):
+        return list(self.series)
+
+
+class LedgerIndexRegistry:
+    """
+    LedgerIndex per service in each worker process. Workers share nothing but the
+    Django cache, so they only stay in step when CACHES is a cache shared by all of
+    them (see settings): a version counter per service plus a short log of changes.
+
+    - apply(service_id, key, postings, must_exist) after a committed write bumps the
+      version and stores the change under that version in the cache
+    - an index behind the current version replays the missing changes from the log;
+      if any is gone (expired, evicted, too far behind) it is rebuilt via load()
+
+    load(service_id) returns [(row key, postings), ...].
+    """
+
+    REPLAY_LIMIT = 200  # more missed writes than this -> reload instead of replaying
+    LOG_TTL = 3600  # seconds a change stays in the log
+
+    _lock = threading.Lock()
+    _indexes = {}  # service_id -> LedgerIndex
+    _load_locks = {}  # service_id -> Lock (one full load per service at a time)
+    _stats = {"loads": 0, "patches": 0, "replays": 0, "drops": 0}
+
+    @staticmethod
+    def version_key(service_id):
+        return f"ledger_ver:{service_id}"
+
+    @staticmethod
+    def log_key(service_id, version):
+        return f"ledger_log:{service_id}:{version}"
+
+    @staticmethod
+    def current_version(service_id):
+        key = LedgerIndexRegistry.version_key(service_id)
+        version = cache.get(key)
+        if version is None:
+            # Time-based start so an evicted counter never reuses an old version
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        return version
+
+    @staticmethod
+    def bump_version(service_id):
+        key = LedgerIndexRegistry.version_key(service_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            version = time.time_ns()
+            cache.set(key, version, None)
+            return version
+
+    @staticmethod
+    def get(service_id, load):
+        version = LedgerIndexRegistry.current_version(service_id)
+        with LedgerIndexRegistry._lock:
+            index = LedgerIndexRegistry._cached(service_id, version)
+            if index is not None:
+                return index
+            load_lock = LedgerIndexRegistry._load_locks.setdefault(service_id, threading.Lock())
+
+        # Ek service ka poora load ek waqt mein ek hi request chalaye; baaki intezar karein
+        with load_lock:
+            with LedgerIndexRegistry._lock:
+                index = LedgerIndexRegistry._cached(service_id, version)
+                if index is not None:
+                    return index  # loaded while we waited
+
+            # Version pehle parha - load ke dauran write hua to agli read replay/reload karegi
+            index = LedgerIndex.build(version, load(service_id))
+            with LedgerIndexRegistry._lock:
+                LedgerIndexRegistry._indexes[service_id] = index
+                LedgerIndexRegistry._stats["loads"] += 1
+        return index
+
+    @staticmethod
+    def _cached(service_id, version):
+        """The in-memory index brought up to `version` (call with _lock held), or None."""
+        index = LedgerIndexRegistry._indexes.get(service_id)
+        if index is None:
+            return None
+        if index.version >= version:
+            return index
+        if LedgerIndexRegistry._catch_up(service_id, index, version):
+            LedgerIndexRegistry._stats["replays"] += 1
+            return index
+        return None
+
+    @staticmethod
+    def apply(service_id, key, postings, must_exist):
+        """Call after a committed write; postings=None for a delete."""
+        new_version = LedgerIndexRegistry.bump_version(service_id)
+        cache.set(
+            LedgerIndexRegistry.log_key(service_id, new_version),
+            (key, postings, must_exist),
+            LedgerIndexRegistry.LOG_TTL,
+        )
+        with LedgerIndexRegistry._lock:
+            index = LedgerIndexRegistry._indexes.get(service_id)
+            if index is None:
+                return
+            if index.version == new_version - 1 and index.apply_change(key, postings, must_exist):
+                index.version = new_version
+                LedgerIndexRegistry._stats["patches"] += 1
+            elif not LedgerIndexRegistry._catch_up(service_id, index, new_version):
+                LedgerIndexRegistry._indexes.pop(service_id, None)
+                LedgerIndexRegistry._stats["drops"] += 1
+
+    @staticmethod
+    def drop(service_id=None):
+        with LedgerIndexRegistry._lock:
+            if service_id is None:
+                LedgerIndexRegistry._indexes.clear()
+            else:
+                LedgerIndexRegistry._indexes.pop(service_id, None)
+
+    @staticmethod
+    def stats():
+        with LedgerIndexRegistry._lock:
+            stats = dict(LedgerIndexRegistry._stats)
+            stats["services"] = len(LedgerIndexRegistry._indexes)
+            return stats
+
+    # --- Internals (lock must be held) ---
+
+    @staticmethod
+    def _catch_up(service_id, index, version):
+        """Replays logged changes index.version+1 .. version. False -> index is unusable."""
+        missing = version - index.version
+        if missing <= 0 or missing > LedgerIndexRegistry.REPLAY_LIMIT:
+            return False
+        keys = [LedgerIndexRegistry.log_key(service_id, v) for v in range(index.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for log_key in keys:
+            if not index.apply_change(*changes[log_key]):
+                # Aadha replay ho chuka - yeh index ab kisi version se match nahi karta
+                LedgerIndexRegistry._indexes.pop(service_id, None)
+                return False
+        index.version = version
+        return True
@@ -0,0 +1,222 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .base_dal import BaseDAL
+from .sp_registry import SPRegistry, NVARCHAR
+
+SPRegistry.register("sp_Common_GetLookup", [NVARCHAR(50), NVARCHAR(200)])
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class LookupIndex:
+    """
+    Searchable snapshot of one lookup type (list of {"id", "text"} items).
+
+    - trigram index: every 3-char slice of the text -> item positions (terms of 3+ chars)
+    - 1-2 char terms scan the texts directly, same substring match as before
+
+    Matches are ranked: text starts with term, then a word starts with term, then
+    substring anywhere; ties keep the SP's own order.
+    """
+
+    __slots__ = ("items", "loaded_at", "_texts", "_trigrams")
+
+    def __init__(self, items):
+        self.items = items
+        self.loaded_at = time.monotonic()
+        self._texts = [item["text"].casefold() for item in items]
+        self._trigrams = {}
+
+        for pos, text in enumerate(self._texts):
+            for gram in {text[i : i + 3] for i in range(len(text) - 2)}:
+                self._trigrams.setdefault(gram, []).append(pos)
+
+    def search(self, term):
+        """Positions of matching items, best matches first."""
+        term = (term or "").strip().casefold()
+        if not term:
+            return range(len(self.items))
+
+        candidates = self._candidates(term)
+        ranked = ([], [], [])
+        for pos in candidates:
+            text = self._texts[pos]
+            if text.startswith(term):
+                ranked[0].append(pos)
+            elif any(word.startswith(term) for word in _WORD_RE.findall(text)):
+                ranked[1].append(pos)
+            elif term in text:
+                ranked[2].append(pos)
+        return ranked[0] + ranked[1] + ranked[2]
+
+    def _candidates(self, term):
+        """Sorted item positions that may contain term (verified by the caller)."""
+        if len(term) < 3:
+            # Itni chhoti term ka koi trigram nahi - seedha scan (lookup lists chhoti hain)
+            return [pos for pos, text in enumerate(self._texts) if term in text]
+
+        grams = {term[i : i + 3] for i in range(len(term) - 2)}
+        # Sabse chhoti list se shuru karo, baaki se intersect
+        lists = sorted((self._trigrams.get(g, ()) for g in grams), key=len)
+        found = set(lists[0])
+        for other in lists[1:]:
+            found.intersection_update(other)
+            if not found:
+                break
+        return sorted(found)
+
+
+class LookupService:
+    """
+    In-memory lookup data for select2 dropdowns.
+    Each lookup type is loaded once via sp_Common_GetLookup and served from a
+    LookupIndex; it is reloaded after LOOKUP_SERVICE["refresh_interval"] seconds.
+    While one request reloads a stale type, others keep using the old snapshot.
+
+    Only types listed in LOOKUP_SERVICE["types"] are loaded - the type comes from the
+    client, so anything else gets an empty page and never reaches the DB or the maps below.
+    """
+
+    _indexes = {}  # lookup_type -> LookupIndex
+    _locks = {}  # lookup_type -> Lock (one loader per type)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def config():
+        cfg = getattr(settings, "LOOKUP_SERVICE", {})
+        return cfg.get("refresh_interval", 300), cfg.get("page_size", 30)
+
+    @staticmethod
+    def is_known(lookup_type):
+        return lookup_type in getattr(settings, "LOOKUP_SERVICE", {}).get("types", ())
+
+    @staticmethod
+    def search(lookup_type, search_term="", page=1, page_size=None):
+        """select2 page: {"results": [{"id", "text"}, ...], "more": bool}"""
+        refresh_interval, default_size = LookupService.config()
+        page_size = page_size or default_size
+        try:
+            page = max(1, int(page or 1))
+        except (TypeError, ValueError):
+            page = 1
+
+        index = LookupService.get_index(lookup_type, refresh_interval)
+        if index is None:
+            return {"results": [], "more": False}
+
+        matches = index.search(search_term)
+        start = (page - 1) * page_size
+        positions = matches[start : start + page_size]
+        return {
+            "results": [index.items[pos] for pos in positions],
+            "more": len(matches) > start + page_size,
+        }
+
+    @staticmethod
+    def search_many(lookup_types, page=1):
+        """
+        First page of several lookup types for one form: {type: {"results", "more"}}.
+        Types not yet in memory (or stale) are loaded together in one DB round trip.
+        """
+        lookup_types = [t for t in dict.fromkeys(lookup_types) if t]
+        LookupService.preload(lookup_types)
+        return {t: LookupService.search(t, "", page) for t in lookup_types}
+
+    @staticmethod
+    def preload(lookup_types):
+        """Loads every missing or stale type via one sp_Common_GetLookup batch."""
+        refresh_interval = LookupService.config()[0]
+        now = time.monotonic()
+        pending = []
+        for lookup_type in lookup_types:
+            if not LookupService.is_known(lookup_type):
+                continue
+            index = LookupService._indexes.get(lookup_type)
+            if index is None or now - index.loaded_at >= refresh_interval:
+                pending.append(lookup_type)
+        if len(pending) < 2:
+            return  # ek type ho to get_index khud load kar leta hai
+
+        result_sets = BaseDAL.execute_sp_batch(
+            "sp_Common_GetLookup", [[lookup_type, ""] for lookup_type in pending]
+        )
+        if len(result_sets) != len(pending):
+            # Batch failed or an SP call returned no set - fall back to one call per type
+            return
+        for lookup_type, rows in zip(pending, result_sets):
+            LookupService._indexes[lookup_type] = LookupIndex(LookupService.to_items(rows))
+
+    @staticmethod
+    def get_index(lookup_type, refresh_interval=None):
+        if not LookupService.is_known(lookup_type):
+            return None
+        if refresh_interval is None:
+            refresh_interval = LookupService.config()[0]
+
+        index = LookupService._indexes.get(lookup_type)
+        if index is not None and time.monotonic() - index.loaded_at < refresh_interval:
+            return index
+
+        with LookupService._lock:
+            type_lock = LookupService._locks.setdefault(lookup_type, threading.Lock())
+
+        # Purana snapshot mojood ho to intezar mat karo - koi aur reload kar raha hai
+        if not type_lock.acquire(blocking=index is None):
+            return index
+        try:
+            current = LookupService._indexes.get(lookup_type)
+            if current is not None and current is not index:
+                return current  # loaded while we waited
+            fresh = LookupService.load(lookup_type)
+            if fresh is None:
+                return index
+            LookupService._indexes[lookup_type] = fresh
+            return fresh
+        finally:
+            type_lock.release()
+
+    @staticmethod
+    def load(lookup_type):
+        """
+        Full list for lookup_type as a LookupIndex (None if the SP call failed).
+        Relies on sp_Common_GetLookup returning every item when the search term is empty.
+        """
+        # execute_sp_multi: [] means the call failed, [[]] a genuinely empty list
+        result_sets = BaseDAL.execute_sp_multi("sp_Common_GetLookup", [lookup_type, ""])
+        if not result_sets:
+            return None
+        return LookupIndex(LookupService.to_items(result_sets[0]))
+
+    @staticmethod
+    def to_items(rows):
+        items = []
+        for row in rows:
+            item_id = row.get("id")
+            items.append(
+                {
+                    "id": "" if item_id is None else str(item_id),
+                    "text": str(row.get("text") or "No Name"),
+                }
+            )
+        return items
+
+    @staticmethod
+    def invalidate(lookup_type=None):
+        """Forces a reload on next use (all types when lookup_type is None)."""
+        with LookupService._lock:
+            if lookup_type is None:
+                LookupService._indexes.clear()
+            else:
+                LookupService._indexes.pop(lookup_type, None)
+
+    @staticmethod
+    def stats():
+        now = time.monotonic()
+        return {
+            lookup_type: {"items": len(index.items), "age": round(now - index.loaded_at, 1)}
+            for lookup_type, index in list(LookupService._indexes.items())
+        }
@@ -0,0 +1,214 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .base_dal import BaseDAL
+from .error_handler import DatabaseUnavailableError
+
+
+class MonthSegmentCache:
+    """
+    Calendar-month segments of list SPs (cash book, journal) in the Django cache.
+
+        rows = MonthSegmentCache.get_range(
+            "cashbook", service_id, "2026-01-01", "2026-06-30", "dttrdate",
+            load_segment=lambda d1, d2: TransactionDAL.iter_cash_book_data(service_id, d1, d2),
+            fetch_live=lambda d1, d2: BaseDAL.execute_sp("sp_Trans_GetList", [...]),
+        )
+
+    A range is cut into months. Closed months within horizon_months come from a cached
+    full-month segment (trimmed on date_column at the range edges); the open month and
+    anything older than the horizon are one live query each. Every (name, service, month)
+    has its own generation key. Rows carry running balances, so a write invalidates its
+    month and every later one; segments reloaded within primary_after_write seconds of
+    a write are read from the primary, not a replica that may lag behind.
+    """
+
+    @staticmethod
+    def config():
+        cfg = getattr(settings, "MONTH_SEGMENT_CACHE", {})
+        return cfg.get("enabled", True), cfg.get("ttl", 3600), cfg.get("horizon_months", 24)
+
+    @staticmethod
+    def primary_window():
+        return getattr(settings, "MONTH_SEGMENT_CACHE", {}).get("primary_after_write", 60)
+
+    @staticmethod
+    def get_range(name, service_id, from_date, to_date, date_column, load_segment, fetch_live):
+        enabled, ttl, horizon = MonthSegmentCache.config()
+        start, end = MonthSegmentCache.as_date(from_date), MonthSegmentCache.as_date(to_date)
+        if not enabled or service_id is None or start is None or end is None or start > end:
+            return fetch_live(from_date, to_date)
+
+        open_month = date.today().replace(day=1)
+        first_cached = MonthSegmentCache.add_months(open_month, -horizon)
+        months = [
+            month
+            for month in MonthSegmentCache.months_between(start, end)
+            if first_cached <= month < open_month
+        ]
+        if not months:
+            return fetch_live(from_date, to_date)
+
+        try:
+            segments = MonthSegmentCache.get_segments(name, service_id, months, ttl, load_segment)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- SEGMENT CACHE ERROR ({name}): {str(e)} ---")
+            return fetch_live(from_date, to_date)
+
+        rows = []
+        # Horizon se purane mahine: ek live query
+        if start < months[0]:
+            rows.extend(fetch_live(start.isoformat(), (months[0] - timedelta(days=1)).isoformat()))
+        for month in months:
+            segment = segments[month]
+            month_end = MonthSegmentCache.add_months(month, 1) - timedelta(days=1)
+            if start > month or end < month_end:
+                segment = [
+                    row
+                    for row in segment
+                    if start <= (MonthSegmentCache.as_date(row.get(date_column)) or month) <= end
+                ]
+            rows.extend(segment)
+        # Khula (current) mahina hamesha live
+        tail_start = MonthSegmentCache.add_months(months[-1], 1)
+        if end >= tail_start:
+            rows.extend(fetch_live(tail_start.isoformat(), end.isoformat()))
+        return rows
+
+    @staticmethod
+    def get_segments(name, service_id, months, ttl, load_segment):
+        """{month: rows}; misses are loaded via load_segment (which must raise on errors)."""
+        keys = MonthSegmentCache.segment_keys(name, service_id, months)
+        found = cache.get_many(list(keys.values()))
+        segments = {}
+        recent_write = None
+        for month, key in keys.items():
+            rows = found.get(key)
+            if rows is None:
+                if recent_write is None:
+                    written_at = cache.get(MonthSegmentCache.written_key(name, service_id), 0)
+                    recent_write = time.time() - written_at < MonthSegmentCache.primary_window()
+                month_end = MonthSegmentCache.add_months(month, 1) - timedelta(days=1)
+                if recent_write:
+                    # Replica shayad abhi write tak nahi pohncha - shared cache mein purana data na jaye
+                    with BaseDAL.primary_reads():
+                        rows = list(load_segment(month.isoformat(), month_end.isoformat()))
+                else:
+                    rows = list(load_segment(month.isoformat(), month_end.isoformat()))
+                cache.set(key, rows, ttl)
+            segments[month] = rows
+        return segments
+
+    @staticmethod
+    def segment_keys(name, service_id, months):
+        """{month: current cache key} - one get_many for all generation counters."""
+        gen_keys = {month: MonthSegmentCache.generation_key(name, service_id, month) for month in months}
+        generations = cache.get_many(list(gen_keys.values()))
+        keys = {}
+        for month, gen_key in gen_keys.items():
+            generation = generations.get(gen_key)
+            if generation is None:
+                # Time-based start so an evicted counter never reuses an old key
+                generation = time.time_ns()
+                if not cache.add(gen_key, generation, None):
+                    generation = cache.get(gen_key, generation)
+            keys[month] = f"seg:{name}:{service_id}:{month:%Y-%m}:{generation}"
+        return keys
+
+    @staticmethod
+    def generation_key(name, service_id, month):
+        return f"seg_gen:{name}:{service_id}:{month:%Y-%m}"
+
+    @staticmethod
+    def written_key(name, service_id):
+        return f"seg_written:{name}:{service_id}"
+
+    @staticmethod
+    def invalidate_from(name, service_id, day):
+        """
+        A write dated `day`: drops that month's segment and every later cached one, since
+        their running balances moved too. day=None drops the whole horizon.
+        """
+        if service_id is None:
+            return
+        horizon = MonthSegmentCache.config()[2]
+        open_month = date.today().replace(day=1)
+        first = MonthSegmentCache.add_months(open_month, -horizon)
+        day = MonthSegmentCache.as_date(day)
+        if day is not None and day.replace(day=1) > first:
+            first = day.replace(day=1)
+
+        generation = time.time_ns()
+        values = {
+            MonthSegmentCache.generation_key(name, service_id, month): generation
+            for month in MonthSegmentCache.months_between(first, open_month)
+            if month < open_month
+        }
+        values[MonthSegmentCache.written_key(name, service_id)] = time.time()
+        cache.set_many(values, None)
+
+    @staticmethod
+    def row_months(name, service_id, key_column, key_value):
+        """Cached months whose segment holds the row key_column == key_value."""
+        if service_id is None or key_value in (None, ""):
+            return []
+        horizon = MonthSegmentCache.config()[2]
+        open_month = date.today().replace(day=1)
+        months = [MonthSegmentCache.add_months(open_month, -n) for n in range(1, horizon + 1)]
+        keys = MonthSegmentCache.segment_keys(name, service_id, months)
+        found = cache.get_many(list(keys.values()))
+
+        key_value = str(key_value)
+        return sorted(
+            month
+            for month, key in keys.items()
+            if found.get(key) and any(str(row.get(key_column)) == key_value for row in found[key])
+        )
+
+    @staticmethod
+    def invalidate_row(name, service_id, key_column, key_value, old_day=None, *new_days):
+        """
+        Edit / delete of the row key_column == key_value: invalidates from the earliest of
+        its old date and `new_days`. Only when the client did not send the old date are the
+        cached segments scanned for the row. With nothing to go on, the whole horizon is
+        dropped. Returns the scanned months that held it ([] when old_day was given).
+        """
+        old_day = MonthSegmentCache.as_date(old_day)
+        found = []
+        if old_day is None:
+            found = MonthSegmentCache.row_months(name, service_id, key_column, key_value)
+        days = [old_day] + [MonthSegmentCache.as_date(day) for day in new_days]
+        known = found + [d for d in days if d is not None]
+        MonthSegmentCache.invalidate_from(name, service_id, min(known) if known else None)
+        return found
+
+    # --- Date helpers ---
+
+    @staticmethod
+    def as_date(value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(str(value)[:10])
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def add_months(month, count):
+        """First day of the month `count` months after month (negative = before)."""
+        index = month.year * 12 + month.month - 1 + count
+        return date(index // 12, index % 12 + 1, 1)
+
+    @staticmethod
+    def months_between(start, end):
+        month = start.replace(day=1)
+        while month <= end:
+            yield month
+            month = MonthSegmentCache.add_months(month, 1)
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ResultCache:
+    """
+    Process-wide LRU cache for read SP results, with TTL and invalidation tags.
+
+        token = ResultCache.begin(tags)          # before hitting the DB
+        ResultCache.set(key, rows, ttl, tags, token)
+        ResultCache.invalidate(["cashbook:1"])   # after a write
+
+    begin()/set() compare tag generations, so a read that was running while a write
+    invalidated its tags does not put pre-write rows back into the cache.
+    Each worker has its own cache; the TTL bounds staleness across workers.
+
+    Memory is bounded by rows, not only entries: a result above max_entry_rows is
+    never stored, and LRU entries are evicted while the total exceeds max_total_rows.
+    """
+
+    _lock = threading.Lock()
+    _entries = OrderedDict()  # key -> (expires_at, value, tags, rows), LRU order
+    _tag_keys = {}  # tag -> set(keys)
+    _generations = {}  # tag -> int, bumped on invalidate
+    _max_entries = None  # from settings.DB_RESULT_CACHE on first store
+    _total_rows = 0  # rows held by all entries together
+    _stats = {
+        "hits": 0,
+        "misses": 0,
+        "stores": 0,
+        "evictions": 0,
+        "expirations": 0,
+        "invalidations": 0,
+        "skipped_large": 0,
+    }
+    _sp_stats = {}  # sp_name -> {"hits": n, "misses": n}
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, "DB_RESULT_CACHE", {}).get("enabled", True)
+
+    @staticmethod
+    def max_entries():
+        if ResultCache._max_entries is None:
+            cfg = getattr(settings, "DB_RESULT_CACHE", {})
+            ResultCache._max_entries = max(1, int(cfg.get("max_entries", 500)))
+        return ResultCache._max_entries
+
+    @staticmethod
+    def row_limits():
+        """(max rows in one entry, max rows across the whole cache)"""
+        cfg = getattr(settings, "DB_RESULT_CACHE", {})
+        return int(cfg.get("max_entry_rows", 5000)), int(cfg.get("max_total_rows", 100000))
+
+    @staticmethod
+    def row_count(value):
+        """Rows in a cached value: list of rows, list of result sets, or a scalar (1)."""
+        if isinstance(value, (list, tuple)):
+            return sum(len(item) if isinstance(item, list) else 1 for item in value) or 1
+        return 1
+
+    @staticmethod
+    def get(key):
+        """Cached value or None. key[0] must be the SP name (used for per-SP stats)."""
+        now = time.monotonic()
+        with ResultCache._lock:
+            entry = ResultCache._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                ResultCache._remove(key)
+                ResultCache._stats["expirations"] += 1
+                entry = None
+
+            sp_stats = ResultCache._sp_stats.setdefault(key[0], {"hits": 0, "misses": 0})
+            if entry is None:
+                ResultCache._stats["misses"] += 1
+                sp_stats["misses"] += 1
+                return None
+
+            ResultCache._entries.move_to_end(key)
+            ResultCache._stats["hits"] += 1
+            sp_stats["hits"] += 1
+            return entry[1]
+
+    @staticmethod
+    def begin(tags):
+        """Snapshot of tag generations; pass it back to set()."""
+        with ResultCache._lock:
+            return tuple(ResultCache._generations.get(tag, 0) for tag in tags)
+
+    @staticmethod
+    def set(key, value, ttl, tags=(), token=None):
+        tags = tuple(tags)
+        max_entries = ResultCache.max_entries()
+        max_entry_rows, max_total_rows = ResultCache.row_limits()
+        rows = ResultCache.row_count(value)
+        with ResultCache._lock:
+            if rows > max_entry_rows:
+                # Saal bhar ki list har worker ki memory mein nahi rakhni
+                ResultCache._stats["skipped_large"] += 1
+                if key in ResultCache._entries:
+                    ResultCache._remove(key)
+                return False
+
+            if token is not None and token != tuple(
+                ResultCache._generations.get(tag, 0) for tag in tags
+            ):
+                # Beech mein write ho gaya - purana data cache nahi karna
+                return False
+
+            if key in ResultCache._entries:
+                ResultCache._remove(key)
+            ResultCache._entries[key] = (time.monotonic() + ttl, value, tags, rows)
+            ResultCache._total_rows += rows
+            for tag in tags:
+                ResultCache._tag_keys.setdefault(tag, set()).add(key)
+            ResultCache._stats["stores"] += 1
+
+            while len(ResultCache._entries) > max_entries or (
+                ResultCache._total_rows > max_total_rows and len(ResultCache._entries) > 1
+            ):
+                ResultCache._evict_oldest()
+        return True
+
+    @staticmethod
+    def invalidate(tags):
+        """Drops every entry carrying any of tags. Returns the number of entries removed."""
+        removed = 0
+        with ResultCache._lock:
+            for tag in tags:
+                ResultCache._generations[tag] = ResultCache._generations.get(tag, 0) + 1
+                for key in list(ResultCache._tag_keys.get(tag, ())):
+                    ResultCache._remove(key)
+                    removed += 1
+            ResultCache._stats["invalidations"] += removed
+        return removed
+
+    @staticmethod
+    def clear():
+        # Generations are kept so in-flight reads still can't store stale rows
+        with ResultCache._lock:
+            ResultCache._entries.clear()
+            ResultCache._tag_keys.clear()
+            ResultCache._total_rows = 0
+
+    @staticmethod
+    def stats():
+        max_entries = ResultCache.max_entries()
+        with ResultCache._lock:
+            data = dict(ResultCache._stats)
+            data["size"] = len(ResultCache._entries)
+            data["rows"] = ResultCache._total_rows
+        data["max_entries"] = max_entries
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        return data
+
+    @staticmethod
+    def sp_stats():
+        """{sp_name: {"hits": n, "misses": n}}"""
+        with ResultCache._lock:
+            return {name: dict(s) for name, s in ResultCache._sp_stats.items()}
+
+    # --- Internals (lock must be held) ---
+
+    @staticmethod
+    def _remove(key):
+        entry = ResultCache._entries.pop(key, None)
+        if entry is None:
+            return
+        ResultCache._total_rows -= entry[3]
+        for tag in entry[2]:
+            keys = ResultCache._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del ResultCache._tag_keys[tag]
+
+    @staticmethod
+    def _evict_oldest():
+        key = next(iter(ResultCache._entries))
+        ResultCache._remove(key)
+        ResultCache._stats["evictions"] += 1
@@ -0,0 +1,107 @@
+from collections.abc import Mapping
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class RowSchema:
+    """
+    Column names of one result set, lowercased once and shared by every Row in it.
+    """
+
+    __slots__ = ("columns", "index")
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.index = {name: pos for pos, name in enumerate(self.columns)}
+
+    @staticmethod
+    def from_description(description):
+        return RowSchema(column[0].lower() for column in description)
+
+    def __reduce__(self):
+        return (RowSchema, (self.columns,))
+
+
+class Row(Mapping):
+    """
+    Read-only, tuple-backed SP row. Behaves like the old per-row dict
+    (row["col"], row.get("col"), ** unpacking, iteration) and also allows row.col.
+    'version_hex' is derived from 'versionid' only when it is actually read.
+    """
+
+    __slots__ = ("_schema", "_values")
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = tuple(values)
+
+    # --- Mapping protocol ---
+
+    def __getitem__(self, key):
+        pos = self._schema.index.get(key)
+        if pos is not None:
+            return self._values[pos]
+        if key == "version_hex":
+            version = self._version_id()
+            if version:
+                return version.hex()
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from self._schema.columns
+        if self._has_version_hex():
+            yield "version_hex"
+
+    def __len__(self):
+        return len(self._values) + (1 if self._has_version_hex() else 0)
+
+    def __contains__(self, key):
+        if key in self._schema.index:
+            return True
+        return key == "version_hex" and self._has_version_hex()
+
+    def get(self, key, default=None):
+        pos = self._schema.index.get(key)
+        if pos is not None:
+            return self._values[pos]
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    # --- Attribute access (row.vcacname) ---
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    # --- Helpers ---
+
+    def as_dict(self):
+        return dict(self.items())
+
+    def _version_id(self):
+        pos = self._schema.index.get("versionid")
+        return self._values[pos] if pos is not None else None
+
+    def _has_version_hex(self):
+        return "version_hex" not in self._schema.index and bool(self._version_id())
+
+    def __reduce__(self):
+        return (Row, (self._schema, self._values))
+
+    def __repr__(self):
+        return f"Row({self.as_dict()!r})"
+
+
+class RowJSONEncoder(DjangoJSONEncoder):
+    """JsonResponse encoder that understands Row objects."""
+
+    def default(self, o):
+        if isinstance(o, Row):
+            return o.as_dict()
+        return super().default(o)
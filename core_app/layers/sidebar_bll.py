@@ -1,4 +1,10 @@
 from .base_dal import BaseDAL
+from .error_handler import DatabaseUnavailableError
+from .sp_registry import SPRegistry, INT, NVARCHAR
+
+# Login and menus must see a password / rights change at once - never from the replica
+SPRegistry.register("sp_AuthenticateUser", [NVARCHAR(100), NVARCHAR(100), INT], primary_only=True)
+SPRegistry.register("sp_GetSidebarMenus", [INT], primary_only=True)
 
 
 class AuthBLL:
@@ -55,6 +61,8 @@ class AuthBLL:
                     "success": False,
                     "message": "Invalid credentials or service mapping.",
                 }
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Login): {str(e)} ---")
             return {"success": False, "message": f"System Error: {str(e)}"}
@@ -67,6 +75,10 @@ class SecurityBLL:
 
     @staticmethod
     def fetch_authorized_sidebar(user_id):
+        """
+        {mod_id: {"name", "menus": [root menu, ...]}} - every menu carries its own
+        "children" list, so templates never search for sub-menus by parent_id.
+        """
         try:
             # Sidebar ke liye SP call
             raw_menus = BaseDAL.execute_sp("sp_GetSidebarMenus", [user_id])
@@ -102,17 +114,26 @@ class SecurityBLL:
                     "parent_id": str(p_id) if p_id else None,
                     "has_children": False,
                     "features": [],
+                    "children": [],
                 }
 
-            # Parent/Child relationship set karna
-            for mod_id in hierarchy:
-                menus_dict = hierarchy[mod_id]["menus"]
-                for m_id, m_data in menus_dict.items():
+            # Parent/Child relationship set karna - ek pass, SP ka order qaim
+            for module in hierarchy.values():
+                menus_dict = module["menus"]
+                roots = []
+                for m_data in menus_dict.values():
                     parent_id = m_data["parent_id"]
-                    if parent_id and parent_id in menus_dict:
+                    if not parent_id:
+                        roots.append(m_data)
+                    elif parent_id in menus_dict:
+                        menus_dict[parent_id]["children"].append(m_data)
                         menus_dict[parent_id]["has_children"] = True
+                    # parent na mile to menu pehle bhi nahi dikhta tha
+                module["menus"] = roots
 
             return hierarchy
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Sidebar): {str(e)} ---")
             return {}
@@ -0,0 +1,75 @@
+import threading
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs fn, callers
+    arriving while it is in flight wait and get the same result (or exception).
+
+        rows = SingleFlight.do(("sp_Trans_GetList", (1, "2026-01-01", ...)), fetch)
+
+    key[0] is the SP name, used for the per-SP "saved calls" counter.
+    Nothing is cached - once the leader finishes, the next caller runs fn again.
+    A follower waits at most `timeout` seconds; if the leader is still running (hung
+    query, dead connection) the follower runs fn itself instead of blocking forever.
+    """
+
+    _lock = threading.Lock()
+    _flights = {}  # key -> _Flight
+    _stats = {}  # sp_name -> {"executed": n, "coalesced": n, "timeouts": n}
+
+    @staticmethod
+    def do(key, fn, timeout=None):
+        with SingleFlight._lock:
+            stats = SingleFlight._stats.setdefault(key[0], {"executed": 0, "coalesced": 0, "timeouts": 0})
+            flight = SingleFlight._flights.get(key)
+            if flight is None:
+                flight = SingleFlight._flights[key] = _Flight()
+                stats["executed"] += 1
+                leader = True
+            else:
+                stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                # Leader abhi tak atka hua hai - intezar chhor kar khud chalayein
+                with SingleFlight._lock:
+                    stats["coalesced"] -= 1
+                    stats["executed"] += 1
+                    stats["timeouts"] += 1
+                return fn()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with SingleFlight._lock:
+                SingleFlight._flights.pop(key, None)
+            flight.done.set()
+
+    @staticmethod
+    def stats():
+        """{sp_name: {"executed": n, "coalesced": n, "timeouts": n}} - coalesced = DB calls saved."""
+        with SingleFlight._lock:
+            return {name: dict(s) for name, s in SingleFlight._stats.items()}
+
+    @staticmethod
+    def in_flight():
+        with SingleFlight._lock:
+            return len(SingleFlight._flights)
@@ -0,0 +1,226 @@
+import threading
+import time
+
+
+class SPMetrics:
+    """
+    Per-stored-procedure counters (calls, errors, rows, latency histogram, connection wait).
+    Process-wide; each worker reports its own numbers.
+    """
+
+    # Latency histogram upper bounds in seconds (Prometheus style, +Inf implied)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    _lock = threading.Lock()
+    _data = {}
+
+    @staticmethod
+    def record(sp_name, duration, rows=0, error=False, conn_wait=0.0):
+        with SPMetrics._lock:
+            entry = SPMetrics._data.get(sp_name)
+            if entry is None:
+                entry = SPMetrics._data[sp_name] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "rows": 0,
+                    "latency_sum": 0.0,
+                    "latency_max": 0.0,
+                    "conn_wait_sum": 0.0,
+                    "buckets": [0] * (len(SPMetrics.BUCKETS) + 1),
+                }
+            entry["calls"] += 1
+            entry["rows"] += rows
+            entry["latency_sum"] += duration
+            entry["latency_max"] = max(entry["latency_max"], duration)
+            entry["conn_wait_sum"] += conn_wait
+            if error:
+                entry["errors"] += 1
+            for pos, bound in enumerate(SPMetrics.BUCKETS):
+                if duration <= bound:
+                    entry["buckets"][pos] += 1
+                    break
+            else:
+                entry["buckets"][-1] += 1
+
+    @staticmethod
+    def snapshot():
+        """{sp_name: {calls, errors, rows, avg, p50, p95, p99, max, conn_wait_avg, buckets}}"""
+        with SPMetrics._lock:
+            data = {
+                name: dict(entry, buckets=list(entry["buckets"]))
+                for name, entry in SPMetrics._data.items()
+            }
+        for entry in data.values():
+            calls = entry["calls"] or 1
+            entry["avg"] = entry["latency_sum"] / calls
+            entry["conn_wait_avg"] = entry["conn_wait_sum"] / calls
+            for q in (50, 95, 99):
+                entry[f"p{q}"] = SPMetrics._quantile(entry, q / 100)
+        return data
+
+    @staticmethod
+    def reset():
+        with SPMetrics._lock:
+            SPMetrics._data.clear()
+
+    @staticmethod
+    def _quantile(entry, q):
+        """Upper bucket bound that covers the q-th fraction of calls (max for the +Inf bucket)."""
+        target = q * entry["calls"]
+        seen = 0
+        for pos, count in enumerate(entry["buckets"]):
+            seen += count
+            if count and seen >= target:
+                if pos < len(SPMetrics.BUCKETS):
+                    return min(SPMetrics.BUCKETS[pos], entry["latency_max"])
+                return entry["latency_max"]
+        return 0.0
+
+    @staticmethod
+    def render_prometheus(
+        pool_stats=None,
+        breaker_stats=None,
+        cache_stats=None,
+        cache_sp_stats=None,
+        coalesce_stats=None,
+    ):
+        """Prometheus text exposition format (version 0.0.4)."""
+        data = SPMetrics.snapshot()
+        lines = [
+            "# HELP erp_sp_calls_total Stored procedure executions.",
+            "# TYPE erp_sp_calls_total counter",
+        ]
+        for name, e in sorted(data.items()):
+            lines.append(f'erp_sp_calls_total{{sp="{name}"}} {e["calls"]}')
+
+        lines += [
+            "# HELP erp_sp_errors_total Stored procedure executions that raised.",
+            "# TYPE erp_sp_errors_total counter",
+        ]
+        for name, e in sorted(data.items()):
+            lines.append(f'erp_sp_errors_total{{sp="{name}"}} {e["errors"]}')
+
+        lines += [
+            "# HELP erp_sp_rows_total Rows returned by stored procedures.",
+            "# TYPE erp_sp_rows_total counter",
+        ]
+        for name, e in sorted(data.items()):
+            lines.append(f'erp_sp_rows_total{{sp="{name}"}} {e["rows"]}')
+
+        lines += [
+            "# HELP erp_sp_connection_wait_seconds_total Time spent waiting for a pooled connection.",
+            "# TYPE erp_sp_connection_wait_seconds_total counter",
+        ]
+        for name, e in sorted(data.items()):
+            lines.append(
+                f'erp_sp_connection_wait_seconds_total{{sp="{name}"}} {e["conn_wait_sum"]:.6f}'
+            )
+
+        lines += [
+            "# HELP erp_sp_duration_seconds Stored procedure latency.",
+            "# TYPE erp_sp_duration_seconds histogram",
+        ]
+        for name, e in sorted(data.items()):
+            cumulative = 0
+            for bound, count in zip(SPMetrics.BUCKETS, e["buckets"]):
+                cumulative += count
+                lines.append(
+                    f'erp_sp_duration_seconds_bucket{{sp="{name}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'erp_sp_duration_seconds_bucket{{sp="{name}",le="+Inf"}} {e["calls"]}'
+            )
+            lines.append(f'erp_sp_duration_seconds_sum{{sp="{name}"}} {e["latency_sum"]:.6f}')
+            lines.append(f'erp_sp_duration_seconds_count{{sp="{name}"}} {e["calls"]}')
+
+        if pool_stats:
+            lines += [
+                "# HELP erp_db_pool Connection pool counters and gauges.",
+                "# TYPE erp_db_pool gauge",
+            ]
+            for key, value in sorted(pool_stats.items()):
+                lines.append(f'erp_db_pool{{stat="{key}"}} {value}')
+
+        if cache_stats:
+            lines += [
+                "# HELP erp_sp_cache Result cache counters and gauges.",
+                "# TYPE erp_sp_cache gauge",
+            ]
+            for key, value in sorted(cache_stats.items()):
+                lines.append(f'erp_sp_cache{{stat="{key}"}} {value}')
+
+        if cache_sp_stats:
+            lines += [
+                "# HELP erp_sp_cache_hits_total Result cache hits per SP.",
+                "# TYPE erp_sp_cache_hits_total counter",
+            ]
+            for name, s in sorted(cache_sp_stats.items()):
+                lines.append(f'erp_sp_cache_hits_total{{sp="{name}"}} {s["hits"]}')
+            lines += [
+                "# HELP erp_sp_cache_misses_total Result cache misses per SP.",
+                "# TYPE erp_sp_cache_misses_total counter",
+            ]
+            for name, s in sorted(cache_sp_stats.items()):
+                lines.append(f'erp_sp_cache_misses_total{{sp="{name}"}} {s["misses"]}')
+
+        if coalesce_stats:
+            lines += [
+                "# HELP erp_sp_coalesced_total Calls that waited for an identical in-flight call (DB executions saved).",
+                "# TYPE erp_sp_coalesced_total counter",
+            ]
+            for name, s in sorted(coalesce_stats.items()):
+                lines.append(f'erp_sp_coalesced_total{{sp="{name}"}} {s["coalesced"]}')
+            lines += [
+                "# HELP erp_sp_coalesce_timeouts_total Coalesced calls that gave up waiting and ran the SP themselves.",
+                "# TYPE erp_sp_coalesce_timeouts_total counter",
+            ]
+            for name, s in sorted(coalesce_stats.items()):
+                lines.append(f'erp_sp_coalesce_timeouts_total{{sp="{name}"}} {s.get("timeouts", 0)}')
+
+        if breaker_stats:
+            lines += [
+                "# HELP erp_db_circuit_open 1 while the database circuit breaker is open.",
+                "# TYPE erp_db_circuit_open gauge",
+                f'erp_db_circuit_open {0 if breaker_stats["state"] == "closed" else 1}',
+                "# HELP erp_db_circuit_rejected_total Calls failed fast by the open circuit.",
+                "# TYPE erp_db_circuit_rejected_total counter",
+                f'erp_db_circuit_rejected_total {breaker_stats["rejected"]}',
+                "# HELP erp_db_circuit_trips_total Times the circuit breaker opened.",
+                "# TYPE erp_db_circuit_trips_total counter",
+                f'erp_db_circuit_trips_total {breaker_stats["trips"]}',
+            ]
+
+        return "\n".join(lines) + "\n"
+
+
+class SPTimer:
+    """
+    Tracks one SP call for SPMetrics:
+        timer = SPTimer("sp_X"); conn = timer.connection(BaseDAL.get_connection, "sp_X")
+        ... timer.rows += n ... timer.error = True on failure ... timer.finish()
+    """
+
+    __slots__ = ("sp_name", "started", "conn_wait", "rows", "error")
+
+    def __init__(self, sp_name):
+        self.sp_name = sp_name
+        self.started = time.perf_counter()
+        self.conn_wait = 0.0
+        self.rows = 0
+        self.error = False
+
+    def connection(self, acquire, *args):
+        t0 = time.perf_counter()
+        try:
+            return acquire(*args)
+        finally:
+            self.conn_wait += time.perf_counter() - t0
+
+    def finish(self):
+        SPMetrics.record(
+            self.sp_name,
+            time.perf_counter() - self.started,
+            rows=self.rows,
+            error=self.error,
+            conn_wait=self.conn_wait,
+        )
@@ -0,0 +1,177 @@
+import threading
+
+import pyodbc
+
+
+# Parameter type specs used in SPRegistry.register(...)
+INT = ("int",)
+BIGINT = ("bigint",)
+BIT = ("bit",)
+DATE = ("date",)
+DATETIME = ("datetime",)
+
+
+def NVARCHAR(size=4000):
+    return ("nvarchar", size)
+
+
+def VARCHAR(size=8000):
+    return ("varchar", size)
+
+
+def DECIMAL(precision=18, scale=2):
+    return ("decimal", precision, scale)
+
+
+_ODBC_TYPES = {
+    "int": (pyodbc.SQL_INTEGER, 0, 0),
+    "bigint": (pyodbc.SQL_BIGINT, 0, 0),
+    "bit": (pyodbc.SQL_BIT, 0, 0),
+    "date": (pyodbc.SQL_TYPE_DATE, 0, 0),
+    "datetime": (pyodbc.SQL_TYPE_TIMESTAMP, 23, 3),
+    "nvarchar": (pyodbc.SQL_WVARCHAR, None, 0),
+    "varchar": (pyodbc.SQL_VARCHAR, None, 0),
+    "decimal": (pyodbc.SQL_DECIMAL, None, None),
+}
+
+
+def _input_size(spec):
+    """('nvarchar', 100) -> (SQL_WVARCHAR, 100, 0) for cursor.setinputsizes."""
+    name = spec[0].lower()
+    sql_type, size, digits = _ODBC_TYPES[name]
+    if size is None:
+        size = spec[1]
+    if digits is None:
+        digits = spec[2]
+    return (sql_type, size, digits)
+
+
+class SPDefinition:
+    """One known stored procedure: call text, typed parameters, read/write kind and cache rules."""
+
+    __slots__ = (
+        "name",
+        "kind",
+        "param_types",
+        "input_sizes",
+        "call_sql",
+        "cache_ttl",
+        "cache_tags",
+        "invalidates",
+        "coalesce",
+        "primary_only",
+    )
+
+    def __init__(
+        self,
+        name,
+        param_types=None,
+        kind="read",
+        cache_ttl=None,
+        cache_tags=(),
+        invalidates=(),
+        coalesce=False,
+        primary_only=False,
+    ):
+        self.name = name
+        self.kind = kind
+        self.param_types = tuple(param_types) if param_types is not None else None
+        self.input_sizes = (
+            [_input_size(spec) for spec in self.param_types]
+            if self.param_types is not None
+            else None
+        )
+        self.call_sql = (
+            SPRegistry.call_text(name, len(self.param_types))
+            if self.param_types is not None
+            else None
+        )
+        # Result cache: seconds to keep results (None = never cached) and the tags they carry
+        self.cache_ttl = cache_ttl
+        self.cache_tags = tuple(cache_tags)
+        # Tags dropped from the result cache after this SP (a write) succeeds
+        self.invalidates = tuple(invalidates)
+        # Identical concurrent calls share one execution (reads only, see SingleFlight)
+        self.coalesce = bool(coalesce) and kind == "read"
+        # Reads that must never see replica lag (e.g. permissions)
+        self.primary_only = primary_only
+
+    @property
+    def is_read(self):
+        return self.kind == "read"
+
+    @staticmethod
+    def format_tags(templates, params):
+        """("cashbook:{0}",) + [5, ...] -> ["cashbook:5"]; templates index into params."""
+        params = list(params or ())
+        try:
+            return [t.format(*params) for t in templates]
+        except (IndexError, KeyError):
+            return []
+
+    def tags_for(self, params):
+        return SPDefinition.format_tags(self.cache_tags, params)
+
+    def invalidation_tags(self, params):
+        return SPDefinition.format_tags(self.invalidates, params)
+
+
+class SPRegistry:
+    """
+    Registry of known SPs. DAL modules register their SPs at import time:
+
+        SPRegistry.register("sp_Trans_GetList", [INT, DATE, DATE, NVARCHAR()])
+
+    With param_types, BaseDAL binds parameters via setinputsizes so NULL / str / int
+    values always produce the same server-side plan. Without them only the kind is kept.
+
+    Read SPs with cache_ttl are served from ResultCache; writes list the tags they
+    invalidate ("{n}" is replaced by the n-th parameter):
+
+        SPRegistry.register("sp_Trans_GetList", [...], cache_ttl=30, cache_tags=["cashbook:{0}"])
+        SPRegistry.register("spTransAdd", kind="write", invalidates=["cashbook:{13}"])
+
+    coalesce=True makes identical concurrent calls of a read SP wait for the one
+    already in flight instead of running it again.
+    """
+
+    _specs = {}
+    _call_cache = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(
+        name,
+        param_types=None,
+        kind="read",
+        cache_ttl=None,
+        cache_tags=(),
+        invalidates=(),
+        coalesce=False,
+        primary_only=False,
+    ):
+        spec = SPDefinition(
+            name, param_types, kind, cache_ttl, cache_tags, invalidates, coalesce, primary_only
+        )
+        with SPRegistry._lock:
+            SPRegistry._specs[name] = spec
+        return spec
+
+    @staticmethod
+    def get(name):
+        return SPRegistry._specs.get(name)
+
+    @staticmethod
+    def all():
+        return dict(SPRegistry._specs)
+
+    @staticmethod
+    def call_text(name, param_count):
+        """Cached ODBC call syntax: {CALL sp (?, ?, ...)}"""
+        key = (name, param_count)
+        sql = SPRegistry._call_cache.get(key)
+        if sql is None:
+            placeholders = ", ".join(["?"] * param_count)
+            sql = f"{{CALL {name} ({placeholders})}}"
+            SPRegistry._call_cache[key] = sql
+        return sql
@@ -0,0 +1,65 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.models import BalanceSnapshot
+from core_app.modules.transaction.balance_snapshot_bll import BalanceSnapshotBLL
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds / refreshes period-close balance snapshots of the consolidated cash book "
+        "for closed months (run nightly, or after a month is closed)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--service", type=int, action="append", required=True, help="Service id (repeatable)")
+        parser.add_argument("--months", type=int, help="Closed months to cover, counting back from last month")
+        parser.add_argument("--from", dest="from_month", help="First month (YYYY-MM), instead of --months")
+        parser.add_argument(
+            "--inyscode",
+            type=int,
+            default=0,
+            help="Fiscal year code for months without rows (otherwise taken from the month's rows)",
+        )
+        parser.add_argument(
+            "--missing-only", action="store_true", help="Only build months that have no snapshot yet"
+        )
+
+    def handle(self, *args, **options):
+        open_month = date.today().replace(day=1)
+        if options["from_month"]:
+            first = MonthSegmentCache.as_date(f"{options['from_month']}-01")
+            if first is None:
+                raise CommandError("--from must look like YYYY-MM")
+        else:
+            months = options["months"] or BalanceSnapshotBLL.config()[1]
+            if months < 1:
+                raise CommandError("--months must be at least 1")
+            first = MonthSegmentCache.add_months(open_month, -months)
+        months = [m for m in MonthSegmentCache.months_between(first, open_month) if m < open_month]
+
+        for service_id in options["service"]:
+            existing = set()
+            if options["missing_only"]:
+                existing = set(
+                    BalanceSnapshot.objects.filter(
+                        service_id=service_id, account_name="", period__gte=first
+                    ).values_list("period", flat=True)
+                )
+
+            built = skipped = failed = 0
+            # Purane se naye ki taraf - har mahina apni opening pichle closing se milata hai
+            for month in months:
+                if month in existing:
+                    skipped += 1
+                elif BalanceSnapshotBLL.build_month(service_id, month, options["inyscode"]):
+                    built += 1
+                else:
+                    failed += 1
+
+            self.stdout.write(
+                f"Service {service_id}: {built} built, {skipped} kept, {failed} failed "
+                f"({months[0]:%Y-%m} .. {months[-1]:%Y-%m})" if months else f"Service {service_id}: no closed months"
+            )
@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .layers.base_dal import BaseDAL
+from .layers.error_handler import DatabaseUnavailableError
+
+
+class ReadYourWritesMiddleware:
+    """
+    Keeps a user's reads on the primary for DB_READ_YOUR_WRITES_SECONDS after they
+    write, so a list reloaded right after a save never comes from a lagging replica.
+    Must sit after SessionMiddleware.
+    """
+
+    SESSION_KEY = "db_pinned_until"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        BaseDAL.begin_request(request.session.get(self.SESSION_KEY))
+        response = self.get_response(request)
+
+        pin_seconds = getattr(settings, "DB_READ_YOUR_WRITES_SECONDS", 5)
+        if pin_seconds and BaseDAL.wrote_in_request() and request.session.get("user_id"):
+            request.session[self.SESSION_KEY] = time.time() + pin_seconds
+        return response
+
+
+class SessionRefreshMiddleware:
+    """
+    Sliding session expiry without SESSION_SAVE_EVERY_REQUEST: a logged-in session is
+    re-saved (new expiry) at most once per SESSION_REFRESH_INTERVAL seconds, so AJAX
+    calls like select2 keystrokes don't each write the session store.
+    Must sit after SessionMiddleware.
+    """
+
+    SESSION_KEY = "session_refreshed_at"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, "session", None)
+        if session is not None and session.get("user_id"):
+            interval = getattr(settings, "SESSION_REFRESH_INTERVAL", 120)
+            now = int(time.time())
+            if now - session.get(self.SESSION_KEY, 0) >= interval:
+                session[self.SESSION_KEY] = now  # modified -> saved with a fresh expiry
+        return response
+
+
+class DatabaseUnavailableMiddleware:
+    """
+    Turns DatabaseUnavailableError (SQL Server down / circuit breaker open) into a
+    503 instead of a 500 or an empty page, so users see an outage, not missing data.
+    """
+
+    RETRY_AFTER = "10"
+    MESSAGE = "Database is temporarily unavailable. Please try again shortly."
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, DatabaseUnavailableError):
+            return None
+
+        print(f"--- DB UNAVAILABLE ({request.path}): {str(exception)} ---")
+        if request.headers.get("x-requested-with") == "XMLHttpRequest":
+            response = JsonResponse(
+                {"success": False, "message": self.MESSAGE}, status=503
+            )
+        else:
+            response = HttpResponse(self.MESSAGE, status=503, content_type="text/plain")
+        response["Retry-After"] = self.RETRY_AFTER
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.3 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_id', models.IntegerField()),
+                ('inyscode', models.IntegerField(default=0)),
+                ('period', models.DateField()),
+                ('account_name', models.CharField(blank=True, default='', max_length=200)),
+                ('opening', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('receipts', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('payments', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('closing', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'core_balance_snapshot',
+                'constraints': [models.UniqueConstraint(fields=('service_id', 'period', 'inyscode', 'account_name'), name='uq_balance_snapshot_period_year_account')],
+            },
+        ),
+    ]
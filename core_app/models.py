@@ -1,3 +1,34 @@
 from django.db import models
 
-# Create your models here.
+
+class BalanceSnapshot(models.Model):
+    """
+    Period-close balances of the consolidated cash book, one set per service and month
+    (built by `manage.py build_balance_snapshots`, read by BalanceSnapshotBLL).
+
+    account_name "" is the service row: opening / receipt side / payment side / closing.
+    Other rows hold one account's receipts and payments for the month.
+    """
+
+    service_id = models.IntegerField()
+    inyscode = models.IntegerField(default=0)  # Fiscal year ka code
+    period = models.DateField()  # Mahine ki pehli tareekh
+    account_name = models.CharField(max_length=200, blank=True, default="")
+    opening = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    receipts = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    payments = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    closing = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "core_balance_snapshot"
+        # (service_id, period) pehle: har report / rebuild query isi jore par filter karti hai
+        constraints = [
+            models.UniqueConstraint(
+                fields=["service_id", "period", "inyscode", "account_name"],
+                name="uq_balance_snapshot_period_year_account",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} {self.period:%Y-%m} {self.account_name or '*'}"
@@ -1,4 +1,8 @@
 from core_app.modules.journal.journal_dal import JournalDAL
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.modules.transaction.balance_snapshot_bll import BalanceSnapshotBLL
+from core_app.modules.transaction.ledger_bll import LedgerBLL
+from core_app.layers.error_handler import DatabaseUnavailableError
 
 
 class JournalBLL:
@@ -16,10 +20,22 @@ class JournalBLL:
             return JournalDAL.get_journal_book_data(
                 service_id, from_date, to_date, search_term
             )
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Journal List): {str(e)} ---")
             return []
 
+    @staticmethod
+    def iter_journal_list(service_id, from_date, to_date, search_term=""):
+        """
+        Lazy row iterator over the journal for StreamingHttpResponse consumers.
+        Errors propagate to the caller since a partially sent stream cannot be undone.
+        """
+        return JournalDAL.iter_journal_book_data(
+            service_id, from_date, to_date, search_term
+        )
+
     @staticmethod
     def create_journal_entry(**kwargs):
         """
@@ -41,8 +57,14 @@ class JournalBLL:
 
             # DAL Call
             result = JournalDAL.insert_journal_entry(**kwargs)
+            if result.get("success"):
+                MonthSegmentCache.invalidate_from("journal", kwargs.get("inamcode"), kwargs.get("dtgjdate"))
+                BalanceSnapshotBLL.invalidate_from(kwargs.get("inamcode"), kwargs.get("dtgjdate"))
+                LedgerBLL.journal_saved(kwargs.get("inamcode"), result.get("voucher_no"), kwargs, is_new=True)
             return result
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Create Journal): {str(e)} ---")
             return {"success": False, "message": f"BLL Error: {str(e)}"}
@@ -69,6 +91,12 @@ class JournalBLL:
 
             if status_code == 101:
                 result["message"] = "Journal entry modified successfully."
+                days = (kwargs.get("orig_dtgjdate"), kwargs.get("dtgjdate"))
+                found = MonthSegmentCache.invalidate_row(
+                    "journal", kwargs.get("inamcode"), "vcgjnmbr", kwargs.get("vcgjnmbr"), *days
+                )
+                BalanceSnapshotBLL.invalidate_changed(kwargs.get("inamcode"), found, *days)
+                LedgerBLL.journal_saved(kwargs.get("inamcode"), kwargs.get("vcgjnmbr"), kwargs, is_new=False)
             elif status_code == 2003:
                 result["message"] = (
                     "Conflict: Another user has modified this record. Please refresh."
@@ -78,6 +106,8 @@ class JournalBLL:
 
             return result
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Update Journal): {str(e)} ---")
             return {"success": False, "message": f"BLL Update Error: {str(e)}"}
@@ -92,6 +122,8 @@ class JournalBLL:
             # Agar individual detail ki SP hai to yahan call hogi
             # Filhal list se hi data filter kiya ja sakta hai client-side par
             pass
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Journal Detail): {str(e)} ---")
             return None
@@ -1,13 +1,44 @@
 from core_app.layers.base_dal import BaseDAL
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.layers.sp_registry import SPRegistry, INT, DATE, NVARCHAR
+
+# --- SP catalogue (typed binding for reads, kind for writes) ---
+# Cache tags are per service: "{n}" = n-th SP parameter (service id / @pINAMCODE)
+SPRegistry.register(
+    "sp_GJournal_GetList",
+    [INT, DATE, DATE, NVARCHAR(200)],
+    cache_ttl=30,
+    cache_tags=["journal:{0}"],
+    coalesce=True,
+)
+SPRegistry.register("spGjrnlAdd", kind="write", invalidates=["journal:{9}"])
+SPRegistry.register("spGjrnlEdit", kind="write", invalidates=["journal:{11}"])
 
 
 class JournalDAL(BaseDAL):
 
     @staticmethod
     def get_journal_book_data(service_id, from_date, to_date, search_term=""):
-        """Journal list lane ke liye"""
+        """Journal list lane ke liye (bina search: band mahine segment cache se)"""
+        if search_term:
+            params = [service_id, from_date, to_date, search_term]
+            return BaseDAL.execute_sp("sp_GJournal_GetList", params)
+
+        return MonthSegmentCache.get_range(
+            "journal",
+            service_id,
+            from_date,
+            to_date,
+            "dtgjdate",
+            load_segment=lambda d1, d2: JournalDAL.iter_journal_book_data(service_id, d1, d2),
+            fetch_live=lambda d1, d2: BaseDAL.execute_sp("sp_GJournal_GetList", [service_id, d1, d2, ""]),
+        )
+
+    @staticmethod
+    def iter_journal_book_data(service_id, from_date, to_date, search_term="", batch_size=None):
+        """Journal list ko batches mein stream karne ke liye"""
         params = [service_id, from_date, to_date, search_term]
-        return BaseDAL.execute_sp("sp_GJournal_GetList", params)
+        return BaseDAL.iter_sp("sp_GJournal_GetList", params, batch_size=batch_size)
 
     @staticmethod
     def insert_journal_entry(**kwargs):
@@ -35,7 +66,12 @@ class JournalDAL(BaseDAL):
         ]
 
         # SP has 3 OUTPUT params: @pVCGJNMBR, @pBIGJVNMB, @pRETVAL
-        result = BaseDAL.execute_sp_with_outputs("spGjrnlAdd", params, output_count=3)
+        result = BaseDAL.execute_sp_with_outputs(
+            "spGjrnlAdd",
+            params,
+            output_count=3,
+            output_types=["VARCHAR(50)", "BIGINT", "INT"],
+        )
 
         outputs = result.get("output_params", [])
         retval = outputs[2] if len(outputs) > 2 else 0
@@ -74,7 +110,7 @@ class JournalDAL(BaseDAL):
 
         # spGjrnlEdit has 1 OUTPUT: @pRETVAL
         result = BaseDAL.execute_sp_single_row("spGjrnlEdit", params)
-        retval = result.get("pRETVAL") if result else 0
+        retval = result.get("pretval") if result else 0
 
         error_map = {
             101: ("success", "Record modified successfully."),
@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.cache import never_cache
 import json
@@ -8,6 +8,12 @@ import calendar
 
 # Modular Imports
 from core_app.modules.journal.journal_bll import JournalBLL
+from core_app.layers.row import RowJSONEncoder
+from core_app.layers.datatables import DataTablesAdapter
+from core_app.layers.exports import StreamingExport
+from core_app.layers.error_handler import DatabaseUnavailableError
+from core_app.layers.constants import ModuleKey, PermissionType
+from core_app.modules.users.permission_bll import requires
 
 
 def is_ajax(request):
@@ -15,17 +21,11 @@ def is_ajax(request):
 
 
 @never_cache
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_VIEW)
 def journal_book_view(request):
     """
     Main General Journal View: Handles date range filtering and initial page load.
     """
-    if not request.session.get("user_id"):
-        if is_ajax(request):
-            return JsonResponse(
-                {"success": False, "message": "Session Expired"}, status=401
-            )
-        return redirect("core_app:login")
-
     is_ajax_req = is_ajax(request)
     base_template = "core_app/blank.html" if is_ajax_req else "core_app/base.html"
 
@@ -44,13 +44,11 @@ def journal_book_view(request):
     return render(request, "core_app/journal/general_journal.html", context)
 
 
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_VIEW)
 def journal_list_ajax(request):
     """
     AJAX view to fetch journal data for DataTables OR a single entry for editing.
     """
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     try:
         service_id = request.session.get("current_service_id")
 
@@ -60,38 +58,83 @@ def journal_list_ajax(request):
             # BLL se single record fetch karen
             data = JournalBLL.get_journal_list(service_id, id=journal_id)
             if data:
-                return JsonResponse({"success": True, "data": data[0]})
+                return JsonResponse(
+                    {"success": True, "data": data[0]}, encoder=RowJSONEncoder
+                )
             return JsonResponse({"success": False, "message": "Record not found"})
 
-        # 2. Otherwise, handle DataTables List request
+        # 2. Otherwise, handle DataTables List request (server-side: sirf ek page wapas)
         from_date = request.GET.get("from_date")
         to_date = request.GET.get("to_date")
-        search_term = request.GET.get("search[value]", "")
 
-        data = JournalBLL.get_journal_list(
-            service_id, from_date=from_date, to_date=to_date, search_term=search_term
+        response = DataTablesAdapter.respond(
+            request.GET,
+            fetch=lambda search_term: JournalBLL.get_journal_list(
+                service_id, from_date=from_date, to_date=to_date, search_term=search_term
+            ),
+            count_key=("journal", service_id, from_date, to_date),
+            count_tags=[f"journal:{service_id}"],
+            sort_keys={"dtgjdate_disp": "dtgjdate", "mngjamnt_disp": "mngjamnt"},
+            orderable=(
+                "dtgjdate_disp",
+                "vcgjnmbr",
+                "vcdrname",
+                "vccrname",
+                "mngjamnt_disp",
+                "vcgjdesc",
+                "vcysdesc",
+            ),
         )
+        return JsonResponse(response, encoder=RowJSONEncoder)
+    except DatabaseUnavailableError:
+        raise
+    except Exception as e:
+        print(f"--- VIEW ERROR (Journal List): {traceback.format_exc()} ---")
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
 
-        return JsonResponse(
-            {
-                "draw": int(request.GET.get("draw", 1)),
-                "recordsTotal": len(data),
-                "recordsFiltered": len(data),
-                "data": data,
-            }
+
+# Export ke columns: (heading, sp_GJournal_GetList column)
+JOURNAL_EXPORT_COLUMNS = [
+    ("Date", "dtgjdate"),
+    ("Voucher #", "vcgjnmbr"),
+    ("Debit Account", "vcdrname"),
+    ("Credit Account", "vccrname"),
+    ("Amount", "mngjamnt"),
+    ("Title", "vcgjtitl"),
+    ("Description", "vcgjdesc"),
+    ("Fiscal Year", "vcysdesc"),
+]
+
+
+@never_cache
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_VIEW)
+def journal_export(request):
+    """Streams the journal range as CSV or XLSX: ?from_date&to_date&q&format=csv|xlsx"""
+    service_id = request.session.get("current_service_id")
+    today = date.today()
+    from_date = request.GET.get("from_date") or today.replace(day=1).strftime("%Y-%m-%d")
+    to_date = request.GET.get("to_date") or today.strftime("%Y-%m-%d")
+
+    try:
+        return StreamingExport.response(
+            f"journal_{from_date}_{to_date}",
+            request.GET.get("format"),
+            JOURNAL_EXPORT_COLUMNS,
+            JournalBLL.iter_journal_list(service_id, from_date, to_date, request.GET.get("q", "")),
+            sheet_name="Journal",
         )
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        print(f"--- VIEW ERROR (Journal List): {traceback.format_exc()} ---")
+        print(f"--- VIEW ERROR (Journal Export): {traceback.format_exc()} ---")
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_CREATE)
 def add_journal_view(request):
     """
     AJAX view to create a new Journal Entry using spGjrnlAdd.
     """
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -119,16 +162,16 @@ def add_journal_view(request):
             result = JournalBLL.create_journal_entry(**params)
             return JsonResponse(result)
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- VIEW ERROR (Save Journal): {traceback.format_exc()} ---")
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_DELETE)
 def delete_journal_view(request):
     """AJAX view to delete/cancel a journal entry."""
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             import json
@@ -146,17 +189,17 @@ def delete_journal_view(request):
             # Temporary success message jab tak BLL integrate nahi hoti:
             return JsonResponse({"success": True, "message": "Deleted successfully"})
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.JOURNAL, PermissionType.CAN_EDIT)
 def update_journal_view(request):
     """
     AJAX view to update existing Journal Entry using spGjrnlEdit.
     """
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -176,11 +219,14 @@ def update_journal_view(request):
                 "vcgjmnth": data.get("vcgjmnth", ""),
                 "inyscode": data.get("inyscode"),
                 "ingjvrsn": data.get("ingjvrsn"),  # Version check for concurrency
+                "orig_dtgjdate": data.get("orig_dtgjdate"),  # SP param nahi - cache invalidation ke liye
             }
 
             result = JournalBLL.update_existing_journal(**params)
             return JsonResponse(result)
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- VIEW ERROR (Update Journal): {traceback.format_exc()} ---")
             return JsonResponse({"success": False, "message": str(e)}, status=500)
@@ -208,6 +254,8 @@ def get_journal_lookup_ajax(request):
         data = []
 
         return JsonResponse(data, safe=False)
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         print(f"--- VIEW ERROR (Journal Lookup): {str(e)} ---")
         return JsonResponse([], safe=False)
@@ -0,0 +1,301 @@
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from core_app.layers.error_handler import DatabaseUnavailableError
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.models import BalanceSnapshot
+from core_app.modules.journal.journal_dal import JournalDAL
+from core_app.modules.transaction.consolidated_dal import ConsolidatedDAL
+from core_app.modules.transaction.transaction_dal import TransactionDAL
+
+
+class BalanceSnapshotBLL:
+    """
+    Period-close snapshots of the consolidated cash book (BalanceSnapshot, one set per
+    service and closed month, tagged with the fiscal year inyscode).
+
+    Report path: the range is cut into whole closed months with a snapshot and live
+    pieces (a partial first month, gaps without a snapshot, the open month). Each
+    live piece is one sp_Report_ConsolidatedCashBook call over that short range, so a
+    year's report reads twelve snapshot rows plus the current month instead of making
+    the SP walk the whole year. Opening = first piece's opening, closing = last piece's
+    closing; each piece has to open where the previous one closed, otherwise the
+    snapshots are dropped from the first one used and the caller runs the SP over the full range.
+    """
+
+    CLOSING_LABEL = "Closing Cash Balance"  # SP ki account list mein closing wali row
+    TOLERANCE = Decimal("0.01")
+
+    @staticmethod
+    def config():
+        cfg = getattr(settings, "BALANCE_SNAPSHOTS", {})
+        return cfg.get("enabled", True), cfg.get("months", 24)
+
+    # --- Build ---
+
+    @staticmethod
+    def build_month(service_id, month, inyscode=0):
+        """
+        (Re)builds one closed month. inyscode is taken from the month's own cash book /
+        journal rows; the argument is only the fallback for a month without rows.
+        Returns True when a snapshot was stored.
+        """
+        month = month.replace(day=1)
+        if month >= date.today().replace(day=1):
+            return False  # Khula mahina abhi close nahi hua
+
+        month_end = MonthSegmentCache.add_months(month, 1) - timedelta(days=1)
+        piece = BalanceSnapshotBLL.parse_report(
+            ConsolidatedDAL.get_report_data(service_id, month.isoformat(), month_end.isoformat())
+        )
+        if piece is None:
+            print(f"--- SNAPSHOT WARNING ({service_id} {month:%Y-%m}): report did not balance ---")
+            return False
+        try:
+            inyscode = BalanceSnapshotBLL.period_inyscode(service_id, month, month_end) or inyscode
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- SNAPSHOT WARNING ({service_id} {month:%Y-%m}): inyscode not derived: {str(e)} ---")
+
+        rows = [
+            BalanceSnapshot(
+                service_id=service_id,
+                inyscode=inyscode or 0,
+                period=month,
+                account_name="",
+                opening=piece["opening"],
+                receipts=piece["receipt_side"],
+                payments=piece["payment_side"],
+                closing=piece["closing"],
+            )
+        ]
+        rows.extend(
+            BalanceSnapshot(
+                service_id=service_id,
+                inyscode=inyscode or 0,
+                period=month,
+                account_name=name[:200],
+                receipts=receipt,
+                payments=payment,
+            )
+            for name, (receipt, payment) in piece["accounts"].items()
+        )
+        with transaction.atomic():
+            BalanceSnapshot.objects.filter(service_id=service_id, period=month).delete()
+            BalanceSnapshot.objects.bulk_create(rows)
+        return True
+
+    @staticmethod
+    def period_inyscode(service_id, month, month_end):
+        """Most common inyscode among the month's cash book and journal rows (None if no rows)."""
+        d1, d2 = month.isoformat(), month_end.isoformat()
+        codes = Counter()
+        for rows in (
+            TransactionDAL.iter_cash_book_data(service_id, d1, d2),
+            JournalDAL.iter_journal_book_data(service_id, d1, d2),
+        ):
+            for row in rows:
+                code = row.get("inyscode")
+                if code not in (None, ""):
+                    codes[int(code)] += 1
+        return codes.most_common(1)[0][0] if codes else None
+
+    @staticmethod
+    def invalidate_from(service_id, day=None):
+        """
+        A write dated `day` changes that month and every later opening, so snapshots from
+        its month onward are dropped. day=None (old date unknown) drops the service's set.
+        """
+        if service_id is None or not BalanceSnapshotBLL.config()[0]:
+            return
+        try:
+            snapshots = BalanceSnapshot.objects.filter(service_id=service_id)
+            day = MonthSegmentCache.as_date(day) if day is not None else None
+            if day is not None:
+                snapshots = snapshots.filter(period__gte=day.replace(day=1))
+            snapshots.delete()
+        except Exception as e:
+            print(f"--- BLL ERROR (Snapshot Invalidate): {str(e)} ---")
+
+    @staticmethod
+    def invalidate_changed(service_id, found_months, *days):
+        """
+        Edits/deletes: invalidates from the earliest of the row's old / new dates and the
+        cached months that held it (MonthSegmentCache.invalidate_row). Nothing known ->
+        the service's whole set.
+        """
+        known = list(found_months) + [d for d in map(MonthSegmentCache.as_date, days) if d is not None]
+        # Purani tareekh maloom nahi - poora set dobara banega
+        BalanceSnapshotBLL.invalidate_from(service_id, min(known) if known else None)
+
+    # --- Report ---
+
+    @staticmethod
+    def get_report(service_id, from_date, to_date):
+        """Report context built from snapshots + live pieces, or None (caller runs the SP)."""
+        start, end = MonthSegmentCache.as_date(from_date), MonthSegmentCache.as_date(to_date)
+        if not BalanceSnapshotBLL.config()[0]:
+            return None
+        if service_id is None or start is None or end is None or start > end:
+            return None
+        open_month = date.today().replace(day=1)
+
+        try:
+            first_whole = start if start.day == 1 else MonthSegmentCache.add_months(start, 1).replace(day=1)
+            stored = BalanceSnapshotBLL.load_months(service_id, first_whole, min(end, open_month))
+
+            pieces = []
+            used = 0
+            live_from = start
+            cursor = first_whole
+            while cursor < open_month:
+                next_month = MonthSegmentCache.add_months(cursor, 1)
+                if next_month - timedelta(days=1) > end:
+                    break
+                if cursor in stored:
+                    # Snapshot se pehle ka hissa (adhoora mahina / gap) live
+                    if live_from < cursor:
+                        pieces.append(BalanceSnapshotBLL.live_piece(service_id, live_from, cursor - timedelta(days=1)))
+                    pieces.append(stored[cursor])
+                    used += 1
+                    live_from = next_month
+                cursor = next_month
+            if not used:
+                return None
+            if live_from <= end:
+                pieces.append(BalanceSnapshotBLL.live_piece(service_id, live_from, end))
+            if any(piece is None for piece in pieces):
+                return None
+
+            for previous, piece in zip(pieces, pieces[1:]):
+                if abs(previous["closing"] - piece["opening"]) > BalanceSnapshotBLL.TOLERANCE:
+                    # Koi write ka hook miss hua - kaunsa snapshot ghalat hai maloom nahi,
+                    # is liye pehle istemal hone wale snapshot se sab dobara banenge
+                    first_used = next(p["period"] for p in pieces if p.get("period"))
+                    BalanceSnapshotBLL.invalidate_from(service_id, first_used)
+                    return None
+
+            return BalanceSnapshotBLL.merge(pieces)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- BLL ERROR (Snapshot Report): {str(e)} ---")
+            return None
+
+    @staticmethod
+    def load_months(service_id, first_month, before):
+        """{period: piece} for stored months in [first_month, before) - one query."""
+        months = {}
+        snapshots = BalanceSnapshot.objects.filter(
+            service_id=service_id, period__gte=first_month, period__lt=before
+        ).order_by("period", "id")
+        for snap in snapshots:
+            piece = months.setdefault(snap.period, {"period": snap.period, "accounts": {}, "complete": False})
+            if snap.account_name:
+                piece["accounts"][snap.account_name] = (snap.receipts, snap.payments)
+            else:
+                piece.update(
+                    opening=snap.opening,
+                    receipt_side=snap.receipts,
+                    payment_side=snap.payments,
+                    closing=snap.closing,
+                    has_closing_row=True,
+                    complete=True,
+                )
+        return {period: piece for period, piece in months.items() if piece["complete"]}
+
+    @staticmethod
+    def live_piece(service_id, d1, d2):
+        return BalanceSnapshotBLL.parse_report(
+            ConsolidatedDAL.get_report_data(service_id, d1.isoformat(), d2.isoformat())
+        )
+
+    @staticmethod
+    def parse_report(raw_data):
+        """
+        SP result sets -> {opening, receipt_side, payment_side, closing, accounts}.
+        None when the SP failed or its footer does not match its own rows
+        (opening + receipts = receipt side, payments + closing = payment side).
+        """
+        if not raw_data or len(raw_data) < 3 or not raw_data[0] or not raw_data[2]:
+            return None
+        totals = raw_data[2][0]
+        opening = BalanceSnapshotBLL._amount(raw_data[0][0].get("openingbalance"))
+        receipt_side = BalanceSnapshotBLL._amount(totals.get("grandtotalreceiptside"))
+        payment_side = BalanceSnapshotBLL._amount(totals.get("grandtotalpaymentside"))
+        closing = BalanceSnapshotBLL._amount(totals.get("finalclosingbalance"))
+        if None in (opening, receipt_side, payment_side, closing):
+            return None
+
+        accounts = {}
+        has_closing_row = False
+        for row in raw_data[1]:
+            name = str(row.get("vcacname") or "").strip()
+            if name == BalanceSnapshotBLL.CLOSING_LABEL:
+                has_closing_row = True
+                continue
+            receipt = BalanceSnapshotBLL._amount(row.get("totalreceipt")) or Decimal(0)
+            payment = BalanceSnapshotBLL._amount(row.get("totalpayment")) or Decimal(0)
+            old_receipt, old_payment = accounts.get(name, (Decimal(0), Decimal(0)))
+            accounts[name] = (old_receipt + receipt, old_payment + payment)
+
+        receipts = sum((r for r, _ in accounts.values()), Decimal(0))
+        payments = sum((p for _, p in accounts.values()), Decimal(0))
+        tolerance = BalanceSnapshotBLL.TOLERANCE
+        if abs(opening + receipts - receipt_side) > tolerance or abs(payments + closing - payment_side) > tolerance:
+            return None
+
+        return {
+            "opening": opening,
+            "receipt_side": receipt_side,
+            "payment_side": payment_side,
+            "closing": closing,
+            "accounts": accounts,
+            "has_closing_row": has_closing_row,
+        }
+
+    @staticmethod
+    def merge(pieces):
+        """Consecutive pieces -> the same context shape ConsolidatedBLL builds from the SP."""
+        accounts = {}
+        for piece in pieces:
+            for name, (receipt, payment) in piece["accounts"].items():
+                old_receipt, old_payment = accounts.get(name, (Decimal(0), Decimal(0)))
+                accounts[name] = (old_receipt + receipt, old_payment + payment)
+
+        opening, closing = pieces[0]["opening"], pieces[-1]["closing"]
+        receipts = sum((r for r, _ in accounts.values()), Decimal(0))
+        payments = sum((p for _, p in accounts.values()), Decimal(0))
+
+        account_data = [
+            {"vcacname": name, "totalreceipt": receipt, "totalpayment": payment}
+            for name, (receipt, payment) in accounts.items()
+        ]
+        if any(piece.get("has_closing_row") for piece in pieces):
+            account_data.append(
+                {"vcacname": BalanceSnapshotBLL.CLOSING_LABEL, "totalreceipt": Decimal(0), "totalpayment": closing}
+            )
+
+        return {
+            "opening_balance": opening,
+            "account_data": account_data,
+            "totals": {
+                "grandtotalreceiptside": opening + receipts,
+                "grandtotalpaymentside": payments + closing,
+                "finalclosingbalance": closing,
+            },
+        }
+
+    @staticmethod
+    def _amount(value):
+        if value is None:
+            return None
+        try:
+            return Decimal(str(value))
+        except (InvalidOperation, ValueError):
+            return None
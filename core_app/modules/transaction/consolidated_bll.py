@@ -1,9 +1,15 @@
+from core_app.modules.transaction.balance_snapshot_bll import BalanceSnapshotBLL
 from core_app.modules.transaction.consolidated_dal import ConsolidatedDAL
 
 
 class ConsolidatedBLL:
     @staticmethod
     def get_consolidated_context(service_id, from_date, to_date):
+        # Band mahine snapshots se, baqi hissa live SP se
+        snapshot_data = BalanceSnapshotBLL.get_report(service_id, from_date, to_date)
+        if snapshot_data is not None:
+            return snapshot_data
+
         raw_data = ConsolidatedDAL.get_report_data(service_id, from_date, to_date)
 
         final_data = {"opening_balance": "0.00", "account_data": [], "totals": {}}
@@ -11,8 +17,8 @@ class ConsolidatedBLL:
         if raw_data:
             # Index 0: Opening Balance
             if len(raw_data) > 0 and raw_data[0]:
-                # SP return kar rahi hai column name 'OpeningBalance'
-                final_data["opening_balance"] = raw_data[0][0].get("OpeningBalance", 0)
+                # SP column 'OpeningBalance' (BaseDAL keys are lowercase)
+                final_data["opening_balance"] = raw_data[0][0].get("openingbalance", 0)
 
             # Index 1: Account Table Records (Entertainment, Fees etc)
             if len(raw_data) > 1:
@@ -1,7 +1,10 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.views.decorators.cache import never_cache
 from datetime import date
 from core_app.modules.transaction.consolidated_bll import ConsolidatedBLL
+from core_app.layers.exports import StreamingExport
+from core_app.layers.constants import ModuleKey, PermissionType
+from core_app.modules.users.permission_bll import requires
 
 
 def is_ajax(request):
@@ -9,11 +12,8 @@ def is_ajax(request):
 
 
 @never_cache
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
 def consolidated_cash_book(request):
-    # Pattern Match: Session Check (As per Cash Book)
-    if not request.session.get("user_id"):
-        return redirect("core_app:login")
-
     service_id = request.session.get("current_service_id")
 
     # Template Selection (As per Cash Book)
@@ -43,3 +43,43 @@ def consolidated_cash_book(request):
 
     # Important: Folder structure as per your project
     return render(request, "core_app/transaction/consolidated_cash_book.html", context)
+
+
+# Export ke columns: (heading, report row key)
+CONSOLIDATED_EXPORT_COLUMNS = [
+    ("Account", "vcacname"),
+    ("Receipt", "totalreceipt"),
+    ("Payment", "totalpayment"),
+]
+
+
+@never_cache
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
+def consolidated_cash_book_export(request):
+    """Report as CSV / XLSX: opening balance row, account rows, grand totals row."""
+    service_id = request.session.get("current_service_id")
+    from_date = request.GET.get("from_date") or date.today().replace(day=1).strftime("%Y-%m-%d")
+    to_date = request.GET.get("to_date") or date.today().strftime("%Y-%m-%d")
+
+    report_data = ConsolidatedBLL.get_consolidated_context(service_id, from_date, to_date)
+    totals = report_data["totals"]
+
+    # DAL se stream nahi hota: report SP / snapshots se aggregated context banta hai
+    # (har account ki ek row), is liye rows seedhe context se - chhoti list hai
+    rows = [{"vcacname": "Opening Balance", "totalreceipt": report_data["opening_balance"]}]
+    rows.extend(report_data["account_data"])
+    rows.append(
+        {
+            "vcacname": "Grand Total",
+            "totalreceipt": totals.get("grandtotalreceiptside"),
+            "totalpayment": totals.get("grandtotalpaymentside"),
+        }
+    )
+
+    return StreamingExport.response(
+        f"consolidated_cash_book_{from_date}_{to_date}",
+        request.GET.get("format"),
+        CONSOLIDATED_EXPORT_COLUMNS,
+        rows,
+        sheet_name="Consolidated Cash Book",
+    )
@@ -1,37 +1,25 @@
-from django.db import connection
 from core_app.layers.base_dal import BaseDAL
+from core_app.layers.sp_registry import SPRegistry, INT, DATE
+
+# Report reads cash book and journal postings - either kind of write makes it stale
+SPRegistry.register(
+    "sp_Report_ConsolidatedCashBook",
+    [INT, DATE, DATE],
+    cache_ttl=60,
+    cache_tags=["cashbook:{0}", "journal:{0}"],
+    coalesce=True,
+)
 
 
 class ConsolidatedDAL(BaseDAL):
     @staticmethod
     def get_report_data(service_id, from_date, to_date):
-        results = []
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "EXEC [dbo].[sp_Report_ConsolidatedCashBook] %s, %s, %s",
-                    [service_id, from_date, to_date],
-                )
-
-                # 1. Opening Balance Set
-                results.append(ConsolidatedDAL.dictfetchall(cursor))
-
-                # 2. Account Details Set
-                if cursor.nextset():
-                    results.append(ConsolidatedDAL.dictfetchall(cursor))
-
-                # 3. Grand Totals Set
-                if cursor.nextset():
-                    results.append(ConsolidatedDAL.dictfetchall(cursor))
-
-            return results
-        except Exception as e:
-            print(f"--- DAL ERROR: {str(e)} ---")
+        """
+        sp_Report_ConsolidatedCashBook returns 3 result sets:
+        Opening Balance, Account Details aur Grand Totals (LOWERCASE keys).
+        """
+        params = [service_id, from_date, to_date]
+        results = BaseDAL.execute_sp_multi("sp_Report_ConsolidatedCashBook", params)
+        if not results:
             return [[], [], []]
-
-    @staticmethod
-    def dictfetchall(cursor):
-        if cursor.description is None:
-            return []
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return results
@@ -0,0 +1,157 @@
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.conf import settings
+
+from core_app.layers.error_handler import DatabaseUnavailableError
+from core_app.layers.ledger_index import LedgerIndexRegistry
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.modules.journal.journal_dal import JournalDAL
+from core_app.modules.transaction.transaction_dal import TransactionDAL
+
+
+class LedgerBLL:
+    """
+    Account balances as of any date from the per-service LedgerIndex (sparse Fenwick
+    trees of daily deltas), loaded once from sp_Trans_GetList + sp_GJournal_GetList and patched
+    by TransactionBLL / JournalBLL after each committed write.
+
+    Sign: debit positive. A cash payment debits its account and credits CASH_ACCOUNT,
+    a receipt the other way round; a journal debits indrcode and credits incrcode.
+    Which voucher types are payments / receipts comes from LEDGER_INDEX.
+    """
+
+    CASH_ACCOUNT = "CASH"
+
+    @staticmethod
+    def config():
+        cfg = getattr(settings, "LEDGER_INDEX", {})
+        return {
+            "enabled": cfg.get("enabled", True),
+            "since": MonthSegmentCache.as_date(cfg.get("since", "2000-01-01")),
+            "horizon_days": cfg.get("horizon_days", 400),
+            "payment_types": {str(t) for t in cfg.get("payment_voucher_types", [1])},
+            "receipt_types": {str(t) for t in cfg.get("receipt_voucher_types", [2])},
+        }
+
+    # --- Row -> postings ---
+
+    @staticmethod
+    def cash_postings(row, cfg):
+        """[(account, day, paisa)] of a cash book row / spTransAdd-Edit kwargs."""
+        day = MonthSegmentCache.as_date(row.get("dttrdate"))
+        amount = LedgerBLL._paisa(row.get("mntramnt"))
+        account = row.get("inaccode")
+        if day is None or not amount or account in (None, ""):
+            return []
+        voucher_type = str(row.get("invtcode"))
+        if voucher_type in cfg["payment_types"]:
+            sign = 1
+        elif voucher_type in cfg["receipt_types"]:
+            sign = -1
+        else:
+            return []  # Cash se bahar ka voucher - ledger par asar nahi
+        return [(str(account), day, sign * amount), (LedgerBLL.CASH_ACCOUNT, day, -sign * amount)]
+
+    @staticmethod
+    def journal_postings(row):
+        day = MonthSegmentCache.as_date(row.get("dtgjdate"))
+        amount = LedgerBLL._paisa(row.get("mngjamnt"))
+        debit, credit = row.get("indrcode"), row.get("incrcode")
+        if day is None or not amount or debit in (None, "") or credit in (None, ""):
+            return []
+        return [(str(debit), day, amount), (str(credit), day, -amount)]
+
+    # --- Index ---
+
+    @staticmethod
+    def load(service_id):
+        """[(row key, postings)] for LedgerIndexRegistry - streams both list SPs once."""
+        cfg = LedgerBLL.config()
+        d1 = cfg["since"].isoformat()
+        d2 = (date.today() + timedelta(days=cfg["horizon_days"])).isoformat()
+        for row in TransactionDAL.iter_cash_book_data(service_id, d1, d2):
+            yield ("c", str(row.get("intrcode"))), LedgerBLL.cash_postings(row, cfg)
+        for row in JournalDAL.iter_journal_book_data(service_id, d1, d2):
+            yield ("j", str(row.get("vcgjnmbr"))), LedgerBLL.journal_postings(row)
+
+    @staticmethod
+    def get_index(service_id):
+        if service_id is None or not LedgerBLL.config()["enabled"]:
+            return None
+        try:
+            return LedgerIndexRegistry.get(service_id, LedgerBLL.load)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- BLL ERROR (Ledger Index): {str(e)} ---")
+            return None
+
+    @staticmethod
+    def balance(service_id, account, as_of):
+        """Balance of account at the end of as_of (Decimal), or None if unavailable."""
+        index = LedgerBLL.get_index(service_id)
+        day = MonthSegmentCache.as_date(as_of)
+        if index is None or day is None:
+            return None
+        return LedgerBLL._rupees(index.balance(str(account), day))
+
+    @staticmethod
+    def movement(service_id, account, from_date, to_date):
+        """Net movement of account in [from_date, to_date] (Decimal), or None."""
+        index = LedgerBLL.get_index(service_id)
+        d1, d2 = MonthSegmentCache.as_date(from_date), MonthSegmentCache.as_date(to_date)
+        if index is None or d1 is None or d2 is None:
+            return None
+        return LedgerBLL._rupees(index.movement(str(account), d1, d2))
+
+    @staticmethod
+    def balances(service_id, as_of):
+        """{account: balance} for every account with postings, or None."""
+        index = LedgerBLL.get_index(service_id)
+        day = MonthSegmentCache.as_date(as_of)
+        if index is None or day is None:
+            return None
+        return {account: LedgerBLL._rupees(index.balance(account, day)) for account in index.accounts()}
+
+    # --- Write hooks (call only after the SP reported success) ---
+
+    @staticmethod
+    def cash_saved(service_id, intrcode, data, is_new):
+        key = ("c", str(intrcode))
+        postings = LedgerBLL.cash_postings(data, LedgerBLL.config())
+        LedgerBLL._apply(service_id, key, postings, is_new)
+
+    @staticmethod
+    def cash_deleted(service_id, intrcode):
+        key = ("c", str(intrcode))
+        LedgerBLL._apply(service_id, key, None, False)
+
+    @staticmethod
+    def journal_saved(service_id, vcgjnmbr, data, is_new):
+        key = ("j", str(vcgjnmbr))
+        LedgerBLL._apply(service_id, key, LedgerBLL.journal_postings(data), is_new)
+
+    @staticmethod
+    def _apply(service_id, key, postings, is_new):
+        if service_id is None or key[1] in ("None", ""):
+            return
+        try:
+            # Edit/delete ki purani row index mein na ho to poora index dobara banega
+            LedgerIndexRegistry.apply(service_id, key, postings, must_exist=not is_new)
+        except Exception as e:
+            print(f"--- BLL ERROR (Ledger Patch): {str(e)} ---")
+            LedgerIndexRegistry.drop(service_id)
+
+    # --- Amounts ---
+
+    @staticmethod
+    def _paisa(value):
+        try:
+            return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except (InvalidOperation, TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _rupees(paisa):
+        return (Decimal(paisa) / 100).quantize(Decimal("0.01"))
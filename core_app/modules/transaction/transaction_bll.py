@@ -1,4 +1,13 @@
+import hashlib
+import zlib
+
+from django.core.cache import cache
+
 from core_app.modules.transaction.transaction_dal import TransactionDAL
+from core_app.modules.transaction.balance_snapshot_bll import BalanceSnapshotBLL
+from core_app.modules.transaction.ledger_bll import LedgerBLL
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.layers.error_handler import DatabaseUnavailableError
 
 
 class TransactionBLL:
@@ -9,15 +18,37 @@ class TransactionBLL:
     """
 
     @staticmethod
-    def get_lookup_data(lookup_type, search_term=""):
+    def get_lookup_data(lookup_type, search_term="", page=1):
         """
         Generic method to fetch lookup data for transactions (Accounts, Categories, etc.)
+        Returns one select2 page: {"results": [...], "more": bool}
         """
         try:
-            return TransactionDAL.get_lookup_data(lookup_type, search_term)
+            return TransactionDAL.get_lookup_data(lookup_type, search_term, page)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Transaction Lookup): {str(e)} ---")
-            return []
+            return {"results": [], "more": False}
+
+    # Ek form par isse zyada dropdowns nahi hote
+    MAX_BOOTSTRAP_TYPES = 20
+
+    @staticmethod
+    def get_lookup_bootstrap(lookup_types):
+        """
+        All dropdown data a form needs in one call (cash entry modals etc.)
+        Returns {type: {"results": [...], "more": bool}}
+        """
+        lookup_types = [t.strip() for t in lookup_types if t and t.strip()]
+        lookup_types = lookup_types[: TransactionBLL.MAX_BOOTSTRAP_TYPES]
+        try:
+            return TransactionDAL.get_lookup_bootstrap(lookup_types)
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- BLL ERROR (Lookup Bootstrap): {str(e)} ---")
+            return {t: {"results": [], "more": False} for t in lookup_types}
 
     @staticmethod
     def get_cash_book_list(service_id, from_date, to_date, search_term=""):
@@ -28,10 +59,91 @@ class TransactionBLL:
             return TransactionDAL.get_cash_book_data(
                 service_id, from_date, to_date, search_term
             )
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Cash Book List): {str(e)} ---")
             return []
 
+    # --- Cash book delta ("changes since") ---
+
+    # Seconds a client's last-seen snapshot is kept; older tokens get a full reload
+    SNAPSHOT_TTL = 1800
+
+    @staticmethod
+    def row_signature(row):
+        """intrvrsn + checksum of the whole row (SP-computed balances change without a new version)."""
+        return f"{row.get('intrvrsn')}:{zlib.crc32(repr(tuple(row.values())).encode())}"
+
+    @staticmethod
+    def save_cash_book_snapshot(service_id, filters, versions):
+        """
+        Remembers {intrcode: signature} of what a client was sent and returns the token
+        it sends back as ?since=. filters = (from_date, to_date, search_term).
+        One snapshot per (service, filters): a re-render overwrites it, and an older token
+        for the same filters no longer matches, so that client gets a full reload.
+        """
+        scope = hashlib.sha1(repr((service_id, filters)).encode()).hexdigest()[:12]
+        state = hashlib.sha1(repr(sorted(versions.items())).encode()).hexdigest()[:12]
+        token = f"{scope}.{state}"
+        cache.set(
+            f"cb_snap:{service_id}:{scope}",
+            {"token": token, "filters": filters, "versions": versions},
+            TransactionBLL.SNAPSHOT_TTL,
+        )
+        return token
+
+    @staticmethod
+    def cash_book_versions(rows):
+        return {str(row.get("intrcode")): TransactionBLL.row_signature(row) for row in rows}
+
+    @staticmethod
+    def get_cash_book_changes(service_id, since):
+        """
+        Rows inserted/updated and intrcodes deleted since snapshot `since`:
+        {"reset": False, "token", "upserts": [rows], "deleted": [intrcode, ...]}
+        {"reset": True} when the snapshot is unknown/expired - client reloads the grid.
+        """
+        try:
+            scope = since.split(".", 1)[0] if since else None
+            snapshot = cache.get(f"cb_snap:{service_id}:{scope}") if scope else None
+            if snapshot is None or snapshot["token"] != since:
+                return {"reset": True}
+
+            old_versions = snapshot["versions"]
+            from_date, to_date, search_term = snapshot["filters"]
+            rows = TransactionDAL.get_cash_book_data(service_id, from_date, to_date, search_term)
+            if not rows and old_versions:
+                # Khali result = SP error bhi ho sakta hai - sab "deleted" mat bhejo
+                return {"reset": True}
+
+            versions = TransactionBLL.cash_book_versions(rows)
+            upserts = [
+                row
+                for row in rows
+                if old_versions.get(str(row.get("intrcode"))) != versions[str(row.get("intrcode"))]
+            ]
+            deleted = [code for code in old_versions if code not in versions]
+            token = TransactionBLL.save_cash_book_snapshot(
+                service_id, snapshot["filters"], versions
+            )
+            return {"reset": False, "token": token, "upserts": upserts, "deleted": deleted}
+        except DatabaseUnavailableError:
+            raise
+        except Exception as e:
+            print(f"--- BLL ERROR (Cash Book Changes): {str(e)} ---")
+            return {"reset": True}
+
+    @staticmethod
+    def iter_cash_book_list(service_id, from_date, to_date, search_term=""):
+        """
+        Lazy row iterator over the cash book for StreamingHttpResponse consumers.
+        Errors propagate to the caller since a partially sent stream cannot be undone.
+        """
+        return TransactionDAL.iter_cash_book_data(
+            service_id, from_date, to_date, search_term
+        )
+
     @staticmethod
     def create_cash_entry(**kwargs):
         """
@@ -84,11 +196,17 @@ class TransactionBLL:
             status_code = result.get("status")
             if status_code == 101:
                 result["message"] = "Transaction saved successfully."
+                # Us mahine aur baad ke segments (running balance badla)
+                MonthSegmentCache.invalidate_from("cashbook", kwargs.get("inamcode"), kwargs.get("dttrdate"))
+                BalanceSnapshotBLL.invalidate_from(kwargs.get("inamcode"), kwargs.get("dttrdate"))
+                LedgerBLL.cash_saved(kwargs.get("inamcode"), result.get("new_id"), kwargs, is_new=True)
             elif status_code == 2002:
                 result["message"] = "Transaction Failed: Insufficient funds."
 
             return result
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Create Cash Entry): {str(e)} ---")
             return {"status": "error", "message": f"BLL Create Error: {str(e)}"}
@@ -143,6 +261,13 @@ class TransactionBLL:
 
             if status_code == 101:
                 result["message"] = "Record modified successfully."
+                # Purane / naye mahine mein se jo pehle ho, wahan se aage
+                days = (kwargs.get("orig_dttrdate"), kwargs.get("dttrdate"))
+                found = MonthSegmentCache.invalidate_row(
+                    "cashbook", kwargs.get("inamcode"), "intrcode", intrcode, *days
+                )
+                BalanceSnapshotBLL.invalidate_changed(kwargs.get("inamcode"), found, *days)
+                LedgerBLL.cash_saved(kwargs.get("inamcode"), intrcode, kwargs, is_new=False)
             elif status_code == 2001:
                 result["message"] = "Error: The record could not be modified."
             elif status_code == 2003:
@@ -156,14 +281,17 @@ class TransactionBLL:
 
             return result
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Update Transaction): {str(e)} ---")
             return {"status": "error", "message": f"BLL Update Error: {str(e)}"}
 
     @staticmethod
-    def delete_existing_transaction(service_id, trans_id, version_hex, requested_by):
+    def delete_existing_transaction(service_id, trans_id, version_hex, requested_by, trans_date=None):
         """
         Soft delete or permanent delete logic for transactions.
+        trans_date (the row's date, when the caller has it) limits cache invalidation.
         """
         try:
             if not trans_id:
@@ -172,9 +300,18 @@ class TransactionBLL:
                     "message": "Transaction ID is required for deletion.",
                 }
 
-            return TransactionDAL.delete_transaction(
+            result = TransactionDAL.delete_transaction(
                 service_id, trans_id, version_hex, requested_by
             )
+            if result.get("status") == "success":
+                found = MonthSegmentCache.invalidate_row(
+                    "cashbook", service_id, "intrcode", trans_id, trans_date
+                )
+                BalanceSnapshotBLL.invalidate_changed(service_id, found, trans_date)
+                LedgerBLL.cash_deleted(service_id, trans_id)
+            return result
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Delete Transaction): {str(e)} ---")
             return {"status": "error", "message": f"BLL Delete Error: {str(e)}"}
@@ -1,4 +1,20 @@
 from core_app.layers.base_dal import BaseDAL
+from core_app.layers.lookup_service import LookupService
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.layers.sp_registry import SPRegistry, INT, DATE, NVARCHAR
+
+# --- SP catalogue (typed binding for reads, kind for writes) ---
+# Cache tags are per service: "{n}" = n-th SP parameter (service id / @pINAMCODE)
+SPRegistry.register(
+    "sp_Trans_GetList",
+    [INT, DATE, DATE, NVARCHAR(200)],
+    cache_ttl=30,
+    cache_tags=["cashbook:{0}"],
+    coalesce=True,
+)
+SPRegistry.register("spTransAdd", kind="write", invalidates=["cashbook:{13}"])
+SPRegistry.register("spTransEdit", kind="write", invalidates=["cashbook:{15}"])
+SPRegistry.register("sp_Transactions_Delete", kind="write", invalidates=["cashbook:{0}"])
 
 
 class TransactionDAL(BaseDAL):
@@ -9,13 +25,31 @@ class TransactionDAL(BaseDAL):
 
     @staticmethod
     def get_cash_book_data(service_id, from_date, to_date, search_term=""):
+        if search_term:
+            params = [service_id, from_date, to_date, search_term]
+            return BaseDAL.execute_sp("sp_Trans_GetList", params)
+
+        # Bina search: band mahine segment cache se, sirf khula mahina DB se
+        return MonthSegmentCache.get_range(
+            "cashbook",
+            service_id,
+            from_date,
+            to_date,
+            "dttrdate",
+            load_segment=lambda d1, d2: TransactionDAL.iter_cash_book_data(service_id, d1, d2),
+            fetch_live=lambda d1, d2: BaseDAL.execute_sp("sp_Trans_GetList", [service_id, d1, d2, ""]),
+        )
+
+    @staticmethod
+    def iter_cash_book_data(service_id, from_date, to_date, search_term="", batch_size=None):
+        """Streams sp_Trans_GetList rows without holding the whole range in memory."""
         params = [service_id, from_date, to_date, search_term]
-        return BaseDAL.execute_sp("sp_Trans_GetList", params)
+        return BaseDAL.iter_sp("sp_Trans_GetList", params, batch_size=batch_size)
 
     @staticmethod
     def insert_cash_entry(**kwargs):
         """
-        Calls spTransAdd with 20 parameters.
+        Calls spTransAdd with 20 parameters (17 inputs + 3 OUTPUT).
         Mapping using exact SP field names provided.
         """
         params = [
@@ -36,25 +70,27 @@ class TransactionDAL(BaseDAL):
             0,  # @pINVNCODE (Default 0)
             kwargs.get("inyscode"),  # @pINYSCODE
             0,  # @pINTRVRSN (New Entry is 0)
-            0,  # @pINTRCODE (Output)
-            "",  # @pVCTRNMBR (Output)
-            0,  # @pRetVal (Output)
         ]
 
-        result = BaseDAL.execute_sp_single_row("spTransAdd", params)
-        if not result:
+        # OUTPUT params: @pINTRCODE, @pVCTRNMBR, @pRetVal (same round trip)
+        result = BaseDAL.execute_sp_with_outputs(
+            "spTransAdd",
+            params,
+            output_count=3,
+            output_types=["INT", "VARCHAR(50)", "INT"],
+        )
+        outputs = result.get("output_params", [])
+        if len(outputs) < 3:
             return {"status": "error", "message": "No response from DB."}
 
-        # Normalize keys for output
-        res_normal = {str(k).lower(): v for k, v in result.items()}
-        retval = res_normal.get("pretval")
+        new_id, voucher_no, retval = outputs
 
         if retval == 101:
             return {
                 "status": 101,
                 "message": "Transaction saved successfully!",
-                "new_id": res_normal.get("pintrcode"),
-                "voucher_no": res_normal.get("pvctrnmbr"),
+                "new_id": new_id,
+                "voucher_no": voucher_no,
             }
 
         error_map = {
@@ -139,13 +175,11 @@ class TransactionDAL(BaseDAL):
         }
 
     @staticmethod
-    def get_lookup_data(lookup_type, search_term=""):
-        params = [lookup_type, search_term]
-        raw_data = BaseDAL.execute_sp("sp_Common_GetLookup", params)
-        return [
-            {
-                "id": str(row.get("id") or row.get("ID") or ""),
-                "text": str(row.get("text") or row.get("TEXT") or "No Name"),
-            }
-            for row in raw_data
-        ]
+    def get_lookup_data(lookup_type, search_term="", page=1):
+        """One select2 page from the shared in-memory LookupService: {"results", "more"}"""
+        return LookupService.search(lookup_type, search_term, page)
+
+    @staticmethod
+    def get_lookup_bootstrap(lookup_types):
+        """First page of every dropdown on a form, fetched in one DB batch: {type: {"results", "more"}}"""
+        return LookupService.search_many(lookup_types)
@@ -1,5 +1,6 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.views.decorators.cache import never_cache
 import json
 import traceback
@@ -8,6 +9,11 @@ import calendar
 
 # Naye Modular Imports
 from core_app.modules.transaction.transaction_bll import TransactionBLL
+from core_app.modules.transaction.ledger_bll import LedgerBLL
+from core_app.layers.error_handler import DatabaseUnavailableError
+from core_app.layers.exports import StreamingExport
+from core_app.layers.constants import ModuleKey, PermissionType
+from core_app.modules.users.permission_bll import requires
 
 
 def is_ajax(request):
@@ -15,17 +21,11 @@ def is_ajax(request):
 
 
 @never_cache
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
 def cash_book_view(request):
     """
     Main Cash Book View: Handles dynamic date ranges and AJAX reloads.
     """
-    if not request.session.get("user_id"):
-        if is_ajax(request):
-            return JsonResponse(
-                {"success": False, "message": "Session Expired"}, status=401
-            )
-        return redirect("core_app:login")
-
     service_id = request.session.get("current_service_id")
     is_ajax_req = is_ajax(request)
     base_template = "core_app/blank.html" if is_ajax_req else "core_app/base.html"
@@ -49,10 +49,19 @@ def cash_book_view(request):
         transactions_data = TransactionBLL.get_cash_book_list(
             service_id, from_date, to_date, search_term
         )
+    except DatabaseUnavailableError:
+        raise
     except Exception:
         print(f"--- VIEW ERROR (Cash Book): {traceback.format_exc()} ---")
         transactions_data = []
 
+    # Client is token ke saath sirf tabdeel shuda rows mangta hai (cash_book_changes_ajax)
+    delta_token = TransactionBLL.save_cash_book_snapshot(
+        service_id,
+        (from_date, to_date, search_term),
+        TransactionBLL.cash_book_versions(transactions_data),
+    )
+
     return render(
         request,
         "core_app/transaction/cash_book.html",
@@ -62,29 +71,147 @@ def cash_book_view(request):
             "from_date": from_date,
             "to_date": to_date,
             "search_term": search_term,
+            "delta_token": delta_token,
         },
     )
 
 
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
+def cash_book_changes_ajax(request):
+    """
+    Delta refresh after add/edit/delete: ?since=<delta_token> returns only the rows
+    inserted/updated since that render (as <tr> HTML) and the deleted intrcodes.
+    reset=True means the token is unknown/expired and the grid must be reloaded.
+    """
+    service_id = request.session.get("current_service_id")
+    changes = TransactionBLL.get_cash_book_changes(service_id, request.GET.get("since"))
+    if changes["reset"]:
+        return JsonResponse({"success": True, "reset": True})
+
+    return JsonResponse(
+        {
+            "success": True,
+            "reset": False,
+            "token": changes["token"],
+            "rows": [
+                {
+                    "intrcode": str(row.get("intrcode")),
+                    "html": render_to_string("core_app/transaction/_cash_row_partial.html", {"row": row}),
+                }
+                for row in changes["upserts"]
+            ],
+            "deleted": changes["deleted"],
+        }
+    )
+
+
+# Export ke columns: (heading, sp_Trans_GetList column)
+CASH_BOOK_EXPORT_COLUMNS = [
+    ("Date", "dttrdate"),
+    ("Voucher #", "vctrnmbr"),
+    ("Voucher Type", "vcvtdesc"),
+    ("Account", "vcacname"),
+    ("Title", "vctrtitl"),
+    ("Description", "vctrdesc"),
+    ("Department", "vcdpdesc"),
+    ("Cost Center", "vcccdesc"),
+    ("Invoice", "vctrinvc"),
+    ("Cheque", "vctrchqd"),
+    ("Amount", "mntramnt"),
+    ("Cash Balance", "mntrcbal"),
+    ("Bank Balance", "mntrbbal"),
+]
+
+
+@never_cache
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
+def cash_book_export(request):
+    """
+    Streams the cash book range as CSV or XLSX: ?from_date&to_date&q&format=csv|xlsx
+    Rows go from the SP cursor straight into the file, so multi-year ranges are fine.
+    """
+    service_id = request.session.get("current_service_id")
+    today = date.today()
+    from_date = request.GET.get("from_date") or today.replace(day=1).strftime("%Y-%m-%d")
+    to_date = request.GET.get("to_date") or today.strftime("%Y-%m-%d")
+    search_term = request.GET.get("q", "")
+
+    try:
+        return StreamingExport.response(
+            f"cash_book_{from_date}_{to_date}",
+            request.GET.get("format"),
+            CASH_BOOK_EXPORT_COLUMNS,
+            TransactionBLL.iter_cash_book_list(service_id, from_date, to_date, search_term),
+            sheet_name="Cash Book",
+        )
+    except DatabaseUnavailableError:
+        raise
+    except Exception as e:
+        print(f"--- VIEW ERROR (Cash Book Export): {traceback.format_exc()} ---")
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+
+@never_cache
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
+def ledger_balance_ajax(request):
+    """
+    Account balance from the in-memory ledger index (dashboard / statements):
+    ?account=<inaccode|CASH>&as_of=YYYY-MM-DD[&from_date=YYYY-MM-DD for the movement]
+    """
+    service_id = request.session.get("current_service_id")
+    account = request.GET.get("account") or LedgerBLL.CASH_ACCOUNT
+    as_of = request.GET.get("as_of") or date.today().isoformat()
+    from_date = request.GET.get("from_date")
+
+    balance = LedgerBLL.balance(service_id, account, as_of)
+    if balance is None:
+        return JsonResponse({"success": False, "message": "Ledger not available."}, status=503)
+
+    data = {"success": True, "account": account, "as_of": as_of, "balance": str(balance)}
+    if from_date:
+        movement = LedgerBLL.movement(service_id, account, from_date, as_of)
+        data["from_date"] = from_date
+        data["movement"] = str(movement) if movement is not None else None
+    return JsonResponse(data)
+
+
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
 def get_transaction_lookup_ajax(request):
     """Generic lookup for transaction accounts, categories, etc."""
     lookup_type = request.GET.get("type")
     search_term = request.GET.get("q", "")
-    results = TransactionBLL.get_lookup_data(lookup_type, search_term)
-    return JsonResponse({"results": results})
+    page = request.GET.get("page", 1)
+    data = TransactionBLL.get_lookup_data(lookup_type, search_term, page)
+    return JsonResponse({"results": data["results"], "pagination": {"more": data["more"]}})
+
+
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_VIEW)
+def get_lookup_bootstrap_ajax(request):
+    """
+    Form bootstrap: first page of several lookups in one request.
+    ?types=voucher_types,accounts,departments -> {"lookups": {type: {results, pagination}}}
+    """
+    lookup_types = request.GET.get("types", "").split(",")
+    data = TransactionBLL.get_lookup_bootstrap(lookup_types)
+    return JsonResponse(
+        {
+            "lookups": {
+                lookup_type: {"results": page["results"], "pagination": {"more": page["more"]}}
+                for lookup_type, page in data.items()
+            }
+        }
+    )
 
 
 # --- CRUD Operations ---
 
 
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_CREATE)
 def add_cash_entry_view(request):
     """
     AJAX view to create a new cash transaction.
     Mapping frontend data exactly to SP/BLL parameter names.
     """
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -111,19 +238,19 @@ def add_cash_entry_view(request):
             result = TransactionBLL.create_cash_entry(**params)
             return JsonResponse(result)
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- VIEW ERROR (Add Cash): {traceback.format_exc()} ---")
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_EDIT)
 def update_transaction_view(request):
     """
     AJAX view to update an existing transaction.
     Mapping frontend data exactly to SP/BLL parameter names.
     """
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -148,22 +275,23 @@ def update_transaction_view(request):
                 "inyscode": data.get("inyscode"),  # @pINYSCODE
                 "intrvrsn": data.get("intrvrsn"),  # @pINTRVRSN
                 "vctrchqd": data.get("vctrchqd", ""),  # @pVCTRCHQD
+                "orig_dttrdate": data.get("orig_dttrdate"),  # SP param nahi - cache invalidation ke liye
             }
 
             # BLL method call with exact keys
             result = TransactionBLL.update_existing_transaction(**params)
             return JsonResponse(result)
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- VIEW ERROR (Update Transaction): {traceback.format_exc()} ---")
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.CASH_BOOK, PermissionType.CAN_DELETE)
 def delete_transaction_view(request):
     """AJAX view to delete/cancel a transaction."""
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -172,7 +300,10 @@ def delete_transaction_view(request):
                 data.get("trans_id"),
                 data.get("version_hex"),
                 request.session.get("user_id"),
+                trans_date=data.get("trans_date"),
             )
             return JsonResponse(result)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
@@ -0,0 +1,176 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseForbidden, JsonResponse
+from django.shortcuts import redirect
+
+from core_app.layers.constants import PermissionFlag, PermissionType
+from core_app.modules.users.user_dal import UserDAL
+
+
+class PermissionBLL:
+    """
+    Permission index: {VCMDKKEY: PermissionFlag bitmask} built from sp_Get_User_Rights_Matrix.
+
+    - per session: loaded at login, reused until the user's rights version changes
+      (with SESSION_LEAN only the version is in the session, the index stays in cache)
+    - per request: read from the session once and kept on the request object
+    - across sessions: Django cache, keyed by user AND that user's rights version;
+      saving rights bumps the version so old entries are never read again
+    """
+
+    REQUEST_ATTR = "_permission_index"
+    SESSION_INDEX = "perm_index"
+    SESSION_VERSION = "perm_version"
+
+    # Rights matrix ke columns aur unke flags
+    RIGHT_COLUMNS = (
+        ("btcanview", PermissionFlag.VIEW),
+        ("btcancreate", PermissionFlag.CREATE),
+        ("btcanedit", PermissionFlag.EDIT),
+        ("btcandelete", PermissionFlag.DELETE),
+    )
+
+    @staticmethod
+    def build_index(rights_rows):
+        index = {}
+        for row in rights_rows:
+            key = row.get("vcmdkkey")
+            if not key:
+                continue
+            mask = 0
+            for column, flag in PermissionBLL.RIGHT_COLUMNS:
+                if row.get(column) == 1:
+                    mask |= flag
+            key = str(key).upper()
+            index[key] = int(index.get(key, 0) | mask)  # plain int - session is JSON
+        return index
+
+    @staticmethod
+    def get_rights_version(user_id):
+        """Current rights version of a user (created on first use)."""
+        version_key = f"perm_ver:{user_id}"
+        version = cache.get(version_key)
+        if version is None:
+            # Time-based start so an evicted counter never reuses an old version
+            version = time.time_ns()
+            if not cache.add(version_key, version, None):
+                version = cache.get(version_key, version)
+        return version
+
+    @staticmethod
+    def invalidate_user(user_id):
+        """Call after a user's rights are committed: every cached index for them goes stale."""
+        cache.set(f"perm_ver:{user_id}", time.time_ns(), None)
+
+    @staticmethod
+    def get_index(user_id, version=None):
+        """Permission index for user_id from the cross-request cache (loads on a miss)."""
+        if version is None:
+            version = PermissionBLL.get_rights_version(user_id)
+        cache_key = f"perm_idx:{user_id}:{version}"
+        index = cache.get(cache_key)
+        if index is None:
+            index = PermissionBLL.build_index(UserDAL.get_user_rights_matrix(user_id))
+            # Khali index cache nahi karte - SP error bhi [] deta hai
+            if index:
+                cache.set(cache_key, index, getattr(settings, "PERMISSION_CACHE_TTL", 300))
+        return index
+
+    @staticmethod
+    def lean_session():
+        return getattr(settings, "SESSION_LEAN", False)
+
+    @staticmethod
+    def load_into_session(request, user_id):
+        """Called at login (and on a version change): index + version into the session."""
+        version = PermissionBLL.get_rights_version(user_id)
+        index = PermissionBLL.get_index(user_id, version)
+        if PermissionBLL.lean_session():
+            # Index cache mein garam ho gaya - session mein sirf version
+            request.session.pop(PermissionBLL.SESSION_INDEX, None)
+            request.session[PermissionBLL.SESSION_VERSION] = version
+        elif index:
+            request.session[PermissionBLL.SESSION_INDEX] = index
+            request.session[PermissionBLL.SESSION_VERSION] = version
+        else:
+            # Khali index session mein nahi rakhte - agli request dobara try karegi
+            request.session.pop(PermissionBLL.SESSION_INDEX, None)
+            request.session.pop(PermissionBLL.SESSION_VERSION, None)
+        return index
+
+    @staticmethod
+    def get_session_index(request):
+        """Session copy of the index; reloaded only when the rights version moved."""
+        user_id = request.session.get("user_id")
+        if not user_id:
+            return {}
+        if PermissionBLL.lean_session():
+            return PermissionBLL.get_index(user_id)
+        index = request.session.get(PermissionBLL.SESSION_INDEX)
+        if index is None or request.session.get(
+            PermissionBLL.SESSION_VERSION
+        ) != PermissionBLL.get_rights_version(user_id):
+            index = PermissionBLL.load_into_session(request, user_id)
+        return index
+
+    @staticmethod
+    def get_request_index(request):
+        """Same index, memoized on the request so ten checks on a page cost one lookup."""
+        index = getattr(request, PermissionBLL.REQUEST_ATTR, None)
+        if index is None:
+            index = PermissionBLL.get_session_index(request)
+            setattr(request, PermissionBLL.REQUEST_ATTR, index)
+        return index
+
+    @staticmethod
+    def has_permission(request, module_key, right):
+        flag = PermissionFlag.of(right)
+        if not flag or not module_key:
+            return False
+        mask = PermissionBLL.get_request_index(request).get(str(module_key).upper(), 0)
+        return mask & flag == flag
+
+
+def _wants_json(request):
+    return request.headers.get("x-requested-with") == "XMLHttpRequest" or request.method != "GET"
+
+
+def requires(module_key, right=PermissionType.CAN_VIEW):
+    """
+    View decorator: session login check + module right from the session bitmask.
+
+        @requires(ModuleKey.CASH_BOOK, PermissionType.CAN_EDIT)
+        def update_transaction_view(request): ...
+
+    AJAX/POST callers get JSON 401/403, page loads a login redirect / 403 page.
+    """
+    flag = PermissionFlag.of(right)
+    if not flag:
+        raise ValueError(f"Unknown permission: {right!r}")
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if not request.session.get("user_id"):
+                if _wants_json(request):
+                    return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
+                return redirect("core_app:login")
+
+            if not (
+                request.session.get("is_superuser")
+                or PermissionBLL.has_permission(request, module_key, flag)
+            ):
+                if _wants_json(request):
+                    return JsonResponse(
+                        {"success": False, "message": "Permission denied"}, status=403
+                    )
+                return HttpResponseForbidden("Permission denied")
+
+            return view_func(request, *args, **kwargs)
+
+        return _wrapped
+
+    return decorator
@@ -1,4 +1,5 @@
 from core_app.modules.users.user_dal import UserDAL
+from core_app.layers.error_handler import DatabaseUnavailableError
 
 
 class UserBLL:
@@ -8,21 +9,25 @@ class UserBLL:
     """
 
     @staticmethod
-    def get_lookup_data(lookup_type, search_term=""):
+    def get_lookup_data(lookup_type, search_term="", page=1):
         """
         Generic method to fetch lookup data (like Services, Status, etc.)
-        This was missing and causing the AttributeError.
+        Returns one select2 page: {"results": [...], "more": bool}
         """
         try:
-            return UserDAL.get_lookup_data(lookup_type, search_term)
+            return UserDAL.get_lookup_data(lookup_type, search_term, page)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Lookup): {str(e)} ---")
-            return []
+            return {"results": [], "more": False}
 
     @staticmethod
     def get_user_list(service_id):
         try:
             return UserDAL.get_users_list_by_service(service_id)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (User List): {str(e)} ---")
             return []
@@ -37,6 +42,8 @@ class UserBLL:
             return UserDAL.insert_user(
                 service_id, username, full_name, password, status_id, created_by
             )
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Create User): {str(e)} ---")
             return {"status": "error", "message": f"BLL Create Error: {str(e)}"}
@@ -63,6 +70,8 @@ class UserBLL:
                 version_hex,
                 changed_by,
             )
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Update User): {str(e)} ---")
             return {"status": "error", "message": f"BLL Update Error: {str(e)}"}
@@ -71,6 +80,8 @@ class UserBLL:
     def delete_existing_user(service_id, user_id, version_hex, requested_by):
         try:
             return UserDAL.delete_user(service_id, user_id, version_hex, requested_by)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Delete User): {str(e)} ---")
             return {"status": "error", "message": f"BLL Delete Error: {str(e)}"}
@@ -80,6 +91,8 @@ class UserBLL:
         """Fetches the complete menu-rights grid for a user."""
         try:
             return UserDAL.get_user_rights_matrix(user_id)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Get Rights Matrix): {str(e)} ---")
             return []
@@ -88,30 +101,40 @@ class UserBLL:
     def save_all_user_rights(user_id, rights_list):
         """
         Bulk save logic for user rights.
-        Iterates through the list and calls DAL for each row.
+        Poora matrix ek hi round trip mein DAL ko jata hai (all-or-nothing).
         """
         try:
             if not user_id or not isinstance(rights_list, list):
                 return {"success": False, "message": "Invalid data format."}
 
-            for right in rights_list:
-                # Syncing keys with frontend/JS: rightid, menuid, canview, etc.
-                success = UserDAL.save_single_user_right(
-                    right_id=int(right.get("rightid") or 0),
-                    user_id=int(user_id),
-                    menu_id=int(right.get("menuid")),
-                    can_view=1 if right.get("canview") else 0,
-                    can_create=1 if right.get("cancreate") else 0,
-                    can_edit=1 if right.get("canedit") else 0,
-                    can_delete=1 if right.get("candelete") else 0,
+            # Syncing keys with frontend/JS: rightid, menuid, canview, etc.
+            rows = [
+                (
+                    int(right.get("rightid") or 0),
+                    int(right.get("menuid")),
+                    1 if right.get("canview") else 0,
+                    1 if right.get("cancreate") else 0,
+                    1 if right.get("canedit") else 0,
+                    1 if right.get("candelete") else 0,
+                )
+                for right in rights_list
+            ]
+
+            statuses = UserDAL.save_user_rights_bulk(int(user_id), rows)
+
+            failed_menus = [
+                row[1] for row, st in zip(rows, statuses) if st["status"] == "error"
+            ]
+            if failed_menus:
+                raise Exception(
+                    f"Failed to save right for MenuID(s): "
+                    f"{', '.join(str(m) for m in failed_menus)}"
                 )
-                if not success:
-                    raise Exception(
-                        f"Failed to save right for MenuID: {right.get('menuid')}"
-                    )
 
             return {"success": True, "message": "User rights updated successfully!"}
 
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             print(f"--- BLL ERROR (Save All Rights): {str(e)} ---")
             return {"success": False, "message": f"BLL Save Error: {str(e)}"}
@@ -1,4 +1,15 @@
 from core_app.layers.base_dal import BaseDAL
+from core_app.layers.lookup_service import LookupService
+from core_app.layers.sp_registry import SPRegistry, INT
+
+# --- SP catalogue (typed binding for reads, kind for writes) ---
+SPRegistry.register("sp_Users_GetList", [INT])
+# Permissions must reflect a rights save immediately - never from the replica
+SPRegistry.register("sp_Get_User_Rights_Matrix", [INT], primary_only=True)
+SPRegistry.register("sp_Users_Insert", kind="write")
+SPRegistry.register("sp_Users_Update", kind="write")
+SPRegistry.register("sp_Users_Delete", kind="write")
+SPRegistry.register("sp_Save_User_Right", kind="write")
 
 
 class UserDAL(BaseDAL):
@@ -73,31 +84,19 @@ class UserDAL(BaseDAL):
         return BaseDAL.execute_sp("sp_Get_User_Rights_Matrix", [user_id])
 
     @staticmethod
-    def save_single_user_right(
-        right_id, user_id, menu_id, can_view, can_create, can_edit, can_delete
-    ):
-        """Inserts or updates a single permission row."""
-        try:
-            params = (
-                right_id,
-                user_id,
-                menu_id,
-                can_view,
-                can_create,
-                can_edit,
-                can_delete,
-            )
-            BaseDAL.execute_sp("sp_Save_User_Right", params)
-            return True
-        except Exception as e:
-            print(f"DAL Save Right Error: {str(e)}")
-            return False
+    def save_user_rights_bulk(user_id, rights_rows):
+        """
+        Saves the whole rights matrix in one round trip via BaseDAL.execute_bulk.
+        rights_rows: (right_id, menu_id, can_view, can_create, can_edit, can_delete) tuples.
+        Returns one {status, message} per row; nothing is committed if any row fails.
+        """
+        param_rows = [
+            (right_id, user_id, menu_id, can_view, can_create, can_edit, can_delete)
+            for right_id, menu_id, can_view, can_create, can_edit, can_delete in rights_rows
+        ]
+        return BaseDAL.execute_bulk("sp_Save_User_Right", param_rows)
 
     @staticmethod
-    def get_lookup_data(lookup_type, search_term=None):
-        """Common lookup for user-related dropdowns (Roles, Groups etc)."""
-        raw_data = BaseDAL.execute_sp("sp_Common_GetLookup", [lookup_type, search_term])
-        return [
-            {"id": str(row.get("id", "")), "text": str(row.get("text", "No Name"))}
-            for row in raw_data
-        ]
+    def get_lookup_data(lookup_type, search_term=None, page=1):
+        """Common lookup for user-related dropdowns (Roles, Groups etc) - one select2 page."""
+        return LookupService.search(lookup_type, search_term, page)
@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.cache import never_cache
@@ -8,7 +8,10 @@ import traceback
 
 # Naye Modular Imports
 from core_app.modules.users.user_bll import UserBLL
+from core_app.modules.users.permission_bll import PermissionBLL, requires
 from core_app.layers.base_dal import BaseDAL
+from core_app.layers.error_handler import DatabaseUnavailableError
+from core_app.layers.constants import ModuleKey, PermissionType
 
 
 def is_ajax(request):
@@ -16,20 +19,16 @@ def is_ajax(request):
 
 
 @never_cache
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_VIEW)
 def user_list_view(request):
-    if not request.session.get("user_id"):
-        if is_ajax(request):
-            return JsonResponse(
-                {"success": False, "message": "Session Expired"}, status=401
-            )
-        return redirect("core_app:login")
-
     service_id = request.session.get("current_service_id")
     is_ajax_req = is_ajax(request)
     base_template = "core_app/blank.html" if is_ajax_req else "core_app/base.html"
 
     try:
         users_data = UserBLL.get_user_list(service_id)
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         users_data = []
 
@@ -43,17 +42,17 @@ def user_list_view(request):
 def get_lookup_ajax(request):
     lookup_type = request.GET.get("type")
     search_term = request.GET.get("q", "")
-    # BaseDAL ya UserDAL se lookup data lena
-    results = UserBLL.get_lookup_data(lookup_type, search_term)
-    return JsonResponse({"results": results})
+    page = request.GET.get("page", 1)
+    # In-memory LookupService se select2 ka ek page
+    data = UserBLL.get_lookup_data(lookup_type, search_term, page)
+    return JsonResponse({"results": data["results"], "pagination": {"more": data["more"]}})
 
 
 # --- CRUD Operations ---
 
 
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_CREATE)
 def add_user_view(request):
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -66,13 +65,14 @@ def add_user_view(request):
                 request.session.get("user_id"),
             )
             return JsonResponse(result)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_EDIT)
 def update_user_view(request):
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -87,13 +87,14 @@ def update_user_view(request):
                 request.session.get("user_id"),
             )
             return JsonResponse(result)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_DELETE)
 def delete_user_view(request):
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
     if request.method == "POST":
         try:
             data = json.loads(request.body)
@@ -104,6 +105,8 @@ def delete_user_view(request):
                 request.session.get("user_id"),
             )
             return JsonResponse(result)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
@@ -111,10 +114,8 @@ def delete_user_view(request):
 # --- User Rights Views ---
 
 
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_VIEW)
 def get_user_rights_matrix_ajax(request):
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     user_id = request.GET.get("user_id")
     if not user_id:
         return JsonResponse(
@@ -128,16 +129,16 @@ def get_user_rights_matrix_ajax(request):
             "core_app/users/_rights_matrix_partial.html",
             {"rights": rights_data},
         )
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         return JsonResponse(
             {"success": False, "message": "Failed to load matrix"}, status=500
         )
 
 
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_EDIT)
 def save_user_rights_ajax(request):
-    if not request.session.get("user_id"):
-        return JsonResponse({"success": False, "message": "Unauthorized"}, status=401)
-
     if request.method == "POST":
         try:
             data = json.loads(request.body.decode("utf-8"))
@@ -149,16 +150,19 @@ def save_user_rights_ajax(request):
                 )
 
             result = UserBLL.save_all_user_rights(int(user_id), data.get("rights", []))
+            if result.get("success"):
+                # Rights commit ho gaye - is user ka cached permission index purana
+                PermissionBLL.invalidate_user(int(user_id))
             return JsonResponse(result)
+        except DatabaseUnavailableError:
+            raise
         except Exception as e:
             return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
 @never_cache
+@requires(ModuleKey.USER_MGMT, PermissionType.CAN_VIEW)
 def user_rights_view(request):
-    if not request.session.get("user_id"):
-        return redirect("core_app:login")
-
     is_ajax_req = is_ajax(request)
     base_template = "core_app/blank.html" if is_ajax_req else "core_app/base.html"
     return render(
@@ -1,5 +1,5 @@
 from django import template
-from core_app.modules.users.user_dal import UserDAL
+from core_app.modules.users.permission_bll import PermissionBLL
 
 register = template.Library()
 
@@ -20,15 +20,5 @@ def check_permission(context, module_key, right_type):
     if request.session.get('is_superuser'):
         return True
 
-    # Rights fetch karein
-    rights = UserDAL.get_user_rights_matrix(user_id)
-    
-    for r in rights:
-        # Aapki SP 'vcmdkkey' return karti hai (e.g. 'CASH_BOOK', 'USER_MGMT')
-        if r.get('vcmdkkey') == module_key.upper():
-            if right_type == 'view':   return r.get('btcanview') == 1
-            if right_type == 'add':    return r.get('btcancreate') == 1
-            if right_type == 'edit':   return r.get('btcanedit') == 1
-            if right_type == 'delete': return r.get('btcandelete') == 1
-            
-    return False
\ No newline at end of file
+    # Per-request index (cached across requests per user + rights version)
+    return PermissionBLL.has_permission(request, module_key, right_type)
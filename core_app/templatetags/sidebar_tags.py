@@ -0,0 +1,65 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core_app.layers.sidebar_bll import SecurityBLL
+from core_app.modules.users.permission_bll import PermissionBLL
+
+register = template.Library()
+
+SIDEBAR_TEMPLATES = {
+    "modules": "core_app/includes/sidebar_modules.html",
+    "menus": "core_app/includes/sidebar_menus.html",
+}
+
+
+def get_sidebar_fragments(request):
+    """
+    Rendered sidebar parts {"modules": html, "menus": html} for the logged-in user.
+    Cached per user + rights version, so a full page render is one cache read.
+    """
+    fragments = getattr(request, "_sidebar_html", None)
+    if fragments is not None:
+        return fragments
+
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return {}
+
+    version = PermissionBLL.get_rights_version(user_id)
+    cache_key = f"sidebar_html:{user_id}:{version}"
+    fragments = cache.get(cache_key)
+    if fragments is None:
+        tree = request.session.get("sidebar_data") or {}
+        if PermissionBLL.lean_session():
+            # Lean session: tree session mein nahi - sirf yeh rendered cache entry
+            tree = SecurityBLL.fetch_authorized_sidebar(user_id)
+        elif request.session.get("sidebar_version") != version:
+            # Rights badal gaye (ya purana session) - menu tree dobara lao
+            tree = SecurityBLL.fetch_authorized_sidebar(user_id)
+            request.session["sidebar_data"] = tree
+            if tree:
+                request.session["sidebar_version"] = version
+
+        fragments = {
+            part: render_to_string(template_name, {"sidebar": tree})
+            for part, template_name in SIDEBAR_TEMPLATES.items()
+        }
+        if tree:
+            cache.set(cache_key, fragments, getattr(settings, "SIDEBAR_CACHE_TTL", 600))
+
+    request._sidebar_html = fragments
+    return fragments
+
+
+@register.simple_tag(takes_context=True)
+def sidebar_html(context, part):
+    """
+    Usage: {% sidebar_html "modules" %} / {% sidebar_html "menus" %}
+    """
+    request = context.get("request")
+    if not request:
+        return ""
+    return mark_safe(get_sidebar_fragments(request).get(part, ""))
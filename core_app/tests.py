@@ -1,3 +1,1236 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import pickle
+import threading
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.backends.signed_cookies import SessionStore as SignedCookieSession
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core_app.layers.base_dal import BaseDAL, pyodbc
+from core_app.layers.circuit_breaker import CircuitBreaker
+from core_app.layers.connection_pool import ConnectionPool
+from core_app.layers.constants import ModuleKey, PermissionType
+from core_app.layers.datatables import DataTablesAdapter, DataTablesRequest
+from core_app.layers.error_handler import DatabaseUnavailableError, PoolExhaustedError
+from core_app.layers.exports import StreamingExport
+from core_app.layers.ledger_index import FenwickTree, LedgerIndex, LedgerIndexRegistry
+from core_app.layers.lookup_service import LookupIndex, LookupService
+from core_app.layers.month_segments import MonthSegmentCache
+from core_app.layers.result_cache import ResultCache
+from core_app.layers.row import Row, RowJSONEncoder, RowSchema
+from core_app.layers.sidebar_bll import SecurityBLL
+from core_app.layers.single_flight import SingleFlight
+from core_app.layers.sp_metrics import SPMetrics
+from core_app.layers.sp_registry import SPRegistry
+from core_app.middleware import SessionRefreshMiddleware
+from core_app.modules.transaction import transaction_views
+from core_app.modules.transaction.balance_snapshot_bll import BalanceSnapshotBLL
+from core_app.modules.transaction.transaction_bll import TransactionBLL
+from core_app.modules.transaction.transaction_dal import TransactionDAL
+from core_app.modules.users.permission_bll import PermissionBLL, requires
+from core_app.modules.users.user_dal import UserDAL
+from core_app.templatetags.sidebar_tags import get_sidebar_fragments
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_rejects(self):
+        breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(DatabaseUnavailableError):
+            breaker.before_call()
+        self.assertEqual(breaker.stats()["rejected"], 1)
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10)
+        with mock.patch("core_app.layers.circuit_breaker.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        with mock.patch("core_app.layers.circuit_breaker.time.monotonic", return_value=111.0):
+            breaker.before_call()  # probe
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            with self.assertRaises(DatabaseUnavailableError):
+                breaker.before_call()  # second caller while the probe runs
+
+    def test_probe_success_closes_and_failure_reopens(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10)
+        with mock.patch("core_app.layers.circuit_breaker.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        with mock.patch("core_app.layers.circuit_breaker.time.monotonic", return_value=111.0):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()["trips"], 2)
+
+        with mock.patch("core_app.layers.circuit_breaker.time.monotonic", return_value=122.0):
+            breaker.before_call()
+            breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_pool_exhaustion_does_not_trip_breaker(self):
+        breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=60)
+        pool = mock.Mock()
+        pool.acquire.side_effect = PoolExhaustedError("pool full")
+        with mock.patch.object(BaseDAL, "get_breaker", return_value=breaker), mock.patch.object(
+            BaseDAL, "get_pool", return_value=pool
+        ):
+            for _ in range(3):
+                with self.assertRaises(DatabaseUnavailableError):
+                    BaseDAL.checkout(BaseDAL.PRIMARY)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("core_app.layers.connection_pool.pyodbc.connect", side_effect=lambda s: mock.Mock())
+        self.connect = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_released_connection_is_reused(self):
+        pool = ConnectionPool("dsn", min_size=0, max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual((pool.stats()["misses"], pool.stats()["hits"]), (1, 1))
+
+    def test_full_pool_raises_after_checkout_timeout(self):
+        pool = ConnectionPool("dsn", min_size=0, max_size=1, checkout_timeout=0)
+        pool.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            pool.acquire()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_dead_idle_connection_is_replaced(self):
+        pool = ConnectionPool("dsn", min_size=0, max_size=2, validate_after=0)
+        dead = pool.acquire()
+        pool.release(dead)
+        dead.cursor.side_effect = Exception("connection reset")
+
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, dead)
+        dead.close.assert_called_once()
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+    def test_release_rolls_back_open_transaction(self):
+        pool = ConnectionPool("dsn", min_size=0, max_size=1)
+        conn = pool.acquire()
+        conn.autocommit = False
+        pool.release(conn)
+        conn.rollback.assert_called_once()
+        self.assertTrue(conn.autocommit)
+
+    def test_warm_up_opens_min_size(self):
+        pool = ConnectionPool("dsn", min_size=2, max_size=5)
+        pool.warm_up()
+        self.assertEqual((pool.stats()["size"], pool.stats()["idle"]), (2, 2))
+
+
+class FakeCursor:
+    """pyodbc cursor stand-in: result_sets = [(columns or None for a rowcount-only set, rows)]."""
+
+    def __init__(self, result_sets, fail_on_fetch=None):
+        self.result_sets = list(result_sets)
+        self.fail_on_fetch = fail_on_fetch
+        self.current = 0
+        self.offset = 0
+        self.fetches = 0
+        self.executed = []
+        self.closed = False
+
+    @property
+    def description(self):
+        if self.current >= len(self.result_sets) or self.result_sets[self.current][0] is None:
+            return None
+        return [(name,) for name in self.result_sets[self.current][0]]
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, tuple(params)))
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        if self.fail_on_fetch is not None and self.fetches >= self.fail_on_fetch:
+            raise RuntimeError("fetch failed")
+        rows = self.result_sets[self.current][1][self.offset : self.offset + size]
+        self.offset += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.result_sets[self.current][1][self.offset :]
+        self.offset += len(rows)
+        return rows
+
+    def nextset(self):
+        self.current += 1
+        self.offset = 0
+        return self.current < len(self.result_sets)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnectionMixin:
+    """Routes BaseDAL.get_connection / release_connection to one mock connection."""
+
+    def use_cursor(self, cursor):
+        self.conn = mock.Mock()
+        self.conn.cursor.return_value = cursor
+        for name, value in (("get_connection", self.conn), ("release_connection", None)):
+            patcher = mock.patch.object(BaseDAL, name, return_value=value)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        return cursor
+
+
+class IterSpTests(FakeConnectionMixin, SimpleTestCase):
+    def test_streams_rows_in_batches_and_releases(self):
+        cursor = self.use_cursor(
+            FakeCursor([(None, []), (["InTrCode", "VcName"], [(i, f"n{i}") for i in range(5)])])
+        )
+        rows = list(BaseDAL.iter_sp("sp_Test_Stream", [1], batch_size=2))
+
+        self.assertEqual([row["intrcode"] for row in rows], [0, 1, 2, 3, 4])
+        self.assertEqual(rows[4].vcname, "n4")
+        self.assertEqual(cursor.fetches, 4)  # 2 + 2 + 1 + empty
+        self.assertTrue(cursor.closed)
+        self.release_connection.assert_called_once_with(self.conn, discard=False)
+
+    def test_closing_early_returns_the_connection(self):
+        cursor = self.use_cursor(FakeCursor([(["id"], [(i,) for i in range(10)])]))
+        stream = BaseDAL.iter_sp("sp_Test_Stream", batch_size=3)
+        next(stream)
+        self.release_connection.assert_not_called()
+        stream.close()
+        self.assertTrue(cursor.closed)
+        self.release_connection.assert_called_once_with(self.conn, discard=False)
+
+    def test_errors_are_raised_not_swallowed(self):
+        self.use_cursor(FakeCursor([(["id"], [(1,), (2,), (3,)])], fail_on_fetch=2))
+        stream = BaseDAL.iter_sp("sp_Test_Stream", batch_size=1)
+        self.assertEqual(next(stream)["id"], 1)
+        with mock.patch("builtins.print"), self.assertRaises(RuntimeError):
+            next(stream)
+        self.release_connection.assert_called_once()
+
+
+class MultiResultSetTests(FakeConnectionMixin, SimpleTestCase):
+    def test_every_select_is_returned_in_order(self):
+        self.use_cursor(
+            FakeCursor(
+                [
+                    (["OpeningBalance"], [(100,)]),
+                    (None, []),  # rowcount-only set (UPDATE/INSERT inside the SP)
+                    (["VcAcName", "TotalReceipt"], [("Fees", 5), ("Rent", 7)]),
+                    (["GrandTotal"], []),  # empty SELECT keeps its position
+                ]
+            )
+        )
+        result_sets = BaseDAL.execute_sp_multi("sp_Test_Report", [1])
+
+        self.assertEqual(len(result_sets), 3)
+        self.assertEqual(result_sets[0][0]["openingbalance"], 100)
+        self.assertEqual([row["vcacname"] for row in result_sets[1]], ["Fees", "Rent"])
+        self.assertEqual(result_sets[2], [])
+        self.release_connection.assert_called_once_with(self.conn, discard=False)
+
+    def test_failure_returns_empty_list_outside_a_unit_of_work(self):
+        cursor = self.use_cursor(FakeCursor([]))
+        cursor.execute = mock.Mock(side_effect=RuntimeError("bad call"))
+        with mock.patch("builtins.print"):
+            self.assertEqual(BaseDAL.execute_sp_multi("sp_Test_Report"), [])
+
+
+class ExecuteBulkTests(FakeConnectionMixin, SimpleTestCase):
+    def bulk_cursor(self, bad_row=None):
+        """executemany fails whenever bad_row is in the batch; execute fails only for bad_row."""
+        cursor = self.use_cursor(FakeCursor([]))
+
+        def executemany(sql, rows):
+            if bad_row in rows:
+                raise pyodbc.ProgrammingError("batch failed")
+
+        def execute(sql, params=()):
+            if tuple(params) == bad_row:
+                raise pyodbc.ProgrammingError("row failed")
+            cursor.executed.append((sql, tuple(params)))
+
+        cursor.executemany = executemany
+        cursor.execute = execute
+        return cursor
+
+    def test_batch_success_commits_once(self):
+        self.bulk_cursor()
+        statuses = BaseDAL.execute_bulk("sp_Test_Save", [(1, "a"), (2, "b")])
+
+        self.assertEqual([st["status"] for st in statuses], ["success", "success"])
+        self.conn.commit.assert_called_once()
+        self.conn.rollback.assert_not_called()
+
+    def test_atomic_failure_rolls_back_every_row(self):
+        self.bulk_cursor(bad_row=(2, "b"))
+        with mock.patch("builtins.print"):
+            statuses = BaseDAL.execute_bulk("sp_Test_Save", [(1, "a"), (2, "b"), (3, "c")])
+
+        self.assertEqual([st["status"] for st in statuses], ["rolled_back", "error", "rolled_back"])
+        self.assertEqual(statuses[1]["message"], "row failed")
+        self.conn.commit.assert_not_called()
+        self.assertEqual(self.conn.rollback.call_count, 2)  # batch + replay
+
+    def test_non_atomic_failure_commits_the_good_rows(self):
+        cursor = self.bulk_cursor(bad_row=(2, "b"))
+        with mock.patch("builtins.print"):
+            statuses = BaseDAL.execute_bulk("sp_Test_Save", [(1, "a"), (2, "b"), (3, "c")], atomic=False)
+
+        self.assertEqual([st["status"] for st in statuses], ["success", "error", "success"])
+        self.assertEqual([params for _, params in cursor.executed], [(1, "a"), (3, "c")])
+        self.conn.commit.assert_called_once()
+
+    def test_empty_input_never_opens_a_connection(self):
+        self.use_cursor(FakeCursor([]))
+        self.assertEqual(BaseDAL.execute_bulk("sp_Test_Save", []), [])
+        self.get_connection.assert_not_called()
+
+
+class UnitOfWorkTests(FakeConnectionMixin, SimpleTestCase):
+    def setUp(self):
+        SPRegistry.register("sp_Test_Uow_Save", kind="write", invalidates=["uow:{0}"])
+        self.cursor = self.use_cursor(FakeCursor([]))
+
+    def test_commits_and_invalidates_after_the_block(self):
+        with mock.patch.object(ResultCache, "invalidate") as invalidate:
+            with BaseDAL.unit_of_work():
+                BaseDAL.execute_non_query("sp_Test_Uow_Save", [7])
+                invalidate.assert_not_called()  # deferred until commit
+
+        self.conn.commit.assert_called_once()
+        invalidate.assert_called_once_with({"uow:7"})
+        self.assertFalse(BaseDAL.in_unit_of_work())
+        self.release_connection.assert_called_with(self.conn, discard=False)
+
+    def test_failed_step_rolls_back_and_raises(self):
+        self.cursor.execute = mock.Mock(side_effect=RuntimeError("bad call"))
+        with mock.patch("builtins.print"), self.assertRaises(RuntimeError):
+            with BaseDAL.unit_of_work():
+                BaseDAL.execute_non_query("sp_Test_Uow_Save", [7])
+
+        self.conn.rollback.assert_called_once()
+        self.conn.commit.assert_not_called()
+        self.release_connection.assert_called_with(self.conn, discard=False)
+
+    def test_link_failure_discards_the_connection(self):
+        with self.assertRaises(pyodbc.OperationalError):
+            with BaseDAL.unit_of_work():
+                raise pyodbc.OperationalError("link down")
+
+        self.release_connection.assert_called_once_with(self.conn, discard=True)
+
+    def test_nested_blocks_join_the_outer_transaction(self):
+        with BaseDAL.unit_of_work() as outer:
+            with BaseDAL.unit_of_work() as inner:
+                self.assertIs(inner, outer)
+            self.conn.commit.assert_not_called()
+
+        self.get_connection.assert_called_once()
+        self.conn.commit.assert_called_once()
+
+
+class OutputBatchTests(FakeConnectionMixin, SimpleTestCase):
+    def test_batch_declares_runs_and_selects_the_outputs(self):
+        sql = BaseDAL.build_output_batch("sp_Test_Out", 2, ["INT", "NVARCHAR(50)"])
+        self.assertEqual(
+            sql,
+            "SET NOCOUNT ON; "
+            "DECLARE @o0 INT, @o1 NVARCHAR(50); "
+            "EXEC sp_Test_Out ?, ?, @o0 OUTPUT, @o1 OUTPUT; "
+            "SELECT @o0 AS o0, @o1 AS o1;",
+        )
+
+    def test_rejects_anything_but_a_type_name(self):
+        with self.assertRaises(ValueError):
+            BaseDAL.build_output_batch("sp_Test_Out", 0, ["INT; DROP TABLE Users"])
+
+    def test_outputs_come_from_the_last_select(self):
+        cursor = self.use_cursor(
+            FakeCursor([(["VcName"], [("Fees",)]), (["o0", "o1"], [(42, "Saved")])])
+        )
+        result = BaseDAL.execute_sp_with_outputs("sp_Test_Out", [1], output_count=2, output_types=["INT"])
+
+        self.assertEqual(result["output_params"], [42, "Saved"])
+        self.assertEqual(result["result_sets"][0][0]["vcname"], "Fees")
+        self.assertIn("DECLARE @o0 INT, @o1 NVARCHAR(4000);", cursor.executed[0][0])
+
+
+class SPMetricsTests(SimpleTestCase):
+    def setUp(self):
+        SPMetrics.reset()
+        self.addCleanup(SPMetrics.reset)
+        SPMetrics.record("sp_Test_A", 0.004, rows=3)
+        SPMetrics.record("sp_Test_A", 0.2, rows=2, conn_wait=0.01)
+        SPMetrics.record("sp_Test_A", 30.0, error=True)
+
+    def samples(self, text):
+        return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+    def test_histogram_buckets_are_cumulative(self):
+        samples = self.samples(SPMetrics.render_prometheus())
+
+        self.assertEqual(samples['erp_sp_duration_seconds_bucket{sp="sp_Test_A",le="0.005"}'], "1")
+        self.assertEqual(samples['erp_sp_duration_seconds_bucket{sp="sp_Test_A",le="0.25"}'], "2")
+        self.assertEqual(samples['erp_sp_duration_seconds_bucket{sp="sp_Test_A",le="10.0"}'], "2")
+        self.assertEqual(samples['erp_sp_duration_seconds_bucket{sp="sp_Test_A",le="+Inf"}'], "3")
+        self.assertEqual(samples['erp_sp_duration_seconds_count{sp="sp_Test_A"}'], "3")
+        self.assertEqual(samples['erp_sp_duration_seconds_sum{sp="sp_Test_A"}'], "30.204000")
+        self.assertEqual(samples['erp_sp_errors_total{sp="sp_Test_A"}'], "1")
+        self.assertEqual(samples['erp_sp_rows_total{sp="sp_Test_A"}'], "5")
+
+    def test_every_family_has_help_and_type_before_its_samples(self):
+        text = SPMetrics.render_prometheus(
+            pool_stats={"idle": 2}, breaker_stats={"state": "open", "rejected": 4, "trips": 1}
+        )
+        self.assertTrue(text.endswith("\n"))
+        declared = set()
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                declared.add(line.split()[2])
+            elif not line.startswith("#"):
+                family = line.split("{")[0].split(" ")[0]
+                for suffix in ("_bucket", "_sum", "_count"):
+                    if family.endswith(suffix) and family[: -len(suffix)] in declared:
+                        family = family[: -len(suffix)]
+                self.assertIn(family, declared)
+
+        samples = self.samples(text)
+        self.assertEqual(samples["erp_db_circuit_open"], "1")
+        self.assertEqual(samples['erp_db_pool{stat="idle"}'], "2")
+
+    def test_optional_sections_are_left_out(self):
+        self.assertNotIn("erp_db_pool", SPMetrics.render_prometheus())
+
+    def test_quantiles_use_bucket_bounds_capped_at_max(self):
+        entry = SPMetrics.snapshot()["sp_Test_A"]
+        self.assertEqual(entry["p50"], 0.25)
+        self.assertEqual(entry["p99"], 30.0)
+
+
+class RowTests(SimpleTestCase):
+    def setUp(self):
+        self.schema = RowSchema.from_description([("InTrCode",), ("VersionId",), ("MnTrAmnt",)])
+        self.row = Row(self.schema, (7, b"\x00\x01", Decimal("12.50")))
+
+    def test_behaves_like_the_old_dict(self):
+        self.assertEqual(self.row["intrcode"], 7)
+        self.assertEqual(self.row.mntramnt, Decimal("12.50"))
+        self.assertIsNone(self.row.get("missing"))
+        self.assertEqual(
+            dict(self.row),
+            {"intrcode": 7, "versionid": b"\x00\x01", "mntramnt": Decimal("12.50"), "version_hex": "0001"},
+        )
+        self.assertEqual({**self.row}["version_hex"], "0001")
+        with self.assertRaises(AttributeError):
+            self.row.nope
+
+    def test_rows_share_one_schema_and_pickle(self):
+        other = Row(self.schema, (8, None, Decimal(1)))
+        self.assertIs(other._schema, self.row._schema)
+        self.assertNotIn("version_hex", other)
+        self.assertEqual(pickle.loads(pickle.dumps(self.row)), self.row)
+
+    def test_json_encoding(self):
+        text = json.dumps({"data": [Row(self.schema, (1, None, Decimal("2.5")))]}, cls=RowJSONEncoder)
+        self.assertEqual(json.loads(text), {"data": [{"intrcode": 1, "versionid": None, "mntramnt": "2.5"}]})
+
+
+class LookupIndexTests(SimpleTestCase):
+    def setUp(self):
+        names = ["Cash in Hand", "Bank Alfalah", "Petty Cash", "Accrued Cashflow", "Rent"]
+        self.index = LookupIndex([{"id": str(i), "text": name} for i, name in enumerate(names)])
+
+    def texts(self, term):
+        return [self.index.items[pos]["text"] for pos in self.index.search(term)]
+
+    def test_ranks_text_start_then_word_start_then_substring(self):
+        self.assertEqual(self.texts("cash"), ["Cash in Hand", "Petty Cash", "Accrued Cashflow"])
+        self.assertEqual(self.texts("ASHF"), ["Accrued Cashflow"])
+
+    def test_short_terms_still_match_substrings(self):
+        self.assertEqual(self.texts("ca"), ["Cash in Hand", "Petty Cash", "Accrued Cashflow"])
+        self.assertEqual(self.texts("nt"), ["Rent"])
+
+    def test_empty_term_returns_everything_in_sp_order(self):
+        self.assertEqual(self.texts("  "), [item["text"] for item in self.index.items])
+
+
+@override_settings(LOOKUP_SERVICE={"refresh_interval": 300, "page_size": 2, "types": ["accounts"]})
+class LookupServiceTests(SimpleTestCase):
+    def setUp(self):
+        LookupService.invalidate()
+        self.addCleanup(LookupService.invalidate)
+        rows = [{"id": i, "text": f"Account {i}"} for i in range(5)]
+        patcher = mock.patch.object(BaseDAL, "execute_sp_multi", return_value=[rows])
+        self.execute_sp_multi = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_loads_the_full_list_with_an_empty_term_once(self):
+        first = LookupService.search("accounts")
+        LookupService.search("accounts", "account 4")
+
+        self.execute_sp_multi.assert_called_once_with("sp_Common_GetLookup", ["accounts", ""])
+        self.assertEqual([item["id"] for item in first["results"]], ["0", "1"])
+        self.assertTrue(first["more"])
+
+    def test_pages_through_matches(self):
+        last = LookupService.search("accounts", "account", page=3)
+        self.assertEqual(last, {"results": [{"id": "4", "text": "Account 4"}], "more": False})
+        self.assertEqual(LookupService.search("accounts", page="x")["results"][0]["id"], "0")
+
+    def test_unknown_type_never_reaches_the_db(self):
+        with mock.patch.object(BaseDAL, "execute_sp_batch") as batch:
+            data = LookupService.search_many(["made_up", "other_made_up"])
+
+        self.assertEqual(data["made_up"], {"results": [], "more": False})
+        batch.assert_not_called()
+        self.execute_sp_multi.assert_not_called()
+        self.assertNotIn("made_up", LookupService._locks)
+
+
+@override_settings(
+    LOOKUP_SERVICE={"refresh_interval": 300, "page_size": 2, "types": ["accounts", "departments"]}
+)
+class LookupBootstrapViewTests(SimpleTestCase):
+    def setUp(self):
+        LookupService.invalidate()
+        self.addCleanup(LookupService.invalidate)
+
+    def get(self, session, types):
+        request = RequestFactory().get(
+            "/transaction/lookup/bootstrap/", {"types": types}, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        request.session = session
+        return transaction_views.get_lookup_bootstrap_ajax(request)
+
+    def test_anonymous_caller_gets_401(self):
+        with mock.patch.object(BaseDAL, "execute_sp_batch") as batch:
+            response = self.get({}, "accounts")
+        self.assertEqual(response.status_code, 401)
+        batch.assert_not_called()
+
+    def test_caller_without_cash_book_right_gets_403(self):
+        with mock.patch.object(PermissionBLL, "has_permission", return_value=False):
+            response = self.get({"user_id": 5}, "accounts")
+        self.assertEqual(response.status_code, 403)
+
+    def test_known_types_load_in_one_batch(self):
+        accounts = [{"id": 1, "text": "Cash"}, {"id": 2, "text": "Bank"}, {"id": 3, "text": "Rent"}]
+        sets = [accounts, [{"id": 9, "text": "Admin"}]]
+        with mock.patch.object(BaseDAL, "execute_sp_batch", return_value=sets) as batch:
+            response = self.get({"user_id": 5, "is_superuser": True}, "accounts, departments,made_up")
+
+        batch.assert_called_once_with("sp_Common_GetLookup", [["accounts", ""], ["departments", ""]])
+        lookups = json.loads(response.content)["lookups"]
+        self.assertEqual([item["text"] for item in lookups["accounts"]["results"]], ["Cash", "Bank"])
+        self.assertTrue(lookups["accounts"]["pagination"]["more"])
+        self.assertEqual(lookups["departments"]["results"], [{"id": "9", "text": "Admin"}])
+        self.assertEqual(lookups["made_up"], {"results": [], "pagination": {"more": False}})
+
+
+class PermissionIndexTests(SimpleTestCase):
+    RIGHTS = [
+        {"vcmdkkey": "cash_book", "btcanview": 1, "btcancreate": 0, "btcanedit": 1, "btcandelete": 0},
+        {"vcmdkkey": "CASH_BOOK", "btcanview": 0, "btcancreate": 1, "btcanedit": 0, "btcandelete": 0},
+        {"vcmdkkey": None, "btcanview": 1},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(UserDAL, "get_user_rights_matrix", return_value=self.RIGHTS)
+        self.rights_matrix = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rows_fold_into_one_mask_per_module(self):
+        self.assertEqual(PermissionBLL.build_index(self.RIGHTS), {"CASH_BOOK": 7})
+
+    def test_index_is_cached_until_the_rights_version_moves(self):
+        PermissionBLL.get_index(5)
+        PermissionBLL.get_index(5)
+        self.assertEqual(self.rights_matrix.call_count, 1)
+
+        PermissionBLL.invalidate_user(5)
+        PermissionBLL.get_index(5)
+        self.assertEqual(self.rights_matrix.call_count, 2)
+
+    def test_empty_index_is_not_cached(self):
+        self.rights_matrix.return_value = []
+        PermissionBLL.get_index(5)
+        PermissionBLL.get_index(5)
+        self.assertEqual(self.rights_matrix.call_count, 2)
+
+    def test_checks_on_one_request_read_the_index_once(self):
+        request = RequestFactory().get("/")
+        request.session = {"user_id": 5}
+        index = {"CASH_BOOK": 5}  # view + edit
+        with mock.patch.object(PermissionBLL, "get_session_index", return_value=index) as load:
+            self.assertTrue(PermissionBLL.has_permission(request, "cash_book", "view"))
+            self.assertTrue(PermissionBLL.has_permission(request, "CASH_BOOK", "edit"))
+            self.assertFalse(PermissionBLL.has_permission(request, "CASH_BOOK", "delete"))
+        load.assert_called_once()
+
+
+class RequiresDecoratorTests(SimpleTestCase):
+    def setUp(self):
+        guard = requires(ModuleKey.CASH_BOOK, PermissionType.CAN_EDIT)
+        self.view = guard(lambda request: HttpResponse("ok"))
+
+    def call(self, session, method="get", ajax=False):
+        headers = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"} if ajax else {}
+        request = getattr(RequestFactory(), method)("/x/", **headers)
+        request.session = session
+        return self.view(request)
+
+    def test_anonymous_page_load_redirects_to_login(self):
+        response = self.call({})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, reverse("core_app:login"))
+
+    def test_anonymous_ajax_or_post_gets_json_401(self):
+        for response in (self.call({}, ajax=True), self.call({}, method="post")):
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(json.loads(response.content)["message"], "Unauthorized")
+
+    def test_missing_right_gets_403(self):
+        session = {"user_id": 5}
+        with mock.patch.object(PermissionBLL, "get_session_index", return_value={"CASH_BOOK": 1}):
+            page = self.call(dict(session))
+            ajax = self.call(dict(session), ajax=True)
+        self.assertEqual((page.status_code, ajax.status_code), (403, 403))
+        self.assertEqual(json.loads(ajax.content)["success"], False)
+
+    def test_granted_right_or_superuser_reaches_the_view(self):
+        with mock.patch.object(PermissionBLL, "get_session_index", return_value={"CASH_BOOK": 5}):
+            self.assertEqual(self.call({"user_id": 5}).content, b"ok")
+        with mock.patch.object(PermissionBLL, "get_session_index") as load:
+            self.assertEqual(self.call({"user_id": 5, "is_superuser": True}).content, b"ok")
+        load.assert_not_called()
+
+    def test_unknown_right_fails_at_import_time(self):
+        with self.assertRaises(ValueError):
+            requires(ModuleKey.CASH_BOOK, "approve")
+
+
+@override_settings(SESSION_LEAN=False)
+class SidebarCacheTests(SimpleTestCase):
+    MENUS = [
+        {"moduleid": 1, "modulename": "Accounts", "menuid": menu_id, "parentmenuid": parent, "menuname": name}
+        for menu_id, parent, name in ((10, None, "Books"), (11, 10, "Cash Book"), (12, 99, "Orphan"))
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(BaseDAL, "execute_sp", return_value=self.MENUS)
+        self.execute_sp = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def render(self, session):
+        request = RequestFactory().get("/")
+        request.session = session
+        return get_sidebar_fragments(request)
+
+    def test_tree_nests_children_under_their_parent(self):
+        tree = SecurityBLL.fetch_authorized_sidebar(5)
+        roots = tree["1"]["menus"]
+        self.assertEqual([menu["name"] for menu in roots], ["Books"])
+        self.assertEqual([menu["name"] for menu in roots[0]["children"]], ["Cash Book"])
+        self.assertTrue(roots[0]["has_children"])
+
+    def test_fragments_are_cached_per_rights_version(self):
+        session = {"user_id": 5}
+        first = self.render(session)
+        self.assertIn("Cash Book", first["menus"])
+        self.assertEqual(session["sidebar_version"], PermissionBLL.get_rights_version(5))
+
+        self.assertEqual(self.render(session), first)
+        self.assertEqual(self.execute_sp.call_count, 1)
+
+        PermissionBLL.invalidate_user(5)
+        self.render(session)
+        self.assertEqual(self.execute_sp.call_count, 2)
+
+    def test_empty_tree_is_not_cached(self):
+        self.execute_sp.return_value = []
+        self.render({"user_id": 5})
+        self.render({"user_id": 5})
+        self.assertEqual(self.execute_sp.call_count, 2)
+
+    def test_anonymous_request_renders_nothing(self):
+        self.assertEqual(self.render({}), {})
+        self.execute_sp.assert_not_called()
+
+
+class LeanSessionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rights = [{"vcmdkkey": "CASH_BOOK", "btcanview": 1}]
+        patcher = mock.patch.object(UserDAL, "get_user_rights_matrix", return_value=rights)
+        self.rights_matrix = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = RequestFactory().get("/")
+        self.request.session = {"user_id": 5}
+
+    @override_settings(SESSION_LEAN=True)
+    def test_lean_session_keeps_only_the_version(self):
+        PermissionBLL.load_into_session(self.request, 5)
+        self.assertNotIn(PermissionBLL.SESSION_INDEX, self.request.session)
+        version = self.request.session[PermissionBLL.SESSION_VERSION]
+        self.assertEqual(version, PermissionBLL.get_rights_version(5))
+
+        # Index comes from the cache warmed at login
+        self.assertEqual(PermissionBLL.get_session_index(self.request), {"CASH_BOOK": 1})
+        self.assertEqual(self.rights_matrix.call_count, 1)
+
+    @override_settings(SESSION_LEAN=False)
+    def test_full_session_reloads_after_a_rights_change(self):
+        PermissionBLL.load_into_session(self.request, 5)
+        self.assertEqual(self.request.session[PermissionBLL.SESSION_INDEX], {"CASH_BOOK": 1})
+
+        PermissionBLL.get_session_index(self.request)
+        self.assertEqual(self.rights_matrix.call_count, 1)
+
+        PermissionBLL.invalidate_user(5)
+        PermissionBLL.get_session_index(self.request)
+        self.assertEqual(self.rights_matrix.call_count, 2)
+
+
+@override_settings(SESSION_REFRESH_INTERVAL=120)
+class SessionRefreshMiddlewareTests(SimpleTestCase):
+    def run_request(self, session_data, now):
+        request = RequestFactory().get("/")
+        request.session = SignedCookieSession()
+        request.session.update(session_data)
+        request.session.modified = False
+        with mock.patch("core_app.middleware.time.time", return_value=now):
+            SessionRefreshMiddleware(lambda r: HttpResponse("ok"))(request)
+        return request.session
+
+    def test_saves_at_most_once_per_interval(self):
+        session = self.run_request({"user_id": 5, "session_refreshed_at": 1000}, now=1100)
+        self.assertFalse(session.modified)
+
+        session = self.run_request({"user_id": 5, "session_refreshed_at": 1000}, now=1120)
+        self.assertTrue(session.modified)
+        self.assertEqual(session["session_refreshed_at"], 1120)
+
+    def test_anonymous_sessions_are_never_saved(self):
+        self.assertFalse(self.run_request({}, now=5000).modified)
+
+
+class DataTablesTests(SimpleTestCase):
+    def query(self, **extra):
+        query = {
+            "draw": "3",
+            "start": "1",
+            "length": "2",
+            "search[value]": " cash ",
+            "columns[0][data]": "amount_disp",
+            "columns[1][data]": "name",
+            "columns[2][data]": "secret",
+            "columns[2][orderable]": "true",
+        }
+        query.update(extra)
+        return query
+
+    def test_parse_reads_paging_and_search(self):
+        dt = DataTablesRequest.parse(self.query(length="-1"))
+        self.assertEqual((dt.draw, dt.start, dt.search), (3, 1, "cash"))
+        self.assertEqual(dt.length, DataTablesRequest.MAX_LENGTH)
+
+        dt = DataTablesRequest.parse({"draw": "x", "start": "-5"})
+        self.assertEqual((dt.draw, dt.start, dt.length, dt.order), (1, 0, 10, []))
+
+    def test_only_server_allowed_columns_are_ordered(self):
+        query = self.query(
+            **{
+                "order[0][column]": "2",
+                "order[0][dir]": "asc",
+                "order[1][column]": "0",
+                "order[1][dir]": "desc",
+                "order[2][column]": "9",
+            }
+        )
+        dt = DataTablesRequest.parse(query, orderable=("amount_disp", "name"))
+        self.assertEqual(dt.order, [("amount_disp", True)])
+        self.assertEqual(DataTablesRequest.parse(query).order, [])
+
+    def test_respond_sorts_by_raw_column_and_slices_one_page(self):
+        rows = [
+            {"name": "b", "amount": 10, "amount_disp": "10.00"},
+            {"name": "a", "amount": 9, "amount_disp": "9.00"},
+            {"name": "c", "amount": None, "amount_disp": ""},
+        ]
+        query = self.query(**{"search[value]": "", "order[0][column]": "0", "order[0][dir]": "desc"})
+        response = DataTablesAdapter.respond(
+            query,
+            fetch=lambda term: rows,
+            count_key=("test",),
+            sort_keys={"amount_disp": "amount"},
+            orderable=("amount_disp",),
+        )
+
+        self.assertEqual(response["draw"], 3)
+        self.assertEqual((response["recordsTotal"], response["recordsFiltered"]), (3, 3))
+        self.assertEqual([row["name"] for row in response["data"]], ["a", "c"])  # 10, 9, NULL -> page 2
+        self.assertEqual([row["name"] for row in rows], ["b", "a", "c"])  # cached list untouched
+
+
+class CashBookDeltaTests(SimpleTestCase):
+    FILTERS = ("2026-01-01", "2026-01-31", "")
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.rows = [self.row(1, 1, 100), self.row(2, 1, 200), self.row(3, 1, 300)]
+        patcher = mock.patch.object(
+            TransactionDAL, "get_cash_book_data", side_effect=lambda *args: self.rows
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def row(self, code, version, balance):
+        return {"intrcode": code, "intrvrsn": version, "mntrcbal": balance}
+
+    def render(self):
+        versions = TransactionBLL.cash_book_versions(self.rows)
+        return TransactionBLL.save_cash_book_snapshot(7, self.FILTERS, versions)
+
+    def test_reports_inserts_updates_deletes_and_balance_shifts(self):
+        token = self.render()
+        self.rows = [self.row(1, 2, 100), self.row(2, 1, 250), self.row(4, 1, 400)]
+        changes = TransactionBLL.get_cash_book_changes(7, token)
+
+        self.assertFalse(changes["reset"])
+        self.assertEqual([row["intrcode"] for row in changes["upserts"]], [1, 2, 4])
+        self.assertEqual(changes["deleted"], ["3"])
+
+        again = TransactionBLL.get_cash_book_changes(7, changes["token"])
+        self.assertEqual((again["upserts"], again["deleted"]), ([], []))
+
+    def test_rerenders_overwrite_one_snapshot_per_filter(self):
+        first = self.render()
+        self.assertEqual(self.render(), first)
+        self.rows = self.rows[:2]
+        second = self.render()
+
+        self.assertEqual(first.split(".")[0], second.split(".")[0])
+        self.assertTrue(TransactionBLL.get_cash_book_changes(7, first)["reset"])
+        self.assertFalse(TransactionBLL.get_cash_book_changes(7, second)["reset"])
+
+    def test_unknown_token_or_empty_result_forces_a_reload(self):
+        token = self.render()
+        self.assertTrue(TransactionBLL.get_cash_book_changes(7, "nope")["reset"])
+        self.assertTrue(TransactionBLL.get_cash_book_changes(7, None)["reset"])
+        self.rows = []
+        self.assertTrue(TransactionBLL.get_cash_book_changes(7, token)["reset"])
+
+
+class RoutingTests(SimpleTestCase):
+    def setUp(self):
+        BaseDAL.begin_request()
+
+    def test_unregistered_sp_goes_to_primary_without_pinning(self):
+        self.assertEqual(BaseDAL.route("sp_Not_Registered_Anywhere"), BaseDAL.PRIMARY)
+        self.assertFalse(BaseDAL.wrote_in_request())
+
+    def test_registered_write_pins_the_request(self):
+        SPRegistry.register("sp_Test_Write", kind="write")
+        self.assertEqual(BaseDAL.route("sp_Test_Write"), BaseDAL.PRIMARY)
+        self.assertTrue(BaseDAL.wrote_in_request())
+
+    def test_registered_read_uses_replica_when_configured(self):
+        SPRegistry.register("sp_Test_Read", [])
+        with override_settings(DB_READ_REPLICA={"server": "r", "database": "d"}):
+            self.assertEqual(BaseDAL.route("sp_Test_Read"), BaseDAL.REPLICA)
+        self.assertFalse(BaseDAL.wrote_in_request())
+
+    def test_auth_and_sidebar_reads_stay_on_primary(self):
+        for module in ("core_app.layers.sidebar_bll", "core_app.modules.users.user_dal"):
+            importlib.import_module(module)  # registers the SPs
+        with override_settings(DB_READ_REPLICA={"server": "r", "database": "d"}):
+            for sp_name in ("sp_AuthenticateUser", "sp_GetSidebarMenus", "sp_Get_User_Rights_Matrix"):
+                self.assertEqual(BaseDAL.route(sp_name), BaseDAL.PRIMARY, sp_name)
+
+
+@override_settings(DB_RESULT_CACHE={"enabled": True, "max_entries": 10, "max_entry_rows": 3, "max_total_rows": 5})
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        ResultCache.clear()
+
+    def test_invalidate_drops_only_tagged_entries(self):
+        ResultCache.set(("sp_A", 1), [{"x": 1}], 60, tags=("cash:1",))
+        ResultCache.set(("sp_B", 1), [{"x": 2}], 60, tags=("journal:1",))
+        self.assertEqual(ResultCache.invalidate(["cash:1"]), 1)
+        self.assertIsNone(ResultCache.get(("sp_A", 1)))
+        self.assertEqual(ResultCache.get(("sp_B", 1)), [{"x": 2}])
+
+    def test_stale_token_is_not_stored(self):
+        token = ResultCache.begin(("cash:2",))
+        ResultCache.invalidate(["cash:2"])  # write while the read was running
+        self.assertFalse(ResultCache.set(("sp_A", 2), [{"x": 1}], 60, tags=("cash:2",), token=token))
+        self.assertIsNone(ResultCache.get(("sp_A", 2)))
+
+    def test_results_above_row_cap_are_not_cached(self):
+        rows = [{"x": i} for i in range(4)]
+        self.assertFalse(ResultCache.set(("sp_A", 3), rows, 60))
+        self.assertIsNone(ResultCache.get(("sp_A", 3)))
+        self.assertGreaterEqual(ResultCache.stats()["skipped_large"], 1)
+
+    def test_total_rows_evict_least_recently_used(self):
+        ResultCache.set(("sp_A", 4), [{"x": 1}] * 3, 60)
+        ResultCache.set(("sp_B", 4), [{"x": 1}] * 3, 60)
+        self.assertIsNone(ResultCache.get(("sp_A", 4)))
+        self.assertIsNotNone(ResultCache.get(("sp_B", 4)))
+        self.assertEqual(ResultCache.stats()["rows"], 3)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_follower_runs_fn_itself_after_timeout(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "leader"
+
+        leader = threading.Thread(target=lambda: SingleFlight.do(("sp_Test_Slow",), slow))
+        leader.start()
+        started.wait(5)
+        try:
+            self.assertEqual(SingleFlight.do(("sp_Test_Slow",), lambda: "follower", timeout=0.05), "follower")
+        finally:
+            release.set()
+            leader.join()
+        self.assertEqual(SingleFlight.stats()["sp_Test_Slow"]["timeouts"], 1)
+
+
+class FenwickTreeTests(SimpleTestCase):
+    def test_prefix_sums(self):
+        tree = FenwickTree(10)
+        tree.add(0, 5)
+        tree.add(9, 2)
+        tree.add(4, -1)
+        self.assertEqual([tree.prefix(p) for p in (-1, 0, 3, 4, 9, 50)], [0, 5, 5, 4, 6, 6])
+
+    def test_from_values_matches_adds(self):
+        values = [3, -1, 4, 1, -5, 9, 2, 6]
+        built = FenwickTree.from_values(values)
+        for pos in range(len(values)):
+            self.assertEqual(built.prefix(pos), sum(values[: pos + 1]))
+
+
+class LedgerIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = LedgerIndex.build(
+            1,
+            [
+                (("c", "1"), [("5", date(2001, 3, 1), 100), ("CASH", date(2001, 3, 1), -100)]),
+                (("c", "2"), [("5", date(2026, 1, 10), 50), ("CASH", date(2026, 1, 10), -50)]),
+            ],
+        )
+
+    def test_balance_and_movement(self):
+        self.assertEqual(self.index.balance("5", date(2001, 2, 28)), 0)
+        self.assertEqual(self.index.balance("5", date(2026, 1, 9)), 100)
+        self.assertEqual(self.index.balance("CASH", date(2030, 1, 1)), -150)
+        self.assertEqual(self.index.movement("5", date(2026, 1, 1), date(2026, 1, 31)), 50)
+
+    def test_stores_only_posting_days(self):
+        self.assertEqual(len(self.index.series["5"].days), 2)
+
+    def test_edit_moves_amount_to_new_day(self):
+        self.index.post(("c", "1"), [("5", date(2026, 1, 20), 30), ("CASH", date(2026, 1, 20), -30)])
+        self.assertEqual(self.index.balance("5", date(2026, 1, 15)), 50)
+        self.assertEqual(self.index.balance("5", date(2026, 1, 20)), 80)
+
+    def test_delete_and_unknown_edit(self):
+        self.assertTrue(self.index.apply_change(("c", "2"), None, must_exist=True))
+        self.assertEqual(self.index.balance("5", date(2030, 1, 1)), 100)
+        self.assertFalse(self.index.apply_change(("c", "99"), [], must_exist=True))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class LedgerIndexRegistryTests(SimpleTestCase):
+    def setUp(self):
+        LedgerIndexRegistry.drop()
+        self.rows = [(("c", "1"), [("5", date(2026, 1, 5), 100)])]
+        self.load = mock.Mock(side_effect=lambda service_id: list(self.rows))
+
+    def test_replays_writes_from_other_workers(self):
+        index = LedgerIndexRegistry.get(77, self.load)
+        # Doosre worker ka write: us ke paas index nahi, sirf version + log
+        LedgerIndexRegistry.drop(77)
+        LedgerIndexRegistry.apply(77, ("c", "2"), [("5", date(2026, 2, 1), 40)], must_exist=False)
+        with LedgerIndexRegistry._lock:
+            LedgerIndexRegistry._indexes[77] = index
+
+        self.assertEqual(LedgerIndexRegistry.get(77, self.load).balance("5", date(2026, 3, 1)), 140)
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_missing_log_entry_reloads(self):
+        LedgerIndexRegistry.get(78, self.load)
+        LedgerIndexRegistry.bump_version(78)  # write without a logged change
+        LedgerIndexRegistry.get(78, self.load)
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_concurrent_cold_reads_load_once(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load(service_id):
+            started.set()
+            release.wait(5)
+            return list(self.rows)
+
+        load = mock.Mock(side_effect=slow_load)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(LedgerIndexRegistry.get(79, load)))
+            for _ in range(4)
+        ]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(index is results[0] for index in results))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    MONTH_SEGMENT_CACHE={"enabled": True, "ttl": 600, "horizon_months": 12, "primary_after_write": 60},
+)
+class MonthSegmentCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        BaseDAL.begin_request()
+        self.open_month = date.today().replace(day=1)
+        self.first = MonthSegmentCache.add_months(self.open_month, -3)
+        # Har closed mahine ki 1 aur 20 tareekh ko ek row
+        self.rows = []
+        for n, month in enumerate(MonthSegmentCache.months_between(self.first, self.open_month)):
+            self.rows.append({"intrcode": n * 2, "dttrdate": month})
+            self.rows.append({"intrcode": n * 2 + 1, "dttrdate": month.replace(day=20)})
+        self.loads = []
+        self.live = []
+
+    def load_segment(self, d1, d2):
+        self.loads.append((d1, BaseDAL.is_pinned_to_primary()))
+        return [r for r in self.rows if d1 <= r["dttrdate"].isoformat() <= d2]
+
+    def fetch_live(self, d1, d2):
+        self.live.append((d1, d2))
+        return [r for r in self.rows if d1 <= r["dttrdate"].isoformat() <= d2]
+
+    def get_range(self, start, end):
+        return MonthSegmentCache.get_range(
+            "cashbook", 1, start.isoformat(), end.isoformat(), "dttrdate", self.load_segment, self.fetch_live
+        )
+
+    def test_closed_months_come_from_cache_and_edges_are_trimmed(self):
+        start, end = self.first.replace(day=10), date.today()
+        expected = [r for r in self.rows if start <= r["dttrdate"] <= end]
+
+        self.assertEqual(self.get_range(start, end), expected)
+        self.assertEqual(len(self.loads), 3)
+        self.assertEqual(self.live, [(self.open_month.isoformat(), end.isoformat())])
+
+        self.loads.clear()
+        self.assertEqual(self.get_range(start, end), expected)
+        self.assertEqual(self.loads, [])
+
+    def test_write_invalidates_its_month_and_later_ones_from_primary(self):
+        self.get_range(self.first, date.today())
+        self.loads.clear()
+
+        second = MonthSegmentCache.add_months(self.first, 1)
+        MonthSegmentCache.invalidate_from("cashbook", 1, second + timedelta(days=4))
+        self.get_range(self.first, date.today())
+        self.assertEqual(
+            self.loads,
+            [(second.isoformat(), True), (MonthSegmentCache.add_months(second, 1).isoformat(), True)],
+        )
+
+    def test_row_edit_invalidates_from_the_earlier_month(self):
+        self.get_range(self.first, date.today())
+        self.loads.clear()
+
+        # Row 1 (pehla mahina) teesre mahine mein chali gayi; purani tareekh nahi bheji gayi
+        found = MonthSegmentCache.invalidate_row(
+            "cashbook", 1, "intrcode", 1, None, MonthSegmentCache.add_months(self.first, 2)
+        )
+        self.assertEqual(found, [self.first])
+        self.get_range(self.first, date.today())
+        self.assertEqual(len(self.loads), 3)
+
+    def test_row_edit_with_its_old_date_skips_the_scan(self):
+        self.get_range(self.first, date.today())
+        self.loads.clear()
+
+        second = MonthSegmentCache.add_months(self.first, 1)
+        with mock.patch.object(MonthSegmentCache, "row_months") as row_months:
+            found = MonthSegmentCache.invalidate_row(
+                "cashbook", 1, "intrcode", 1, second.isoformat(), MonthSegmentCache.add_months(second, 1)
+            )
+        row_months.assert_not_called()
+        self.assertEqual(found, [])
+        self.get_range(self.first, date.today())
+        self.assertEqual(len(self.loads), 2)
+
+
+class BalanceSnapshotTests(SimpleTestCase):
+    def report(self, opening, accounts, closing, closing_row=True):
+        rows = [
+            {"vcacname": name, "totalreceipt": r, "totalpayment": p} for name, (r, p) in accounts.items()
+        ]
+        if closing_row:
+            label = BalanceSnapshotBLL.CLOSING_LABEL
+            rows.append({"vcacname": label, "totalreceipt": 0, "totalpayment": closing})
+        receipts = sum(r for r, _ in accounts.values())
+        payments = sum(p for _, p in accounts.values())
+        footer = {
+            "grandtotalreceiptside": opening + receipts,
+            "grandtotalpaymentside": payments + closing,
+            "finalclosingbalance": closing,
+        }
+        return [[{"openingbalance": opening}], rows, [footer]]
+
+    def piece(self, opening, accounts, closing, period=None):
+        piece = BalanceSnapshotBLL.parse_report(self.report(opening, accounts, closing))
+        if period:
+            piece["period"] = period
+        return piece
+
+    def test_parse_report_sums_accounts_and_checks_the_footer(self):
+        raw = self.report(100, {"Fees": (50, 0), "Rent": (0, 30)}, 120)
+        raw[1].append({"vcacname": "Fees", "totalreceipt": "5.5", "totalpayment": None})
+        raw[2][0]["grandtotalreceiptside"] = "155.50"
+        piece = BalanceSnapshotBLL.parse_report(raw)
+
+        self.assertEqual(piece["accounts"]["Fees"], (Decimal("55.5"), Decimal(0)))
+        self.assertNotIn(BalanceSnapshotBLL.CLOSING_LABEL, piece["accounts"])
+        self.assertTrue(piece["has_closing_row"])
+
+    def test_parse_report_rejects_failed_or_unbalanced_results(self):
+        self.assertIsNone(BalanceSnapshotBLL.parse_report([]))
+        raw = self.report(100, {"Fees": (50, 0)}, 150)
+        raw[2][0]["finalclosingbalance"] = 149
+        self.assertIsNone(BalanceSnapshotBLL.parse_report(raw))
+
+    def test_merge_takes_the_outer_balances_and_sums_accounts(self):
+        merged = BalanceSnapshotBLL.merge(
+            [
+                self.piece(100, {"Fees": (50, 0)}, 150),
+                self.piece(150, {"Fees": (10, 0), "Rent": (0, 40)}, 120),
+            ]
+        )
+        self.assertEqual(merged["opening_balance"], 100)
+        fees = merged["account_data"][0]
+        self.assertEqual(fees, {"vcacname": "Fees", "totalreceipt": 60, "totalpayment": 0})
+        self.assertEqual(merged["account_data"][-1]["totalpayment"], 120)
+        self.assertEqual(
+            merged["totals"],
+            {"grandtotalreceiptside": 160, "grandtotalpaymentside": 160, "finalclosingbalance": 120},
+        )
+
+    def get_report(self, stored, live):
+        open_month = date.today().replace(day=1)
+        start = MonthSegmentCache.add_months(open_month, -3)
+        end = MonthSegmentCache.add_months(open_month, -1) - timedelta(days=1)
+        with mock.patch.object(BalanceSnapshotBLL, "load_months", return_value=stored):
+            with mock.patch.object(BalanceSnapshotBLL, "live_piece", return_value=live) as live_piece:
+                with mock.patch.object(BalanceSnapshotBLL, "invalidate_from") as invalidate:
+                    report = BalanceSnapshotBLL.get_report(1, start, end)
+        return report, live_piece, invalidate
+
+    def test_report_joins_snapshots_and_live_pieces(self):
+        first = MonthSegmentCache.add_months(date.today().replace(day=1), -3)
+        stored = {first: self.piece(100, {"Fees": (50, 0)}, 150, first)}
+        report, live_piece, invalidate = self.get_report(stored, self.piece(150, {"Rent": (0, 20)}, 130))
+
+        self.assertEqual(report["opening_balance"], 100)
+        self.assertEqual(report["totals"]["finalclosingbalance"], 130)
+        live_piece.assert_called_once_with(1, MonthSegmentCache.add_months(first, 1), mock.ANY)
+        invalidate.assert_not_called()
+
+    def test_broken_continuity_drops_snapshots_from_the_first_used(self):
+        first = MonthSegmentCache.add_months(date.today().replace(day=1), -3)
+        stored = {first: self.piece(100, {"Fees": (50, 0)}, 150, first)}
+        report, _, invalidate = self.get_report(stored, self.piece(149, {"Rent": (0, 20)}, 129))
+
+        self.assertIsNone(report)
+        invalidate.assert_called_once_with(1, first)
+
+    def test_no_usable_snapshot_falls_back_to_the_sp(self):
+        report, live_piece, _ = self.get_report({}, None)
+        self.assertIsNone(report)
+        live_piece.assert_not_called()
+
+
+class StreamingExportTests(SimpleTestCase):
+    COLUMNS = [("Date", "dttrdate"), ("Title", "vctrtitl"), ("Amount", "mntramnt")]
+    ROWS = [
+        {"dttrdate": date(2026, 1, 5), "vctrtitl": "Fees", "mntramnt": Decimal("10.50")},
+        {"dttrdate": date(2026, 1, 6), "vctrtitl": "=HYPERLINK(\"x\")", "mntramnt": None},
+    ]
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_csv_rows_and_formula_escaping(self):
+        response = StreamingExport.response("cash book", "csv", self.COLUMNS, iter(self.ROWS))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="cash_book.csv"')
+        text = self.body(response).decode("utf-8")
+        self.assertEqual(
+            text.splitlines(),
+            ["\ufeffDate,Title,Amount", "2026-01-05,Fees,10.50", '2026-01-06,"\'=HYPERLINK(""x"")",'],
+        )
+
+    def test_csv_error_mid_stream_is_marked(self):
+        def rows():
+            yield self.ROWS[0]
+            raise RuntimeError("connection lost")
+
+        with mock.patch("builtins.print"):
+            text = self.body(StreamingExport.response("x", "csv", self.COLUMNS, rows())).decode("utf-8")
+        self.assertTrue(text.rstrip().endswith("ERROR: export incomplete"))
+
+    def test_xlsx_is_a_readable_package(self):
+        response = StreamingExport.response("x", "xlsx", self.COLUMNS, iter(self.ROWS * 600))
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as package:
+            self.assertIn("xl/workbook.xml", package.namelist())
+            sheet = package.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        self.assertEqual(sheet.count("<row>"), 1201)
+        self.assertIn("<c><v>10.50</v></c>", sheet)
+        self.assertIn('<t xml:space="preserve">=HYPERLINK("x")</t>', sheet)  # inline text, not a formula
@@ -36,6 +36,21 @@ urlpatterns = [
         transaction_views.cash_book_view,
         name="cash_book",
     ),
+    path(
+        "transaction/cash-book/changes/",
+        transaction_views.cash_book_changes_ajax,
+        name="cash_book_changes",
+    ),
+    path(
+        "transaction/cash-book/export/",
+        transaction_views.cash_book_export,
+        name="cash_book_export",
+    ),
+    path(
+        "transaction/ledger/balance/",
+        transaction_views.ledger_balance_ajax,
+        name="ledger_balance",
+    ),
     path(
         "transaction/cash-book/add/",
         transaction_views.add_cash_entry_view,
@@ -56,11 +71,21 @@ urlpatterns = [
         transaction_views.get_transaction_lookup_ajax,
         name="get_transaction_lookup_ajax",
     ),
+    path(
+        "transaction/lookup/bootstrap/",
+        transaction_views.get_lookup_bootstrap_ajax,
+        name="get_lookup_bootstrap_ajax",
+    ),
     path(
         "transaction/consolidated-cash-book/",
         consolidated_cash_book_view.consolidated_cash_book,
         name="consolidated_cash_book",
     ),
+    path(
+        "transaction/consolidated-cash-book/export/",
+        consolidated_cash_book_view.consolidated_cash_book_export,
+        name="consolidated_cash_book_export",
+    ),
     # --- Transaction (General Journal) ---
     path(
         "transaction/journal/",
@@ -72,6 +97,11 @@ urlpatterns = [
         journal_views.journal_list_ajax,
         name="journal_list_ajax",
     ),
+    path(
+        "transaction/journal/export/",
+        journal_views.journal_export,
+        name="journal_export",
+    ),
     path(
         "transaction/journal/add/",
         journal_views.add_journal_view,
@@ -94,4 +124,5 @@ urlpatterns = [
     ),
     # --- Lookups & Utilities ---
     path("common/lookup/", user_views.get_lookup_ajax, name="get_lookup_ajax"),
+    path("metrics/", views.metrics_view, name="metrics"),
 ]
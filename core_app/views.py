@@ -1,11 +1,19 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import HttpResponse, HttpResponseForbidden
 from django.contrib.auth import logout as auth_logout
 from django.views.decorators.cache import never_cache
 from django.views.decorators.cache import cache_control
 
 # Sirf Auth aur Security ki BLL import hogi yahan
 from .layers.sidebar_bll import AuthBLL, SecurityBLL
+from .layers.base_dal import BaseDAL
+from .layers.error_handler import DatabaseUnavailableError
+from .layers.result_cache import ResultCache
+from .layers.single_flight import SingleFlight
+from .layers.sp_metrics import SPMetrics
+from .modules.users.permission_bll import PermissionBLL
 
 
 def is_ajax(request):
@@ -24,24 +32,45 @@ def login_view(request):
         password = request.POST.get("password")
         service_id = request.POST.get("service_id")
 
-        result = AuthBLL.login(username, password, service_id)
+        try:
+            result = AuthBLL.login(username, password, service_id)
+
+            if result["success"]:
+                user = result["user"]
+                request.session["user_id"] = user["UserID"]
+                request.session["full_name"] = user["FullName"]
+                request.session["current_service_id"] = user["ServiceID"]
+                request.session["service_name"] = user["ServiceName"]
+
+                # Sidebar menu hierarchy ko session mein save karna
+                # (lean session: sidebar pehle page render par cache mein banta hai)
+                if not PermissionBLL.lean_session():
+                    try:
+                        rights_version = PermissionBLL.get_rights_version(user["UserID"])
+                        hierarchy = SecurityBLL.fetch_authorized_sidebar(user["UserID"])
+                        request.session["sidebar_data"] = hierarchy if hierarchy else {}
+                        if hierarchy:
+                            # Rendered sidebar is cached against this version
+                            request.session["sidebar_version"] = rights_version
+                        request.session.modified = True
+                    except DatabaseUnavailableError:
+                        raise
+                    except Exception as e:
+                        print(f"Sidebar Critical Error: {e}")
+                        request.session["sidebar_data"] = {}
+
+                # Permission bitmask bhi login par hi - views ko SP call nahi karni padegi
+                PermissionBLL.load_into_session(request, user["UserID"])
+        except DatabaseUnavailableError as e:
+            print(f"--- VIEW ERROR (Login): {str(e)} ---")
+            request.session.flush()
+            result = {"success": False, "message": "Database is temporarily unavailable. Please try again shortly."}
+        except Exception as e:
+            print(f"--- VIEW ERROR (Login): {str(e)} ---")
+            request.session.flush()
+            result = {"success": False, "message": f"System Error: {str(e)}"}
 
         if result["success"]:
-            user = result["user"]
-            request.session["user_id"] = user["UserID"]
-            request.session["full_name"] = user["FullName"]
-            request.session["current_service_id"] = user["ServiceID"]
-            request.session["service_name"] = user["ServiceName"]
-
-            # Sidebar menu hierarchy ko session mein save karna
-            try:
-                hierarchy = SecurityBLL.fetch_authorized_sidebar(user["UserID"])
-                request.session["sidebar_data"] = hierarchy if hierarchy else {}
-                request.session.modified = True
-            except Exception as e:
-                print(f"Sidebar Critical Error: {e}")
-                request.session["sidebar_data"] = {}
-
             return redirect("core_app:dashboard")
         else:
             messages.error(request, result["message"])
@@ -71,3 +100,20 @@ def dashboard_view(request):
     # SPA behavior ke liye base template switch
     base_template = "core_app/blank.html" if is_ajax_req else "core_app/base.html"
     return render(request, "core_app/dashboard.html", {"base_template": base_template})
+
+
+@never_cache
+def metrics_view(request):
+    """Prometheus scrape endpoint: per-SP latency/volume, pool, breaker, cache and coalescing stats."""
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden("Forbidden")
+
+    body = SPMetrics.render_prometheus(
+        pool_stats=BaseDAL.pool_stats(),
+        breaker_stats=BaseDAL.get_breaker().stats(),
+        cache_stats=ResultCache.stats(),
+        cache_sp_stats=ResultCache.sp_stats(),
+        coalesce_stats=SingleFlight.stats(),
+    )
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")